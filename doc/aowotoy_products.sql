@@ -8,6 +8,7 @@ CREATE TABLE `aowotoy_products` (
 	`price` INT(11) NOT NULL DEFAULT 0,
 	`option` VARCHAR(250) NOT NULL DEFAULT '',
 	`detail` TEXT NOT NULL,
+	`fingerprint` CHAR(64) NOT NULL DEFAULT '',
 	`created_at` DATETIME NOT NULL DEFAULT current_timestamp() ON UPDATE current_timestamp(),
 	PRIMARY KEY (`id`),
 	UNIQUE INDEX `option_id` (`option_id`),
@@ -17,3 +18,6 @@ COLLATE='utf8mb4_general_ci'
 ENGINE=InnoDB
 AUTO_INCREMENT=6343
 ;
+
+-- 既有資料表升級：新增產品內容指紋欄位 (見 src/utils/fingerprint.py)
+-- ALTER TABLE `aowotoy_products` ADD COLUMN `fingerprint` CHAR(64) NOT NULL DEFAULT '' AFTER `detail`;
@@ -0,0 +1,14 @@
+-- news 資料表升級 (見 src/utils/db.py)
+
+-- 待翻譯文章的工作佇列：租約欄位與領取時使用的索引 (status = 0 ORDER BY id DESC)
+ALTER TABLE `news`
+	ADD COLUMN `lease_token` CHAR(32) NULL DEFAULT NULL,
+	ADD COLUMN `lease_until` DATETIME NULL DEFAULT NULL,
+	ADD INDEX `idx_news_translate_queue` (`status`, `id`),
+	ADD INDEX `idx_news_lease_token` (`lease_token`);
+
+-- URL 去重：url_hash 由資料庫依 url 自動產生 (與 db.url_hash() 相同)，唯一索引讓 INSERT IGNORE 略過重複的 URL
+-- 若既有資料已有重複的 URL，需先清除重複後才能建立唯一索引
+ALTER TABLE `news`
+	ADD COLUMN `url_hash` CHAR(64) AS (SHA2(`url`, 256)) STORED,
+	ADD UNIQUE INDEX `uniq_news_url_hash` (`url_hash`);
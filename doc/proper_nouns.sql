@@ -0,0 +1,4 @@
+-- proper_nouns 資料表升級 (見 src/utils/db.py 的 insert_proper_nouns)
+-- 唯一索引讓多列 INSERT IGNORE 略過已存在的名詞；若既有資料已有重複的名詞，需先清除重複後才能建立
+ALTER TABLE `proper_nouns`
+	ADD UNIQUE INDEX `uniq_unknown_noun` (`unknown_noun`);
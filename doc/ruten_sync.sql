@@ -0,0 +1,20 @@
+-- 露天同步狀態 (見 src/ruten/sync_state.py)
+CREATE TABLE `ruten_sync` (
+	`product_id` VARCHAR(30) NOT NULL,
+	`item_id` VARCHAR(30) NOT NULL DEFAULT '',
+	`payload_hash` CHAR(64) NOT NULL DEFAULT '',
+	`info_hash` CHAR(64) NOT NULL DEFAULT '',
+	`price_hash` CHAR(64) NOT NULL DEFAULT '',
+	`spec_key` CHAR(64) NOT NULL DEFAULT '',
+	`spec_map` TEXT NOT NULL COMMENT 'JSON: option_id -> 露天 spec_id',
+	`image_hash` CHAR(64) NOT NULL DEFAULT '',
+	`images_uploaded` INT(11) NOT NULL DEFAULT 0,
+	`image_status` VARCHAR(10) NOT NULL DEFAULT 'pending' COMMENT 'pending / done / failed',
+	`last_error` VARCHAR(500) NOT NULL DEFAULT '',
+	`synced_at` DATETIME NOT NULL DEFAULT current_timestamp() ON UPDATE current_timestamp(),
+	PRIMARY KEY (`product_id`),
+	INDEX `item_id` (`item_id`)
+)
+COLLATE='utf8mb4_general_ci'
+ENGINE=InnoDB
+;
@@ -5,16 +5,53 @@
     
 """
 import os
+import sys
 import re
 import asyncio
-from playwright.async_api import async_playwright
-import random
+import argparse
+import functools
+import logging
+from collections import Counter
 import aiohttp 
-from dotenv import load_dotenv
-import mysql.connector # 保留 mysql.connector 以便處理可能的錯誤類型
+from bs4 import BeautifulSoup, SoupStrainer
 import json # 新增導入 json 模組
 from urllib.parse import urljoin # 導入 urljoin
 
+# 將專案根目錄添加到 Python 路徑
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.utils.db import connect_to_db, pool_summary
+from src.utils.rate_limit import HostRateLimiter
+from src.utils.browser import BrowserManager
+from src.utils.product_writer import ProductWriter, AsyncProductWriter
+from src.utils.fingerprint import FingerprintIndex, product_fingerprint
+from src.utils.image_downloader import ImageDownloader
+from src.utils.image_store import ImageStore
+from src.utils.image_process import ImageProcessor
+from src.utils.frontier import Frontier
+from src.utils.metrics import DEFAULT_REPORT_INTERVAL, metrics, report_periodically
+
+# 產品頁面 worker pool 預設值，可由命令列參數覆寫
+DEFAULT_CONCURRENCY = 3 # 同時開啟的 browser context 數量
+DEFAULT_RATE = 0.5 # 每個 host 每秒可發出的請求數
+DEFAULT_BURST = 2 # token bucket 最多累積的請求數
+DEFAULT_RECYCLE_AFTER = 50 # 每個 browser context 使用幾次後關閉重建
+DEFAULT_LIST_CONCURRENCY = 3 # 同時抓取的列表頁數量
+MAX_LIST_FAILURES = 3 # 列表頁連續失敗幾次後停止分頁
+FETCH_MODES = ('auto', 'http', 'browser')
+DEFAULT_FETCH_MODE = 'auto' # 先以 HTTP 取得產品頁，必要時才用瀏覽器渲染
+DEFAULT_DB_BATCH_SIZE = 200 # 累積多少筆規格資料後寫入並 commit
+DEFAULT_DB_QUEUE_SIZE = 50 # 等待寫入的產品數上限，超過時爬蟲等待寫入執行緒
+DEFAULT_IMAGE_CONCURRENCY = 8 # 同時下載的圖片數量
+DEFAULT_FRONTIER_PATH = 'crawl_frontier.sqlite3' # 記錄 URL 處理狀態的 SQLite 檔案
+DEFAULT_MAX_ATTEMPTS = 3 # 每個 URL 最多嘗試次數
+LOG_LEVELS = ('DEBUG', 'INFO', 'WARNING', 'ERROR')
+DEFAULT_LOG_LEVEL = 'INFO' # 每個產品、每個規格的細節只在 DEBUG 輸出
+
+PRODUCT_JSON_RE = re.compile(r"app\.value\('product', JSON\.parse\('(.*?)'\)\);")
+
+fetch_stats = Counter() # 產品頁取得方式統計
+
 # 設定 headers 模擬瀏覽器請求
 headers = {
     'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36',
@@ -29,201 +66,472 @@ headers = {
     'Sec-Fetch-User': '?1'
 }
 
-load_dotenv() # 從 .env 文件載入環境變數
+async def crawl_list(browser_manager, url):
+    """從指定 URL 爬取產品連結；頁面沒有產品時返回空列表，發生錯誤時返回 None"""
+    data = []
+    try:
+        with metrics.timer('list_page'):
+            async with browser_manager.page() as page:
+                await page.goto(url, timeout=60000)
+
+                link_elements = await page.query_selector_all("a.Product-item")
+                for link_element in link_elements:
+                    href = await link_element.get_attribute("href")
+                    data.append(f'{href}?locale=zh-hant')                
+    except Exception as e:
+        logging.warning(f"爬取文章列表 {url} 時發生錯誤: {e}")
+        return None # 與「沒有產品的空白頁」區分，避免分頁提前結束
+    metrics.inc('list_links', len(data))
+    return data # 返回產品 URL 列表
+
+async def crawl_pages(browser_manager, base_url, limiter, queue, frontier, concurrency=DEFAULT_LIST_CONCURRENCY, max_pages=None):
+    """並行抓取分類列表頁，遇到第一個空白頁即停止
+
+    最多同時抓取 concurrency 頁，結果依頁碼順序處理；新的 URL 去重後寫入 frontier，
+    並立即放入 queue，讓產品頁 worker 不必等待全部列表頁完成。
+    frontier 中已存在的 URL (續跑時) 不會重複放入。返回 (依序排列的 URL dict, 已處理的頁數)。
+    """
+    async def fetch(page_no):
+        url = f"{base_url}{page_no}"
+        with metrics.timer('rate_limit_wait'):
+            await limiter.acquire(url)
+        logging.info(f"開始從 {url} 爬取資料...")
+        return await crawl_list(browser_manager, url)
 
-def connect_to_db():
-    """建立並返回資料庫連線"""
+    seen = {} # 以 dict 當作保留順序的 set
+    pending = {}
+    next_page = 1
+    current = 1
+    processed = 0
+    failures = 0
     try:
-        mydb = mysql.connector.connect(
-            host=os.getenv("DB_HOST"),
-            user=os.getenv("DB_USER"),
-            password=os.getenv("DB_PASSWORD"),
-            database=os.getenv("DB_NAME")
-        )
-        print("資料庫連線成功。")
-        return mydb
-    except mysql.connector.Error as err:
-        print(f"資料庫連線失敗：{err}")
-        return None
-
-async def crawl_list(url):
-    """從指定 URL 爬取文章 ID 和連結"""
-    async with async_playwright() as p:
-        # 確保在無 X11 環境下執行
-        browser = await p.chromium.launch(headless=True, args=['--no-sandbox', '--disable-gpu', '--disable-dev-shm-usage'])
-        page = await browser.new_page()
-        await page.set_extra_http_headers(headers) # 設定 headers
+        while True:
+            while len(pending) < concurrency and (max_pages is None or next_page <= max_pages):
+                pending[next_page] = asyncio.create_task(fetch(next_page))
+                next_page += 1
+            if current not in pending:
+                break
+            urls = await pending.pop(current)
+            processed += 1
+            if urls is None:
+                failures += 1
+                if failures >= MAX_LIST_FAILURES:
+                    logging.warning(f"列表頁連續失敗 {failures} 次，停止分頁。")
+                    break
+            elif not urls:
+                logging.info(f"第 {current} 頁沒有產品，停止分頁。")
+                break
+            else:
+                failures = 0
+                new_urls = [url for url in urls if url not in seen]
+                for url in new_urls:
+                    seen[url] = None
+                for url in frontier.add(new_urls):
+                    queue.put_nowait(url)
+            current += 1
+    finally:
+        # 已超過最後一頁的請求不再需要
+        for task in pending.values():
+            task.cancel()
+        await asyncio.gather(*pending.values(), return_exceptions=True)
+    return seen, processed
+
+def extract_product_json(page_content):
+    """從頁面 HTML 中取出 app.value('product', JSON.parse('...')) 的產品 JSON；找不到或無法解析時返回 None"""
+    with metrics.timer('json_parse'):
+        # 使用正則表達式尋找內容並轉換為 JSON
+        match = PRODUCT_JSON_RE.search(page_content)
+        if not match:
+            logging.warning("未找到匹配的內容。")
+            metrics.error('json_parse')
+            return None
+        extracted_content = match.group(1)
+        extracted_content = extracted_content.replace("\\\"", "\"")
         try:
+            return json.loads(extracted_content)
+        except json.JSONDecodeError as json_err:
+            logging.warning(f"解析 JSON 時發生錯誤: {json_err}")
+            metrics.error('json_parse')
+            return None
+
+def extract_product_detail(page_content):
+    """從伺服器端 HTML 取出 <div class="ProductDetail-description"> 的文字；沒有內容時返回空字串"""
+    # 只解析描述區塊，避免為整頁建立 DOM
+    with metrics.timer('html_parse'):
+        strainer = SoupStrainer('div', class_='ProductDetail-description')
+        element = BeautifulSoup(page_content, 'html.parser', parse_only=strainer).find('div')
+    if element is None:
+        return ''
+    return element.get_text("\n", strip=True).replace("商品描述", "").strip()
+
+async def fetch_product_http(session, url):
+    """以 aiohttp 取得產品頁 HTML 並解析；返回 (json_data, product_detail)"""
+    with metrics.timer('product_http'):
+        async with session.get(url, timeout=aiohttp.ClientTimeout(total=60)) as response:
+            if response.status != 200:
+                logging.warning(f"HTTP 取得 {url} 失敗，狀態碼: {response.status}")
+                metrics.error('product_http')
+                return None, ''
+            body = await response.read()
+            metrics.add_bytes('product_http', len(body))
+            page_content = await response.text() # 使用已讀取的內容解碼
+    return extract_product_json(page_content), extract_product_detail(page_content)
+
+async def fetch_product_browser(browser_manager, url):
+    """以 Playwright 渲染產品頁並解析；返回 (json_data, product_detail)"""
+    async with browser_manager.page() as page:
+        with metrics.timer('product_browser'):
             await page.goto(url, timeout=60000)
+            # 取得頁面內容
+            page_content = await page.content()
+        metrics.add_bytes('product_browser', len(page_content.encode('utf-8')))
+
+        # 取得 product_details
+        # 取得 <div class="ProductDetail-description"> 的內容
+        product_detail = ''
+        try:
+            product_detail_element = page.locator('div.ProductDetail-description')
+            product_detail_raw = await product_detail_element.inner_text()
+            product_detail = product_detail_raw.replace("商品描述", "").strip() # 排除 "商品描述" 並移除可能的空白字元
+        except Exception as product_detail_e:
+            logging.warning(f"無法取得產品詳細內容 for {url}: {product_detail_e}")
+    return extract_product_json(page_content), product_detail
+
+async def fetch_product(session, browser_manager, limiter, url, fetch_mode=DEFAULT_FETCH_MODE):
+    """依 fetch_mode 取得產品資料
+
+    auto: 先以 HTTP 取得伺服器端 HTML，發生錯誤或缺少產品 JSON、描述文字時才改用 Playwright。
+    http: 只使用 HTTP；browser: 只使用 Playwright。
+    呼叫端在呼叫前已為第一次請求取得 limiter 的 token；改用 Playwright 時會再對同一網站發出請求，需另外取得一個 token。
+    """
+    if fetch_mode != 'browser':
+        try:
+            json_data, product_detail = await fetch_product_http(session, url)
+        except Exception as e:
+            if fetch_mode == 'http':
+                raise
+            # 連線錯誤或解析失敗時仍可由瀏覽器取得
+            logging.info(f"HTTP 取得 {url} 時發生錯誤，改用瀏覽器渲染: {e}")
+            json_data, product_detail = None, ''
+        if fetch_mode == 'http' or (json_data and product_detail):
+            fetch_stats['http'] += 1
+            return json_data, product_detail
+        logging.debug(f"{url} 的 HTML 缺少產品資料或描述，改用瀏覽器渲染。")
+        fetch_stats['fallback'] += 1
+        with metrics.timer('rate_limit_wait'):
+            await limiter.acquire(url)
+    fetch_stats['browser'] += 1
+    return await fetch_product_browser(browser_manager, url)
+
+def _ignore_result(ok, error=None):
+    pass
+
+async def process_product(session, browser_manager, limiter, writer, fingerprints, downloader, url, fetch_mode=DEFAULT_FETCH_MODE, on_finish=_ignore_result):
+    """爬取單一產品頁面的內容、圖片並寫入資料庫；內容指紋未變時略過寫入與圖片下載
+
+    處理結果以 on_finish(ok, error) 通知一次：ok 為 True 表示產品資料已 commit (或內容未變不需寫入) 且圖片完整，
+    False 表示需要重試。資料交給 writer 時，要等到所屬批次 commit 或寫入失敗後才會通知。
+    """
+    json_data, product_detail = await fetch_product(session, browser_manager, limiter, url, fetch_mode)
+    if not json_data:
+        on_finish(False, "未取得產品資料")
+        return
+    logging.debug(f"產品詳細內容: {product_detail}")
+
+    product_id = json_data.get('_id', '')
+    try:
+        await save_product(writer, fingerprints, downloader, url, json_data, product_detail, on_finish)
+    except Exception:
+        # 任何步驟失敗都不保留指紋，重試時重新寫入與下載
+        fingerprints.forget(product_id)
+        raise
+
+async def save_product(writer, fingerprints, downloader, url, json_data, product_detail, on_finish):
+    """下載產品圖片並把規格資料交給 writer；指紋在資料 commit 且圖片完整後才記錄"""
+    product_id = json_data.get('_id', '')
+    product_title = json_data.get('title_translations', {}).get('zh-hant', '')
+    product_summary = json_data.get('summary_translations', {}).get('zh-hant', '')
+    medias = json_data.get('media', [])
+
+    product_dir = "products"
+    product_id_dir = os.path.join(product_dir, product_id)
+
+    # 與上次爬取的指紋相同代表內容未變；圖片目錄遺失時仍重新下載圖片
+    fingerprint = product_fingerprint(json_data, product_detail)
+    unchanged = fingerprints.is_unchanged(product_id, fingerprint)
+    if unchanged and os.path.isdir(product_id_dir):
+        fingerprints.stats['images_skipped'] += len(medias)
+        metrics.inc('products_unchanged')
+        logging.debug(f"產品 {product_id} 內容未變，略過寫入與圖片下載。")
+        on_finish(True)
+        return
+
+    # 檢查並建立目錄
+    if not os.path.exists(product_id_dir):
+        os.makedirs(product_id_dir, exist_ok=True)
+        logging.debug(f"已建立目錄: {product_id_dir}")
 
-            link_elements = await page.query_selector_all("a.Product-item")
-            data = []
-            for link_element in link_elements:
-                href = await link_element.get_attribute("href")
-                data.append(f'{href}?locale=zh-hant')                
+    rows = []
+    variations = json_data.get('variations', [])
+    for variation in variations:
+        option_id = variation.get('key', '')
+
+        price = variation.get('price', {}).get('dollars', 0)*4
+        logging.debug(f"價格: {price}")
+
+        product_fields = []
+        fields = variation.get('fields', [])
+        for field in fields:
+            name = field.get('name_translations', {}).get('zh-hant', '')
+            product_fields.append(name)
+
+        product_option = '+ '.join(product_fields) # Convert set to string
+        logging.debug(f"產品選項: {product_option}")
+
+        rows.append({
+            'product_id': product_id,
+            'option_id': option_id,
+            'url': url,
+            'name': product_title,
+            'summary': product_summary,
+            'price': price,
+            'option': product_option,
+            'detail': product_detail,
+            'fingerprint': fingerprint,
+        })
+
+    # 下載圖片
+    items = []
+    count = 0
+    for image in medias:
+    # for image in medias[:2]:
+        image_url = image.get('images', {}).get('original', {}).get('url', '')
+        count += 1
+        image_url = re.sub(r'\?.*$', '', image_url)
+
+        if image_url:
+            saved_name = f"{product_id}_{count}.jpg"
+            items.append((image_url, os.path.join(product_id_dir, saved_name)))
+    metrics.inc('variations', len(rows))
+    with metrics.timer('product_images'):
+        results = await downloader.download_many(items)
+    images_complete = 'failed' not in results
+    if not images_complete:
+        # 圖片不完整時資料庫也不保存指紋，讓重試與下一次爬取重新處理此產品
+        for row in rows:
+            row['fingerprint'] = ''
+
+    def saved(ok):
+        if ok and images_complete:
+            fingerprints.record(product_id, fingerprint)
+            on_finish(True)
+        else:
+            fingerprints.forget(product_id)
+            on_finish(False, "圖片下載失敗" if ok else "寫入資料庫失敗")
+
+    # 交給批次寫入器，累積到一定筆數後一次寫入並 commit
+    if not unchanged or not images_complete:
+        await writer.add_product(rows, saved) # 佇列已滿時等待，資料庫寫入較慢時放慢爬取
+    else:
+        on_finish(True) # 內容未變，只補齊遺失的圖片目錄
+
+def finish_url(frontier, url, ok, error=None):
+    """依產品處理結果更新 frontier"""
+    if ok:
+        frontier.mark_done(url)
+        metrics.inc('products_done')
+    else:
+        frontier.mark_failed(url, error or "未取得產品資料或圖片下載失敗")
+        metrics.error('product')
+
+async def detail_worker(worker_id, browser_manager, session, queue, limiter, writer, fingerprints, downloader, frontier, fetch_mode=DEFAULT_FETCH_MODE):
+    """從共用佇列取出 URL 逐一處理，取到 None 時結束；需要渲染時向 browser_manager 借用獨立的 context
+
+    每個 URL 先向 frontier 認領，處理結果 (完成或失敗原因) 寫回 frontier。產品資料要等所屬批次 commit 後才標記完成，
+    程式在 commit 前中斷時 URL 仍為 in_progress，續跑時會重新處理。
+    """
+    while True:
+        url = await queue.get()
+        if url is None:
+            break
+        if not frontier.claim(url):
+            continue # 已完成或已由其他 worker 處理
+        try:
+            # 依 host 的 token bucket 控制請求速率，取代固定的隨機延遲
+            with metrics.timer('rate_limit_wait'):
+                await limiter.acquire(url)
+            # 發生例外時 browser_manager 會關閉該 context，不影響其他 worker
+            with metrics.timer('product'):
+                await process_product(session, browser_manager, limiter, writer, fingerprints, downloader, url, fetch_mode,
+                                      on_finish=functools.partial(finish_url, frontier, url))
         except Exception as e:
-            print(f"爬取文章列表 {url} 時發生錯誤: {e}")
-            data = [] # 發生錯誤時返回空列表
+            logging.error(f"[worker {worker_id}] 爬取單篇文章 {url} 時發生錯誤: {e}")
+            frontier.mark_failed(url, e)
+
+async def crawl_single(writer, fingerprints, frontier, data, browser_manager, limiter, concurrency=DEFAULT_CONCURRENCY, fetch_mode=DEFAULT_FETCH_MODE,
+                       image_concurrency=DEFAULT_IMAGE_CONCURRENCY, image_workers=None):
+    """以 worker pool 並行爬取產品內容、圖片，並透過 writer (AsyncProductWriter) 批次寫入資料庫
+
+    fingerprints (FingerprintIndex) 用來判斷產品內容是否與上次爬取相同；
+    frontier (Frontier) 記錄每個 URL 的處理狀態，供中斷後續跑與失敗重試。
+
+    data 可以是 URL 列表，或是由生產者持續放入 URL 的 asyncio.Queue；
+    使用 Queue 時，生產者結束後需放入 concurrency 個 None 通知 worker 結束。
+    """
+    concurrency = max(1, concurrency)
+    if isinstance(data, asyncio.Queue):
+        queue = data
+    else:
+        queue = asyncio.Queue()
+        for url in data:
+            queue.put_nowait(url)
+        for _ in range(concurrency):
+            queue.put_nowait(None)
+
+    # 共用連線池；壓縮編碼交由 aiohttp 自行協商
+    connector = aiohttp.TCPConnector(limit=concurrency + image_concurrency, limit_per_host=max(concurrency, image_concurrency), ttl_dns_cache=300)
+    session_headers = {k: v for k, v in headers.items() if k != 'Accept-Encoding'}
+    async with aiohttp.ClientSession(connector=connector, headers=session_headers) as session:
+        # 圖片下載使用獨立的 semaphore，所有 worker 共用同一個上限
+        store = ImageStore()
+        processor = ImageProcessor(store, max_workers=image_workers)
+        downloader = ImageDownloader(session, store, processor=processor, concurrency=image_concurrency)
+        try:
+            await asyncio.gather(*[
+                detail_worker(i, browser_manager, session, queue, limiter, writer, fingerprints, downloader, frontier, fetch_mode)
+                for i in range(concurrency)
+            ])
         finally:
-            await browser.close() # 確保瀏覽器關閉
-        return data # 返回包含 (文章編號, URL) 元組的列表
-
-async def crawl_single(mydb, data):
-    """爬取單篇文章內容、圖片並寫入資料庫 (Refactored to use process_single_article)"""
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=True, args=['--no-sandbox', '--disable-gpu', '--disable-dev-shm-usage'])
-        page = await browser.new_page()
-        await page.set_extra_http_headers(headers)
-
-        async with aiohttp.ClientSession() as session:
-            for url in data:
-
-                # 加入隨機延遲，控制請求速率
-                await asyncio.sleep(random.randint(2, 5))
-
-                # 依序處理每篇文章
-                try:
-                    await page.goto(url, timeout=60000)
-                    # 取得頁面內容
-                    page_content = await page.content()
-                    print(f"頁面內容 for {url}:")
-
-                    # 取得 product_details
-                    # 取得 <div class="ProductDetail-description"> 的內容
-                    try:
-                        product_detail_element = page.locator('div.ProductDetail-description')
-                        product_detail_raw = await product_detail_element.inner_text()
-                        product_detail = product_detail_raw.replace("商品描述", "").strip() # 排除 "商品描述" 並移除可能的空白字元
-                        print(f"產品詳細內容: {product_detail}")
-                    except Exception as product_detail_e:
-                        print(f"無法取得產品詳細內容 for {url}: {product_detail_e}")
-
-                    # 使用正則表達式尋找內容並轉換為 JSON
-                    match = re.search(r"app\.value\('product', JSON\.parse\('(.*?)'\)\);", page_content)
-                    if match:
-                        extracted_content = match.group(1)
-                        extracted_content = extracted_content.replace("\\\"", "\"")
-                        try:
-                            json_data = json.loads(extracted_content)
-                        except json.JSONDecodeError as json_err:
-                            print(f"解析 JSON 時發生錯誤: {json_err}")
-                            continue                        
-                    else:
-                        print("未找到匹配的內容。")
-
-                    product_id = json_data.get('_id', '')
-                    product_title = json_data.get('title_translations', {}).get('zh-hant', {})
-                    product_summary = json_data.get('summary_translations', {}).get('zh-hant', {})
-                    
-                    variations = json_data.get('variations', [])
-                    for variation in variations:
-                        option_id = variation.get('key', '')
-
-                        # 檢查並建立目錄
-                        product_dir = "products"
-                        product_id_dir = os.path.join(product_dir, product_id)
-                        if not os.path.exists(product_dir):
-                            os.makedirs(product_dir)
-                            print(f"已建立目錄: {product_dir}")
-                        if not os.path.exists(product_id_dir):
-                            os.makedirs(product_id_dir)
-                            print(f"已建立目錄: {product_id_dir}")
-
-                        price = variation.get('price', {}).get('dollars', 0)*4
-                        print(f"價格: {price}")
-
-                        product_fields = []
-                        fields = variation.get('fields', [])
-                        for field in fields:
-                            name = field.get('name_translations', {}).get('zh-hant', '')
-                            product_fields.append(name)
-
-                        product_option = '+ '.join(product_fields) # Convert set to string
-                        print(f"產品選項: {product_option}")
-
-                        # 將資料寫入資料庫
-                        try:
-                            cursor = mydb.cursor()
-                            
-                            sql = "INSERT INTO aowotoy_products (product_id, option_id, url, name, summary, price, option, detail) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)"
-                            val = (product_id, 
-                                option_id if 'option_id' in locals() else '',
-                                url if 'url' in locals() else '',
-                                product_title if 'product_title' in locals() else '',
-                                product_summary if 'product_summary' in locals() else '',
-                                price if 'price' in locals() else 0,
-                                product_option if 'product_option' in locals() else '',
-                                product_detail if 'product_detail' in locals() else '')                                
-                            
-                            cursor.execute(sql, val)
-                            mydb.commit()
-                            print(f"資料已成功寫入資料庫，ID: {cursor.lastrowid}")
-                            cursor.close()
-                        except mysql.connector.Error as err:
-                            print(f"寫入資料庫時發生錯誤 for {url}: {err}")
-                            if mydb.is_connected():
-                                mydb.rollback() # 發生錯誤時回滾事務
-
-                    # 下載圖片
-                    count = 0
-                    medias = json_data.get('media', [])
-                    for image in medias:
-                    # for image in medias[:2]:
-                        image_url = image.get('images', {}).get('original', {}).get('url', '')
-                        count += 1
-                        image_url = re.sub(r'\?.*$', '', image_url)
-                        
-                        if image_url:
-                            image_name = os.path.basename(image_url)
-                            image_ext = os.path.splitext(image_name)[1]
-                            saved_name = f"{product_id}_{count}.jpg"
-                            image_path = os.path.join(product_id_dir, saved_name)
-
-                            async with session.get(image_url) as img_response:
-                                with open(image_path, 'wb') as img_file:
-                                    img_file.write(await img_response.read())
-
-                except Exception as e:
-                    print(f"爬取單篇文章 {url} 時發生錯誤: {e}")
-
-
-        await browser.close()
-
-async def main():
+            processor.close()
+            downloader.save_index()
+            logging.info(downloader.summary())
+
+async def main(concurrency=DEFAULT_CONCURRENCY, rate=DEFAULT_RATE, burst=DEFAULT_BURST, recycle_after=DEFAULT_RECYCLE_AFTER,
+               list_concurrency=DEFAULT_LIST_CONCURRENCY, max_pages=None, fetch_mode=DEFAULT_FETCH_MODE,
+               db_batch_size=DEFAULT_DB_BATCH_SIZE, db_queue_size=DEFAULT_DB_QUEUE_SIZE, full_refresh=False, image_concurrency=DEFAULT_IMAGE_CONCURRENCY,
+               image_workers=None, resume=False, frontier_path=DEFAULT_FRONTIER_PATH, max_attempts=DEFAULT_MAX_ATTEMPTS,
+               metrics_path=None, metrics_interval=DEFAULT_REPORT_INTERVAL):
     mydb = connect_to_db() 
     if not mydb: 
-        print("無法連線到資料庫，程式終止。")
+        logging.error("無法連線到資料庫，程式終止。")
         return 
         
     base_url = "https://www.aowotoys.com/categories/aowobox-displaybox?sort_by=created_at&order_by=desc&limit=72&page="
-    max_page = 33 # 設定最大頁數
-    data = [] # 初始化資料列表
+    browser_manager = BrowserManager(headers=headers, recycle_after=recycle_after)
+    fingerprints = FingerprintIndex() if full_refresh else FingerprintIndex.load(mydb)
+    # 載入指紋後，連線只由寫入執行緒使用
+    writer = AsyncProductWriter(ProductWriter(mydb, batch_size=db_batch_size), max_pending=db_queue_size).start()
+    limiter = HostRateLimiter(rate, burst) # 列表頁與產品頁共用同一組 host bucket
+    frontier = Frontier(frontier_path)
+    queue = asyncio.Queue()
+    pages = 0
+    # 定期輸出各 stage 的耗時與處理量，並更新量測檔案
+    reporter = asyncio.ensure_future(report_periodically(metrics, metrics_interval, metrics_path)) if metrics_interval > 0 else None
+
+    if resume:
+        # 續跑：上次中斷時處理中的 URL 重新排入，未完成的 URL 優先處理
+        recovered = frontier.recover()
+        for url in frontier.pending():
+            queue.put_nowait(url)
+        logging.info(f"從 {frontier_path} 續跑：{queue.qsize()} 個待處理 URL (其中 {recovered} 個為中斷時處理中)。")
+    else:
+        frontier.reset()
+
+    async def produce_urls():
+        nonlocal pages
+        try:
+            urls, pages = await crawl_pages(browser_manager, base_url, limiter, queue, frontier,
+                                            concurrency=list_concurrency, max_pages=max_pages)
+            logging.info(f"共從 {pages} 個列表頁取得 {len(urls)} 個不重複的產品連結。")
+        finally:
+            # 通知所有產品頁 worker 已無新的 URL
+            for _ in range(max(1, concurrency)):
+                queue.put_nowait(None)
 
     try:
-        
-        for page in range(1, max_page+1):  
-            url = f"{base_url}{page}"
-            print(f"開始從 {url} 爬取資料...")
-            list = await crawl_list(url)
-            data = data+list            
-        
         # 測試用內容
         # data = []
         # data.append("https://www.aowotoys.com/products/aowobox-pop-mart-dimoo-whisper-of-the-rose-figure-theme-display-box?locale=zh-hant") 
+        # await crawl_single(writer, fingerprints, frontier, data, browser_manager, limiter, concurrency=concurrency, fetch_mode=fetch_mode)
 
-        if data: # 確保有資料才繼續
-            print("開始爬取文章內容、圖片並即時寫入資料庫...")
-            await crawl_single(mydb, data) 
-        else:
-            print("未找到任何文章連結或爬取列表時發生錯誤。")
+        logging.info("開始爬取列表頁，並同時爬取文章內容、圖片並即時寫入資料庫...")
+        await asyncio.gather(
+            produce_urls(),
+            crawl_single(writer, fingerprints, frontier, queue, browser_manager, limiter, concurrency=concurrency, fetch_mode=fetch_mode,
+                         image_concurrency=image_concurrency, image_workers=image_workers),
+        )
+
+        # 另一輪重試失敗的 URL，直到嘗試次數達到 max_attempts；
+        # 先等待已交給 writer 的資料 commit，寫入失敗的 URL 才會標記為 failed
+        await writer.flush()
+        retry_urls = frontier.failed(max_attempts)
+        while retry_urls:
+            logging.info(f"重試 {len(retry_urls)} 個失敗的 URL...")
+            await crawl_single(writer, fingerprints, frontier, retry_urls, browser_manager, limiter, concurrency=concurrency,
+                               fetch_mode=fetch_mode, image_concurrency=image_concurrency, image_workers=image_workers)
+            await writer.flush()
+            retry_urls = frontier.failed(max_attempts)
 
         # print("爬取與寫入流程完成。") 
     except Exception as e:
-        print(f"執行 main 函數時發生未預期錯誤: {e}")
+        logging.error(f"執行 main 函數時發生未預期錯誤: {e}")
     finally:
-        if mydb and mydb.is_connected(): # 確保連線存在且開啟才關閉
-            mydb.close()
-            print("資料庫連線已關閉。")
+        try:
+            stats = await writer.close() # 等待佇列清空並寫入尚未送出的批次
+        except Exception as e:
+            logging.error(f"寫入資料庫時發生未預期錯誤，部分產品未寫入 (已標記為失敗): {e}")
+            stats = writer.writer.stats
+        logging.info(fingerprints.summary())
+        logging.info(f"資料庫寫入統計：新增 {stats['inserted']}、更新 {stats['updated']}、未變 {stats['unchanged']}、失敗 {stats['failed']}；"
+              f"因寫入佇列已滿等待 {writer.stats['backpressure_waits']} 次 (共 {writer.stats['backpressure_seconds']:.1f} 秒)。")
+        await browser_manager.close()
+        counts = frontier.counts()
+        frontier.close()
+        logging.info(f"爬取佇列狀態：完成 {counts['done']}、失敗 {counts['failed']}、待處理 {counts['pending'] + counts['in_progress']}。")
+        logging.info(f"產品頁取得方式：HTTP {fetch_stats['http']} 頁、瀏覽器 {fetch_stats['browser']} 頁 (其中 {fetch_stats['fallback']} 頁由 HTTP 退回)。")
+        # 舊流程每個列表頁各啟動一次瀏覽器，產品頁再啟動一次
+        report = browser_manager.startup_report(legacy_launches=pages + 1)
+        logging.info(f"瀏覽器啟動 {report['launches']} 次 (共 {report['launch_seconds']} 秒)，"
+              f"省下 {report['launches_avoided']} 次冷啟動，約 {report['seconds_saved']} 秒；"
+              f"context 建立 {report['contexts_created']} 個、回收 {report['contexts_recycled']} 個。")
+        mydb.close() # 歸還連線池
+        logging.info(pool_summary())
+        if reporter is not None:
+            reporter.cancel()
+            await asyncio.gather(reporter, return_exceptions=True)
+        logging.info(metrics.summary())
+        if metrics_path:
+            metrics.write(metrics_path)
+            logging.info(f"量測結果已寫入 {metrics_path}。")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="爬取 aowotoys 產品資料")
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY, help="同時爬取產品頁面的 worker 數量")
+    parser.add_argument('--rate', type=float, default=DEFAULT_RATE, help="每個 host 每秒的請求數上限")
+    parser.add_argument('--burst', type=int, default=DEFAULT_BURST, help="token bucket 可累積的請求數")
+    parser.add_argument('--recycle-after', type=int, default=DEFAULT_RECYCLE_AFTER, help="browser context 使用幾次後回收")
+    parser.add_argument('--list-concurrency', type=int, default=DEFAULT_LIST_CONCURRENCY, help="同時抓取的列表頁數量")
+    parser.add_argument('--max-pages', type=int, default=None, help="列表頁數上限 (預設直到空白頁為止)")
+    parser.add_argument('--db-batch-size', type=int, default=DEFAULT_DB_BATCH_SIZE, help="累積多少筆規格資料後批次寫入資料庫")
+    parser.add_argument('--db-queue-size', type=int, default=DEFAULT_DB_QUEUE_SIZE, help="等待寫入資料庫的產品數上限")
+    parser.add_argument('--image-concurrency', type=int, default=DEFAULT_IMAGE_CONCURRENCY, help="同時下載的圖片數量")
+    parser.add_argument('--image-workers', type=int, default=None, help="圖片轉檔的行程數 (預設為 CPU 核心數)")
+    parser.add_argument('--resume', action='store_true', help="從上次中斷的進度繼續，不重設爬取佇列")
+    parser.add_argument('--frontier', default=DEFAULT_FRONTIER_PATH, help="記錄 URL 處理狀態的 SQLite 檔案")
+    parser.add_argument('--max-attempts', type=int, default=DEFAULT_MAX_ATTEMPTS, help="每個 URL 最多嘗試次數")
+    parser.add_argument('--full-refresh', action='store_true', help="忽略已儲存的內容指紋，重新寫入所有產品與圖片")
+    parser.add_argument('--fetch-mode', choices=FETCH_MODES, default=DEFAULT_FETCH_MODE, help="產品頁取得方式：auto 先走 HTTP，必要時才用瀏覽器")
+    parser.add_argument('--log-level', choices=LOG_LEVELS, default=DEFAULT_LOG_LEVEL, help="日誌等級；DEBUG 會輸出每個產品的描述、價格與選項")
+    parser.add_argument('--metrics-out', default=None, help="量測結果輸出檔案 (.prom 為 Prometheus 文字格式，其他為 JSON)")
+    parser.add_argument('--metrics-interval', type=float, default=DEFAULT_REPORT_INTERVAL, help="定期輸出量測摘要的間隔秒數 (0 表示只在結束時輸出)")
+    return parser.parse_args()
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    args = parse_args()
+    logging.basicConfig(level=args.log_level, format='%(asctime)s - %(levelname)s - %(message)s')
+    asyncio.run(main(concurrency=args.concurrency, rate=args.rate, burst=args.burst, recycle_after=args.recycle_after,
+                     list_concurrency=args.list_concurrency, max_pages=args.max_pages, fetch_mode=args.fetch_mode,
+                     db_batch_size=args.db_batch_size, db_queue_size=args.db_queue_size, full_refresh=args.full_refresh,
+                     image_concurrency=args.image_concurrency, image_workers=args.image_workers,
+                     resume=args.resume, frontier_path=args.frontier, max_attempts=args.max_attempts,
+                     metrics_path=args.metrics_out, metrics_interval=args.metrics_interval))
@@ -0,0 +1,229 @@
+"""
+描述:
+    露天 API 共用客戶端。金鑰只在第一次使用時從環境變數讀取一次，HMAC 金鑰預先建立，
+    每次請求只複製並加入簽章內容；所有請求共用一個 keep-alive 的 requests.Session。
+    JSON body 只序列化一次，簽章與實際送出的內容完全一致。
+    簽章: HMAC-SHA256(SecretKey, SaltKey + URL (含 query string) + Request Body + Timestamp)，
+    multipart/form-data 請求只將非檔案欄位 json encode 後加入簽章。
+    429/5xx 與連線錯誤以指數退避重試，並以 token bucket 限制整體請求速率。
+    非冪等的請求 (預設為 POST，例如新增商品) 只在 429 或請求尚未送出 (無法建立連線) 時重試，
+    逾時、連線中斷或 5xx 時請求可能已被處理，直接拋出 RutenAmbiguousError，由呼叫端確認結果後再決定是否重送。
+"""
+import sys
+import os
+
+# 將專案根目錄添加到 Python 路徑
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+import hashlib
+import hmac
+import json
+import logging
+import time
+from collections import Counter
+from contextlib import ExitStack
+from functools import lru_cache
+from urllib.parse import urlencode
+
+import requests
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from requests_toolbelt.multipart.encoder import MultipartEncoder
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+
+from src.utils.rate_limit import ThreadTokenBucket
+
+load_dotenv()
+
+BASE_URL = 'https://partner.ruten.com.tw'
+DEFAULT_USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+
+DEFAULT_POOL_SIZE = 4 # 連線池大小，並行使用時應不小於 worker 數
+DEFAULT_RATE = float(os.getenv('RUTEN_RATE', '2')) # 每秒最多發出的 API 請求數
+DEFAULT_BURST = 4 # token bucket 最多累積的請求數
+DEFAULT_RETRIES = 3
+DEFAULT_TIMEOUT = 60
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+MAX_CLOCK_SKEW = 300 # 露天要求 timestamp 與伺服器時間相差在五分鐘之內
+
+
+class RutenAPIError(Exception):
+    """露天 API 回傳失敗 (status 不是 success) 或重試後仍無法完成請求"""
+
+    def __init__(self, message, error_code=None):
+        super().__init__(message)
+        self.error_code = error_code
+
+
+class RutenAmbiguousError(RutenAPIError):
+    """非冪等的請求可能已送達露天但沒有取得結果 (逾時、連線中斷或 5xx)；重送前需先確認是否已經生效"""
+
+
+def _not_sent(error):
+    """連線錯誤是否發生在送出請求之前 (連線逾時、無法建立連線或 DNS 查詢失敗)"""
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], 'reason', None) if error.args else None
+    return isinstance(reason, (NewConnectionError, ConnectTimeoutError))
+
+
+class Credentials:
+    """露天 API 金鑰；HMAC 以 SecretKey 預先建立，簽章時只需 copy()"""
+
+    def __init__(self, api_key, secret_key, salt_key, user_agent=DEFAULT_USER_AGENT):
+        if not (api_key and secret_key and salt_key):
+            raise RutenAPIError("缺少露天 API 金鑰，請設定 RUTEN_API_KEY、RUTEN_SECRET_KEY 與 RUTEN_SALT_KEY。")
+        self.api_key = api_key
+        self.salt_key = salt_key
+        self.user_agent = user_agent
+        self._hmac = hmac.new(secret_key.encode('utf-8'), digestmod=hashlib.sha256)
+
+    def sign(self, url, body, timestamp):
+        signature = self._hmac.copy()
+        signature.update(f"{self.salt_key}{url}{body}{timestamp}".encode('utf-8'))
+        return signature.hexdigest()
+
+    def verify(self, url, body, timestamp, signature, max_skew=MAX_CLOCK_SKEW):
+        """驗證露天送來的請求 (例如即時通知) 的簽章與時間"""
+        try:
+            if abs(time.time() - int(timestamp)) > max_skew:
+                return False
+        except (TypeError, ValueError):
+            return False
+        return hmac.compare_digest(self.sign(url, body, timestamp), signature or '')
+
+
+@lru_cache(maxsize=None)
+def load_credentials():
+    """從環境變數讀取金鑰 (只讀取一次)"""
+    return Credentials(os.getenv('RUTEN_API_KEY'), os.getenv('RUTEN_SECRET_KEY'), os.getenv('RUTEN_SALT_KEY'),
+                       user_agent=os.getenv('RUTEN_USER_AGENT', DEFAULT_USER_AGENT))
+
+
+class RutenClient:
+    """以共用 session、簽章與速率限制呼叫露天 API；可在多個執行緒之間共用"""
+
+    def __init__(self, credentials=None, pool_size=DEFAULT_POOL_SIZE, rate=DEFAULT_RATE, burst=DEFAULT_BURST,
+                 retries=DEFAULT_RETRIES, backoff=1.0, timeout=DEFAULT_TIMEOUT, base_url=BASE_URL):
+        self.credentials = credentials or load_credentials()
+        self.base_url = base_url
+        self.retries = max(1, retries)
+        self.backoff = backoff
+        self.timeout = timeout
+        self.bucket = ThreadTokenBucket(rate, burst) # 所有執行緒共用同一個配額
+        self.session = requests.Session()
+        self.session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=max(1, pool_size)))
+        self.stats = Counter()
+
+    def close(self):
+        self.session.close()
+
+    def url(self, path, params=None):
+        """path 可為完整網址或 /api/v1/... 路徑；params 轉為 query string (簽章包含 query string)"""
+        url = path if path.startswith('http') else f"{self.base_url}{path}"
+        if params:
+            url += '?' + urlencode({key: value for key, value in params.items() if value is not None})
+        return url
+
+    def headers(self, url, sign_body=''):
+        timestamp = str(int(time.time()))
+        return {
+            'User-Agent': self.credentials.user_agent,
+            'X-RT-Key': self.credentials.api_key,
+            'X-RT-Timestamp': timestamp,
+            'X-RT-Authorization': self.credentials.sign(url, sign_body, timestamp),
+        }
+
+    def _retry_delay(self, response, attempt):
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return float(retry_after)
+        return self.backoff * (2 ** attempt)
+
+    def send(self, method, url, sign_body='', build_body=None, idempotent=True):
+        """送出請求並返回 data；build_body(stack) 每次嘗試重新產生 (body, content_type)，開啟的檔案由 stack 關閉
+
+        idempotent 為 False 時只在 429 或請求尚未送出時重試，其他可重試的錯誤直接拋出 RutenAmbiguousError。
+        """
+        error = None
+        for attempt in range(self.retries):
+            self.bucket.acquire()
+            response = None
+            with ExitStack() as stack:
+                body, content_type = build_body(stack) if build_body else (None, 'application/json')
+                headers = self.headers(url, sign_body)
+                headers['Content-Type'] = content_type
+                try:
+                    response = self.session.request(method, url, data=body, headers=headers, timeout=self.timeout)
+                    self.stats['requests'] += 1
+                except (requests.ConnectionError, requests.Timeout) as e:
+                    error = e
+                    if not idempotent and not _not_sent(e):
+                        raise RutenAmbiguousError(f"{method} {url} 未取得結果，請求可能已送出: {e}")
+                else:
+                    if response.status_code not in RETRYABLE_STATUS:
+                        return self._parse(response)
+                    error = f"HTTP {response.status_code}"
+                    if not idempotent and response.status_code != 429:
+                        raise RutenAmbiguousError(f"{method} {url} 失敗 ({error})，請求可能已被處理")
+            self.stats['retries'] += 1
+            if attempt + 1 < self.retries:
+                delay = self._retry_delay(response, attempt)
+                logging.warning(f"{method} {url} 失敗 ({error})，{delay:.1f} 秒後重試。")
+                time.sleep(delay)
+        raise RutenAPIError(f"{method} {url} 重試 {self.retries} 次後仍失敗: {error}")
+
+    def _parse(self, response):
+        try:
+            result = response.json()
+        except ValueError:
+            raise RutenAPIError(f"HTTP {response.status_code}: {response.text[:200]}")
+        if result.get('status') != 'success':
+            raise RutenAPIError(result.get('error_msg') or f"HTTP {response.status_code}", result.get('error_code'))
+        return result.get('data')
+
+    def request(self, method, path, params=None, payload=None, idempotent=None):
+        """送出 JSON 請求；payload 只序列化一次，簽章與 body 使用同一個字串
+
+        idempotent 未指定時 POST 視為非冪等 (見 send())，其他方法視為冪等。
+        """
+        url = self.url(path, params)
+        if idempotent is None:
+            idempotent = method != 'POST'
+        if payload is None:
+            return self.send(method, url, idempotent=idempotent)
+        body = json.dumps(payload)
+        return self.send(method, url, body, lambda stack: (body.encode('utf-8'), 'application/json'), idempotent)
+
+    def get(self, path, params=None):
+        return self.request('GET', path, params=params)
+
+    def post(self, path, payload=None, params=None, idempotent=False):
+        """只查詢或重複送出結果相同的 POST (例如查詢訂單明細) 可指定 idempotent=True 以一般方式重試"""
+        return self.request('POST', path, params=params, payload=payload, idempotent=idempotent)
+
+    def put(self, path, payload=None, params=None):
+        return self.request('PUT', path, params=params, payload=payload)
+
+    def post_multipart(self, path, fields, files):
+        """以 multipart/form-data 串流上傳檔案；fields 為非檔案欄位 (dict)，files 為 [(欄位名稱, 檔案路徑, content_type)]
+
+        目前只用於設定商品圖片 (取代原有圖片，重送結果相同)，視為冪等的請求重試。
+        """
+        url = self.url(path)
+        sign_body = json.dumps(fields) # 只有非檔案欄位加入簽章
+
+        def build_body(stack):
+            parts = list(fields.items())
+            for name, file_path, content_type in files:
+                parts.append((name, (os.path.basename(file_path), stack.enter_context(open(file_path, 'rb')), content_type)))
+            encoder = MultipartEncoder(fields=parts)
+            return encoder, encoder.content_type
+
+        return self.send('POST', url, sign_body, build_body, idempotent=True)
+
+
+@lru_cache(maxsize=None)
+def get_client():
+    """返回整個程序共用的 RutenClient"""
+    return RutenClient()
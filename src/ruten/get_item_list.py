@@ -1,63 +1,107 @@
-import time
-import hmac
-import hashlib
-import json
-import requests
+"""
+描述:
+    取得本賣家所有露天商品並寫入本機快取 (item_cache.ItemCache)。
+    先以第一頁的 total 算出總頁數，其餘頁面並行取得；再只對新商品或 last_update 有變動的商品
+    並行呼叫 /product/item/{item_id} 取得賣家自用料號與規格。所有請求共用 client.RutenClient 的速率限制。
+"""
+import sys
 import os
-from dotenv import load_dotenv
+
+# 將專案根目錄添加到 Python 路徑
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+import argparse
+import json
 import logging
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from src.ruten.client import RutenAPIError, RutenClient, get_client
+from src.ruten.item_cache import ItemCache
 
 # 配置日誌記錄
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-def upload_product(product_data: dict):
-    load_dotenv() 
+ITEM_LIST_PATH = '/api/v1/product/list'
+ITEM_PATH = '/api/v1/product/item'
+PAGE_LIMIT = 500 # 每頁筆數 (露天上限 9999)
+DEFAULT_WORKERS = 4
+DEFAULT_CACHE_PATH = os.getenv('RUTEN_ITEM_CACHE', 'ruten_items.sqlite3')
 
-    api_key = os.getenv('RUTEN_API_KEY')
-    secret_key = os.getenv('RUTEN_SECRET_KEY')
-    salt_key = os.getenv('RUTEN_SALT_KEY')
-    timestamp = int(time.time()) 
+def get_item_list(status='all', offset=1, limit=25, client=None):
+    """查詢商品列表的一頁 (status: all/on/off/out，limit 上限 9999)，返回 data ({total, items})"""
+    return (client or get_client()).get(ITEM_LIST_PATH, params={'status': status, 'offset': offset, 'limit': limit}) or {}
 
-    url = 'https://partner.ruten.com.tw/api/v1/product/list'
-    user_agent = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-    
-    post_body = json.dumps(product_data)
+def get_all_items(status='all', limit=PAGE_LIMIT, workers=DEFAULT_WORKERS, client=None):
+    """取得所有商品列表；offset 依露天文件視為從 1 開始的頁碼，第二頁以後並行取得"""
+    client = client or get_client()
+    first = get_item_list(status, 1, limit, client)
+    items = {str(item['item_id']): item for item in first.get('items') or []}
+    pages = math.ceil(int(first.get('total') or 0) / limit)
+    if pages > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(get_item_list, status, page, limit, client) for page in range(2, pages + 1)]
+            for future in as_completed(futures):
+                for item in future.result().get('items') or []:
+                    items[str(item['item_id'])] = item # 翻頁期間商品有異動時可能重複出現
+    return list(items.values())
 
-    message = (salt_key + url + post_body + str(timestamp)).encode('utf-8')
-    signature = hmac.new(secret_key.encode('utf-8'), message, hashlib.sha256).hexdigest()
+def get_item(item_id, client=None):
+    """取得單一商品資料 (含 custom_no 與 spec_info)"""
+    return (client or get_client()).get(f"{ITEM_PATH}/{item_id}")
 
-    headers = {
-        'User-Agent': user_agent,
-        'X-RT-Key': api_key,
-        'X-RT-Timestamp': str(timestamp), # Timestamp needs to be string in header
-        'X-RT-Authorization': signature,
-    }
+def refresh_cache(cache, workers=DEFAULT_WORKERS, full=False, client=None):
+    """更新快取：寫入完整的商品列表，再只取得新商品或有變動的商品資料；返回 (商品數, 更新商品資料數, 失敗數)"""
+    client = client or get_client()
+    start = time.monotonic()
+    items = get_all_items(workers=workers, client=client)
+    cache.update_listing(items, complete=True)
+    stale = [str(item['item_id']) for item in items] if full else cache.stale()
+    logging.info(f"共 {len(items)} 個商品，{len(stale)} 個需要更新商品資料。")
 
-    try:
-        response = requests.get(url, json=product_data, headers=headers)
-        response.raise_for_status() # Raise an exception for HTTP errors (4xx or 5xx)
-        logging.info(f"Product upload successful: {response.text}")
-        # {"status":"success","data":{"item_id":"22523776659295","custom_no":"64f2172741270d001184247e"},"error_code":null,"error_msg":null}
-        # 這段要回寫到資料庫中備存
-    except requests.exceptions.RequestException as e:
-        logging.error(f"Request failed: {e}")
-        if hasattr(e, 'response') and e.response is not None:
-            logging.error(f"Status Code: {e.response.status_code}")
+    updated = failed = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(get_item, item_id, client): item_id for item_id in stale}
+        for future in as_completed(futures):
             try:
-                error_response_text = e.response.content.decode('utf-8', errors='ignore')
-                error_data = json.loads(error_response_text)
-
-
-
-                logging.error(f"Response JSON: {json.dumps(error_data, ensure_ascii=False, indent=2)}")
+                detail = future.result()
+            except RutenAPIError as e:
+                failed += 1
+                logging.error(f"取得商品 {futures[future]} 資料失敗: {e} (error_code: {e.error_code})")
+                continue
+            if detail:
+                cache.store_detail(detail) # 只在主執行緒寫入 SQLite
+                updated += 1
+    logging.info(f"商品快取更新完成：{len(items)} 個商品，更新 {updated} 個商品資料，失敗 {failed} 個，"
+                 f"共 {client.stats['requests']} 次請求，耗時 {time.monotonic() - start:.1f} 秒。")
+    return len(items), updated, failed
 
-
-            except (UnicodeDecodeError, json.JSONDecodeError):
-                logging.error(f"Response Text (raw): {e.response.content}")
+def parse_args():
+    parser = argparse.ArgumentParser(description="取得本賣家所有露天商品並寫入本機快取")
+    parser.add_argument('--cache', default=DEFAULT_CACHE_PATH, help="快取檔案路徑")
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help="同時發出的請求數")
+    parser.add_argument('--full', action='store_true', help="重新取得所有商品資料，不只有變動的商品")
+    parser.add_argument('--lookup', nargs='+', help="只查詢快取中指定賣家自用料號對應的商品，不呼叫 API")
+    return parser.parse_args()
 
 if __name__ == '__main__':
-    # 示例產品資料
-    sample_product_data = {
-    }
-    upload_product(sample_product_data)
-    
+    args = parse_args()
+    cache = ItemCache(args.cache)
+    try:
+        if args.lookup:
+            for custom_no in args.lookup:
+                item_id = cache.item_id(custom_no)
+                logging.info(f"{custom_no}: {json.dumps(cache.get(item_id), ensure_ascii=False) if item_id else '不在快取中'}")
+        else:
+            client = RutenClient(pool_size=args.workers)
+            try:
+                refresh_cache(cache, workers=args.workers, full=args.full, client=client)
+            finally:
+                client.close()
+            logging.info(f"快取內容: {cache.counts()}")
+    except RutenAPIError as e:
+        logging.error(f"取得商品列表失敗: {e} (error_code: {e.error_code})")
+        sys.exit(1)
+    finally:
+        cache.close()
@@ -0,0 +1,140 @@
+"""
+描述:
+    本賣家露天商品的本機快取 (SQLite)。items 記錄商品列表 (/product/list) 的狀態、庫存與最後更新時間，
+    以及商品資料 (/product/item/{item_id}) 的名稱、售價與賣家自用料號；specs 記錄各規格的 spec_id 與料號。
+    custom_no 與 item_id 都有索引，上傳圖片、更新售價或比對差異時可直接查詢，不必每個商品呼叫一次 API。
+    商品列表的 last_update 比快取新時才需要重新取得商品資料 (見 stale())。
+"""
+import sqlite3
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    item_id TEXT PRIMARY KEY,
+    custom_no TEXT,
+    status TEXT,
+    stock INTEGER,
+    name TEXT,
+    price INTEGER,
+    has_spec INTEGER NOT NULL DEFAULT 0,
+    last_update INTEGER NOT NULL DEFAULT 0,
+    detail_update INTEGER NOT NULL DEFAULT -1,
+    fetched_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_items_custom_no ON items (custom_no);
+CREATE TABLE IF NOT EXISTS specs (
+    spec_id TEXT PRIMARY KEY,
+    item_id TEXT NOT NULL,
+    custom_no TEXT,
+    spec_name TEXT,
+    item_name TEXT,
+    price INTEGER,
+    qty INTEGER,
+    status INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_specs_custom_no ON specs (custom_no);
+CREATE INDEX IF NOT EXISTS idx_specs_item_id ON specs (item_id);
+"""
+
+
+class ItemCache:
+    """露天商品的本機快取；只在單一執行緒中寫入"""
+
+    def __init__(self, path='ruten_items.sqlite3'):
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+
+    def close(self):
+        self._conn.close()
+
+    def update_listing(self, items, complete=False):
+        """寫入商品列表 ({item_id, status, stock, last_update})
+
+        complete 為 True 時 items 代表完整的商品列表，快取中不在列表內的商品 (已刪除) 會一併移除。
+        """
+        now = time.time()
+        with self._conn:
+            self._conn.executemany(
+                "INSERT INTO items (item_id, status, stock, last_update, fetched_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (item_id) DO UPDATE SET status = excluded.status, stock = excluded.stock, "
+                "last_update = excluded.last_update, fetched_at = excluded.fetched_at",
+                [(str(item['item_id']), item.get('status'), item.get('stock'), int(item.get('last_update') or 0), now)
+                 for item in items],
+            )
+            if complete:
+                self._conn.execute("CREATE TEMP TABLE IF NOT EXISTS listed (item_id TEXT PRIMARY KEY)")
+                self._conn.execute("DELETE FROM listed")
+                self._conn.executemany("INSERT OR IGNORE INTO listed VALUES (?)", [(str(item['item_id']),) for item in items])
+                self._conn.execute("DELETE FROM specs WHERE item_id NOT IN (SELECT item_id FROM listed)")
+                self._conn.execute("DELETE FROM items WHERE item_id NOT IN (SELECT item_id FROM listed)")
+
+    def stale(self):
+        """返回需要重新取得商品資料的 item_id (新商品或 last_update 比上次取得時新)"""
+        rows = self._conn.execute("SELECT item_id FROM items WHERE detail_update < last_update ORDER BY item_id")
+        return [row[0] for row in rows]
+
+    def store_detail(self, detail):
+        """寫入 /product/item/{item_id} 的回傳資料，並記錄取得時對應的 last_update"""
+        item_id = str(detail['item_id'])
+        specs = detail.get('spec_info') or []
+        with self._conn:
+            self._conn.execute(
+                "UPDATE items SET custom_no = ?, name = ?, price = ?, has_spec = ?, detail_update = last_update "
+                "WHERE item_id = ?",
+                (detail.get('custom_no'), detail.get('name'), detail.get('price'), int(bool(detail.get('has_spec'))), item_id),
+            )
+            self._conn.execute("DELETE FROM specs WHERE item_id = ?", (item_id,))
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO specs (spec_id, item_id, custom_no, spec_name, item_name, price, qty, status) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(str(spec['spec_id']), item_id, spec.get('custom_no'), spec.get('spec_name'), spec.get('item_name'),
+                  spec.get('price'), spec.get('qty'), int(bool(spec.get('status')))) for spec in specs],
+            )
+
+    def get(self, item_id):
+        """返回商品 (dict，含 specs 列表)；不存在時返回 None"""
+        self._conn.row_factory = sqlite3.Row
+        try:
+            row = self._conn.execute("SELECT * FROM items WHERE item_id = ?", (str(item_id),)).fetchone()
+            if row is None:
+                return None
+            item = dict(row)
+            item['specs'] = [dict(spec) for spec in self._conn.execute(
+                "SELECT * FROM specs WHERE item_id = ? ORDER BY spec_id", (item['item_id'],))]
+            return item
+        finally:
+            self._conn.row_factory = None
+
+    def item_id(self, custom_no):
+        """依商品或規格的賣家自用料號查詢 item_id"""
+        row = self._conn.execute("SELECT item_id FROM items WHERE custom_no = ? LIMIT 1", (custom_no,)).fetchone()
+        if row is None:
+            row = self._conn.execute("SELECT item_id FROM specs WHERE custom_no = ? LIMIT 1", (custom_no,)).fetchone()
+        return row[0] if row else None
+
+    def find_product(self, product_id, option_ids=()):
+        """以 product_id (商品料號) 或 option_id (規格料號) 找出已上架的商品
+
+        返回 (item_id, {option_id: spec_id})；找不到時返回 None。
+        """
+        item_id = self.item_id(product_id)
+        option_ids = list(option_ids)
+        if item_id is None:
+            for option_id in option_ids:
+                item_id = self.item_id(option_id)
+                if item_id:
+                    break
+        if item_id is None:
+            return None
+        spec_map = {custom_no: spec_id for spec_id, custom_no in self._conn.execute(
+            "SELECT spec_id, custom_no FROM specs WHERE item_id = ?", (item_id,)) if custom_no in option_ids}
+        return item_id, spec_map
+
+    def counts(self):
+        """返回快取的商品數、規格數與尚未取得商品資料的商品數"""
+        items = self._conn.execute("SELECT COUNT(*) FROM items").fetchone()[0]
+        specs = self._conn.execute("SELECT COUNT(*) FROM specs").fetchone()[0]
+        stale = self._conn.execute("SELECT COUNT(*) FROM items WHERE detail_update < last_update").fetchone()[0]
+        return {'items': items, 'specs': specs, 'stale': stale}
@@ -1 +1,119 @@
-notify.py
\ No newline at end of file
+"""
+描述:
+    接收露天即時通知。露天以 POST 送出 JSON 陣列 (一次可包含多筆通知)，簽章方式與呼叫 API 相同，
+    以共用的露天金鑰 (client.load_credentials) 驗證後依 action_type 分派處理，並回應 HTTP 201；
+    未回應 201 時露天每隔 5 分鐘重送，最多 3 次。
+
+    通知型態: create_order (訂單成立)、order_paid (買家已付款)、buyer_cancel (買家提出取消交易)、
+    order_cancel (取消交易)。
+"""
+import sys
+import os
+
+# 將專案根目錄添加到 Python 路徑
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+import argparse
+import json
+import logging
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from src.ruten.client import load_credentials
+
+# 配置日誌記錄
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# 提供給露天的接收網址，簽章以此網址計算
+NOTIFY_URL = os.getenv('RUTEN_NOTIFY_URL', '')
+DEFAULT_PORT = int(os.getenv('RUTEN_NOTIFY_PORT', '8080'))
+
+
+def on_create_order(data):
+    logging.info(f"訂單成立: {data['order_id']} ({data.get('order_status')}，{data.get('order_create_time')})")
+
+
+def on_order_paid(data):
+    logging.info(f"買家已付款: {data['order_id']}")
+
+
+def on_buyer_cancel(data):
+    logging.warning(f"買家提出取消交易: {data['order_id']} ({data.get('apply_time')})")
+
+
+def on_order_cancel(data):
+    logging.info(f"訂單已取消: {data['order_id']} ({data.get('cancel_time')})")
+
+
+# action_type -> 處理函式
+HANDLERS = {
+    'create_order': on_create_order,
+    'order_paid': on_order_paid,
+    'buyer_cancel': on_buyer_cancel,
+    'order_cancel': on_order_cancel,
+}
+
+
+def handle_notifications(notifications, handlers=HANDLERS):
+    """依 action_type 分派通知；返回已處理的筆數"""
+    handled = 0
+    for notification in notifications:
+        handler = handlers.get(notification.get('action_type'))
+        if handler is None:
+            logging.warning(f"未支援的通知型態: {notification.get('action_type')}")
+            continue
+        handler(notification.get('data') or {})
+        handled += 1
+    return handled
+
+
+class NotifyHandler(BaseHTTPRequestHandler):
+    """驗證簽章後處理通知並回應 201"""
+
+    notify_url = NOTIFY_URL
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0)).decode('utf-8')
+        credentials = load_credentials()
+        if self.headers.get('X-RT-Key') != credentials.api_key or not credentials.verify(
+                self.notify_url, body, self.headers.get('X-RT-Timestamp'), self.headers.get('X-RT-Authorization')):
+            logging.warning(f"通知簽章驗證失敗 ({self.client_address[0]})。")
+            self.send_response(401)
+            self.end_headers()
+            return
+        try:
+            notifications = json.loads(body)
+        except json.JSONDecodeError as e:
+            logging.error(f"無法解析通知內容: {e}")
+            self.send_response(400)
+            self.end_headers()
+            return
+        handle_notifications(notifications if isinstance(notifications, list) else [notifications])
+        self.send_response(201)
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        logging.debug(format % args)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="接收露天即時通知")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help="監聽的連接埠")
+    parser.add_argument('--notify-url', default=NOTIFY_URL, help="提供給露天的接收網址 (用於驗證簽章)")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    if not args.notify_url:
+        logging.error("請以 RUTEN_NOTIFY_URL 或 --notify-url 指定提供給露天的接收網址。")
+        sys.exit(1)
+    NotifyHandler.notify_url = args.notify_url
+    load_credentials() # 啟動時即確認金鑰已設定
+    server = ThreadingHTTPServer(('', args.port), NotifyHandler)
+    logging.info(f"開始接收露天通知 (port {args.port})。")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
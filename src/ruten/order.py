@@ -1 +1,137 @@
-order.py
\ No newline at end of file
+"""
+描述:
+    露天訂單 API。所有請求經由 client.RutenClient 送出 (共用 session、簽章與重試)。
+    查詢訂單列表會自動翻頁，並把超過三個月的查詢區間切成多段；訂單明細每次最多查詢 30 筆。
+"""
+import sys
+import os
+
+# 將專案根目錄添加到 Python 路徑
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+import argparse
+import json
+import logging
+from datetime import datetime, timedelta
+
+from src.ruten.client import RutenAPIError, get_client
+
+# 配置日誌記錄
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+ORDER_LIST_PATH = '/api/v1/order/list'
+ORDER_DETAIL_PATH = '/api/v1/order/detail'
+CHECK_SHIP_PATH = '/api/v1/order/checkship'
+SHIP_PATH = '/api/v1/order/ship'
+CANCEL_LIST_PATH = '/api/v1/order/cancellist'
+
+PAGE_SIZE = 100 # 每頁筆數 (10~100)
+DETAIL_BATCH_SIZE = 30 # 訂單明細單次查詢上限
+MAX_RANGE = timedelta(days=90) # 最長查詢區間三個月
+ORDER_STATUSES = ('All', 'Unpaid', 'ToBeConfirmed', 'ReadyToShip', 'Shipped', 'InCancel', 'Cancelled')
+
+
+def _date_ranges(start, end):
+    """將 [start, end] 切成不超過 MAX_RANGE 的區間"""
+    while start <= end:
+        range_end = min(start + MAX_RANGE - timedelta(seconds=1), end)
+        yield start, range_end
+        start = range_end + timedelta(seconds=1)
+
+
+def _paginate(path, params, client=None):
+    client = client or get_client()
+    page = 1
+    while True:
+        data = client.get(path, params=dict(params, page=page, page_size=PAGE_SIZE)) or {}
+        orders = data.get('order_list') or []
+        yield from orders
+        if not orders or page * PAGE_SIZE >= int(data.get('total_cnt') or 0):
+            break
+        page += 1
+
+
+def list_orders(start, end, order_status='All', client=None):
+    """依訂單建立時間查詢訂單列表 (datetime 區間)，返回 [{order_id, order_status}]"""
+    orders = []
+    for range_start, range_end in _date_ranges(start, end):
+        params = {
+            'order_status': order_status,
+            'start_date': range_start.strftime('%Y%m%d%H%M%S'),
+            'end_date': range_end.strftime('%Y%m%d%H%M%S'),
+        }
+        orders.extend(_paginate(ORDER_LIST_PATH, params, client))
+    return orders
+
+
+def get_order_details(order_ids, client=None):
+    """查詢訂單明細，返回 {order_id: order_detail}；查詢失敗的訂單記錄錯誤後略過"""
+    client = client or get_client()
+    order_ids = list(order_ids)
+    details = {}
+    for i in range(0, len(order_ids), DETAIL_BATCH_SIZE):
+        batch = order_ids[i:i + DETAIL_BATCH_SIZE]
+        for result in client.post(ORDER_DETAIL_PATH, {'order_id_list': ','.join(batch)}, idempotent=True) or []:
+            if result.get('query_status') == 'success':
+                details[result['order_id']] = result['order_detail']
+            else:
+                logging.error(f"查詢訂單 {result.get('order_id')} 明細失敗: {result.get('error_msg')} ({result.get('error_code')})")
+    return details
+
+
+def confirm_shipping(order_id, client=None):
+    """確認訂單可出貨 (待確認 -> 待出貨)"""
+    return (client or get_client()).post(CHECK_SHIP_PATH, {'order_id': order_id})
+
+
+def ship_order(order_id, shipping_carrier, tracking_number, ship_time=None, shipping_carrier_name=None, client=None):
+    """回報訂單出貨 (待出貨 -> 已出貨)；shipping_carrier 為物流商代碼 (CHP、KTJ、CAT... 其他為 OTS)"""
+    payload = {
+        'order_id': order_id,
+        'ship_time': int(ship_time or datetime.now().timestamp()),
+        'shipping_carrier': shipping_carrier,
+        'tracking_number': tracking_number[:20],
+    }
+    if shipping_carrier_name:
+        payload['shipping_carrier_name'] = shipping_carrier_name[:30]
+    return (client or get_client()).post(SHIP_PATH, payload)
+
+
+def list_cancellations(start, end, date_type='Order', respond_filter='All', client=None):
+    """查詢待取消及已取消的訂單 (日期區間，respond_filter 為 ToRespond 時只列出待賣家回覆的訂單)"""
+    orders = []
+    for range_start, range_end in _date_ranges(start, end):
+        params = {
+            'date_type': date_type,
+            'start_date': range_start.strftime('%Y%m%d'),
+            'end_date': range_end.strftime('%Y%m%d'),
+            'filter': respond_filter,
+        }
+        orders.extend(_paginate(CANCEL_LIST_PATH, params, client))
+    return orders
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="查詢露天訂單")
+    parser.add_argument('--days', type=int, default=7, help="查詢最近幾天建立的訂單")
+    parser.add_argument('--status', default='All', choices=ORDER_STATUSES, help="訂單狀態")
+    parser.add_argument('--detail', action='store_true', help="同時查詢訂單明細")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    end = datetime.now()
+    try:
+        orders = list_orders(end - timedelta(days=args.days), end, args.status)
+        logging.info(f"最近 {args.days} 天共 {len(orders)} 筆訂單。")
+        if args.detail:
+            details = get_order_details(order['order_id'] for order in orders)
+            for order_id, detail in details.items():
+                logging.info(f"{order_id}: {json.dumps(detail, ensure_ascii=False)}")
+        else:
+            for order in orders:
+                logging.info(f"{order['order_id']}: {order['order_status']}")
+    except RutenAPIError as e:
+        logging.error(f"查詢訂單失敗: {e} (error_code: {e.error_code})")
+        sys.exit(1)
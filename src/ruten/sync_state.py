@@ -0,0 +1,149 @@
+"""
+描述:
+    露天同步狀態。ruten_sync 表 (見 doc/ruten_sync.sql) 記錄每個 product_id 對應的露天 item_id、
+    各 option_id 對應的規格編號 (spec_id)、上次送出內容的雜湊與圖片上傳狀態。
+    上傳器依此判斷每個商品要新增、更新 (商品資訊 / 售價 / 圖片) 或略過，只同步有變動的部分。
+"""
+import hashlib
+import json
+import os
+
+# 新增商品 payload 中屬於「商品資訊」(PUT /product/item/info) 的欄位以外的部分
+PRICE_FIELDS = ('price', 'qty', 'has_spec', 'spec_info')
+
+IMAGE_PENDING = 'pending'
+IMAGE_DONE = 'done'
+IMAGE_FAILED = 'failed'
+
+# 同步動作
+CREATE = 'create'
+INFO = 'info'
+PRICE = 'price'
+IMAGES = 'images'
+SPEC = 'spec' # 規格組合變更，API 無法自動調整，需要手動處理
+
+COLUMNS = ('product_id', 'item_id', 'payload_hash', 'info_hash', 'price_hash', 'spec_key', 'spec_map',
+           'image_hash', 'images_uploaded', 'image_status', 'last_error')
+
+UPSERT_SQL = (
+    f"INSERT INTO ruten_sync ({', '.join(COLUMNS)}) VALUES ({', '.join(['%s'] * len(COLUMNS))}) "
+    "ON DUPLICATE KEY UPDATE " + ', '.join(f"{column} = VALUES({column})" for column in COLUMNS[1:])
+)
+
+
+def _hash(value):
+    encoded = json.dumps(value, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+def item_hashes(item):
+    """計算 build_item() 結果的各部分雜湊"""
+    payload = item['payload']
+    info = {key: value for key, value in payload.items() if key not in PRICE_FIELDS}
+    spec_info = payload.get('spec_info') or []
+    prices = {'price': payload.get('price'), 'specs': {spec['custom_no']: spec['price'] for spec in spec_info}}
+    return {
+        'payload_hash': _hash(payload),
+        'info_hash': _hash(info),
+        'price_hash': _hash(prices),
+        'spec_key': _hash(sorted(spec['custom_no'] for spec in spec_info)),
+        'image_hash': image_hash(item['images']),
+    }
+
+
+def image_hash(paths):
+    """以檔名、大小與修改時間代表圖片內容；產品目錄的圖片是 hardlink，內容改變時會指向不同的檔案"""
+    signature = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            signature.append((os.path.basename(path), stat.st_size, stat.st_mtime_ns))
+        except OSError:
+            signature.append((os.path.basename(path), None, None))
+    return _hash(signature)
+
+
+def plan(item, state, force=False):
+    """返回同步此商品需要的動作列表；空列表代表內容未變，可以略過
+
+    force 為 True 時，已上架的商品不比對雜湊，一律更新資訊、售價與圖片。
+    """
+    if not state or not state.get('item_id'):
+        return [CREATE]
+    hashes = item_hashes(item)
+    actions = []
+    if hashes['spec_key'] != state.get('spec_key'):
+        actions.append(SPEC)
+    if force or hashes['info_hash'] != state.get('info_hash'):
+        actions.append(INFO)
+    if force or hashes['price_hash'] != state.get('price_hash'):
+        actions.append(PRICE)
+    if force or hashes['image_hash'] != state.get('image_hash') or state.get('image_status') != IMAGE_DONE:
+        actions.append(IMAGES)
+    return actions
+
+
+def new_state(item, item_id, spec_map, previous=None):
+    """以目前的 payload 建立新的同步狀態 (圖片狀態沿用 previous，由呼叫端更新)"""
+    state = dict(previous or {})
+    state.update(item_hashes(item))
+    state.update({
+        'product_id': item['product_id'],
+        'item_id': item_id,
+        'spec_map': dict(spec_map),
+        'last_error': '',
+    })
+    state.setdefault('images_uploaded', 0)
+    state.setdefault('image_status', IMAGE_PENDING)
+    return state
+
+
+def adopted_state(item, item_id, spec_map):
+    """為已在露天上架但沒有同步記錄的商品 (例如由 item_cache 找到) 建立狀態
+
+    只記錄 item_id 與規格對應，雜湊留空，下次同步時會更新商品資訊、售價與圖片而不是重新新增。
+    """
+    return {
+        'product_id': item['product_id'],
+        'item_id': item_id,
+        'payload_hash': '',
+        'info_hash': '',
+        'price_hash': '',
+        'spec_key': _hash(sorted(spec_map)),
+        'spec_map': dict(spec_map),
+        'image_hash': '',
+        'images_uploaded': 0,
+        'image_status': IMAGE_PENDING,
+        'last_error': '',
+    }
+
+
+class SyncStore:
+    """讀寫 ruten_sync；只在單一執行緒中使用"""
+
+    def __init__(self, mydb):
+        self.mydb = mydb
+
+    def load(self):
+        """一次載入所有同步狀態，返回 {product_id: state}"""
+        states = {}
+        cursor = self.mydb.cursor(dictionary=True)
+        try:
+            cursor.execute(f"SELECT {', '.join(COLUMNS)} FROM ruten_sync")
+            for row in cursor.fetchall():
+                row['spec_map'] = json.loads(row['spec_map'] or '{}')
+                states[row['product_id']] = row
+        finally:
+            cursor.close()
+        return states
+
+    def save(self, state):
+        values = dict(state)
+        values['spec_map'] = json.dumps(values.get('spec_map') or {}, ensure_ascii=False)
+        values['last_error'] = (values.get('last_error') or '')[:500]
+        cursor = self.mydb.cursor()
+        try:
+            cursor.execute(UPSERT_SQL, tuple(values.get(column, '') for column in COLUMNS))
+            self.mydb.commit()
+        finally:
+            cursor.close()
@@ -0,0 +1,356 @@
+"""
+描述:
+    並行的露天商品上傳器。請求經由 client.RutenClient 送出 (共用 session、簽章、速率限制與重試，
+    連線池大小等於 worker 數)，以 ThreadPoolExecutor 同時上傳多個商品；圖片以 multipart 串流上傳。
+    商品資料由 aowotoy_products 依 product_id 分組產生 (套用上架排除規則)，
+    圖片優先使用 ImageStore 的 upload/<product_id>/ 下符合露天限制的版本。
+    ruten_sync 記錄每個商品已同步的 item_id 與內容雜湊：新商品才新增，內容變更的商品只更新
+    商品資訊、售價或圖片，未變更的商品直接略過 (見 sync_state.py)。
+    新增商品的請求不會在逾時或 5xx 時自動重送；結果不明的商品在其他商品同步完後更新商品快取，
+    以料號確認露天上是否已經新增，找不到時才重新新增一次。
+"""
+import sys
+import os
+
+# 將專案根目錄添加到 Python 路徑
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+import argparse
+import json
+import logging
+import re
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import mysql.connector
+
+from src.ruten import sync_state
+from src.ruten.client import DEFAULT_BURST, DEFAULT_RATE, RutenAPIError, RutenAmbiguousError, RutenClient
+from src.ruten.get_item_list import DEFAULT_CACHE_PATH, refresh_cache
+from src.ruten.item_cache import ItemCache
+from src.ruten.sync_state import SyncStore
+from src.utils.db import connect_to_db
+from src.utils.image_store import DEFAULT_STORE_DIR, upload_path
+from src.utils.listing_filter import ListingFilter
+from src.utils.marketplace import replace_name, round_price
+
+# 配置日誌記錄
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+ITEM_PATH = '/api/v1/product/item'
+ITEM_INFO_PATH = f'{ITEM_PATH}/info'
+ITEM_PRICE_PATH = f'{ITEM_PATH}/price'
+IMAGE_URL = os.getenv('RUTEN_PRODUCT_API_URL', f'{ITEM_PATH}/image')
+
+DEFAULT_WORKERS = 4 # 同時上傳的商品數
+MAX_IMAGES = 9 # 露天每個商品最多 9 張圖片
+PRODUCT_DIR = 'products'
+
+
+class RutenUploader:
+    """以 RutenClient 並行呼叫露天商品 API"""
+
+    def __init__(self, client, max_workers=DEFAULT_WORKERS):
+        self.client = client
+        self.max_workers = max(1, max_workers)
+        self.stats = Counter()
+
+    @classmethod
+    def from_env(cls, max_workers=DEFAULT_WORKERS, rate=DEFAULT_RATE, burst=DEFAULT_BURST, **kwargs):
+        """以環境變數中的金鑰建立，連線池大小等於 worker 數"""
+        return cls(RutenClient(pool_size=max_workers, rate=rate, burst=burst, **kwargs), max_workers)
+
+    def close(self):
+        self.client.close()
+
+    def create_item(self, payload):
+        """新增商品，返回 data (含 item_id 與各規格的 spec_id)；結果不明時拋出 RutenAmbiguousError，不自動重送"""
+        return self.client.post(ITEM_PATH, payload) or {}
+
+    def update_info(self, item_id, payload):
+        """更新商品資訊 (不含售價、數量與規格)"""
+        info = {key: value for key, value in payload.items() if key not in sync_state.PRICE_FIELDS}
+        info['item_id'] = item_id
+        return self.client.put(ITEM_INFO_PATH, info)
+
+    def update_price(self, item_id, payload, spec_map):
+        """更新售價；有規格時依 spec_map (option_id -> spec_id) 更新各規格"""
+        if payload.get('has_spec'):
+            spec_info = [{'spec_id': spec_map[spec['custom_no']], 'price': spec['price']}
+                         for spec in payload['spec_info'] if spec['custom_no'] in spec_map]
+            return self.client.put(ITEM_PRICE_PATH, {'item_id': item_id, 'spec_info': spec_info})
+        return self.client.put(ITEM_PRICE_PATH, {'item_id': item_id, 'price': payload['price']})
+
+    def upload_images(self, item_id, image_paths):
+        """設定商品圖片 (最多 9 張，會取代原有圖片)，返回 data (含 success_images)"""
+        files = [(f'images[{index}]', path, 'image/jpeg') for index, path in enumerate(image_paths[:MAX_IMAGES])]
+        return self.client.post_multipart(IMAGE_URL, {'item_id': item_id}, files) or {}
+
+    def upload_product(self, item):
+        """上傳一個新商品及其圖片；item 為 build_item() 的結果"""
+        state, _ = self.sync_product(item)
+        return {'product_id': item['product_id'], 'item_id': state['item_id'], 'images': state['images_uploaded']}
+
+    def sync_product(self, item, state=None, force=False):
+        """依同步狀態新增或更新一個商品；返回 (新的同步狀態, 執行的動作列表)
+
+        動作列表為空時商品未變更，返回原本的 state。圖片上傳失敗不會拋出例外，
+        而是記錄在 image_status，讓已新增的商品仍能寫回同步狀態。
+        """
+        actions = sync_state.plan(item, state, force)
+        if not actions:
+            return state, actions
+        if sync_state.CREATE in actions:
+            data = self.create_item(item['payload'])
+            item_id = str(data.get('item_id') or '')
+            if not item_id:
+                raise RutenAPIError(f"新增商品 {item['product_id']} 未返回 item_id")
+            # 以規格的 custom_no (option_id) 對應露天的 spec_id
+            spec_map = {spec['custom_no']: spec['spec_id'] for spec in data.get('spec_info') or [] if spec.get('custom_no')}
+            new_state = sync_state.new_state(item, item_id, spec_map)
+            actions = [sync_state.CREATE, sync_state.IMAGES]
+        else:
+            item_id = state['item_id']
+            if sync_state.INFO in actions:
+                self.update_info(item_id, item['payload'])
+            if sync_state.PRICE in actions:
+                self.update_price(item_id, item['payload'], state['spec_map'])
+            new_state = sync_state.new_state(item, item_id, state['spec_map'], previous=state)
+            if sync_state.SPEC in actions:
+                # 保留舊的 spec_key，手動調整前每次同步都會再提醒
+                new_state['spec_key'] = state['spec_key']
+                new_state['last_error'] = '規格組合已變更，需在露天後台手動調整'
+                logging.warning(f"商品 {item['product_id']} (item_id: {item_id}) 的規格組合已變更，只更新既有規格的售價。")
+
+        if sync_state.IMAGES in actions:
+            new_state['images_uploaded'] = 0
+            new_state['image_status'] = sync_state.IMAGE_PENDING
+            if item['images']:
+                try:
+                    data = self.upload_images(item_id, item['images'])
+                    new_state['images_uploaded'] = data.get('success_images', 0)
+                    new_state['image_status'] = sync_state.IMAGE_DONE
+                except (RutenAPIError, OSError) as e:
+                    new_state['image_status'] = sync_state.IMAGE_FAILED
+                    new_state['last_error'] = f"圖片上傳失敗: {e}"
+                    logging.error(f"商品 {item['product_id']} (item_id: {item_id}) 圖片上傳失敗: {e}")
+        return new_state, actions
+
+    def upload_catalog(self, items, store=None, force=False, item_cache=None):
+        """並行同步多個商品；store (SyncStore) 為 None 時全部視為新商品。返回新的同步狀態列表
+
+        item_cache (ItemCache) 用於找出已在露天上架但沒有同步記錄的商品，改為更新而不是重複新增；
+        新增結果不明的商品也以 item_cache 確認 (見 recheck_created())。
+        同步狀態在主執行緒中逐一寫回，worker 之間不共用資料庫連線。
+        """
+        states = store.load() if store else {}
+        pending = []
+        for item in items:
+            state = states.get(item['product_id'])
+            if state is None and item_cache is not None:
+                state = self._adopt(item, item_cache)
+            if sync_state.plan(item, state, force):
+                pending.append((item, state))
+            else:
+                self.stats['skipped'] += 1
+        logging.info(f"共 {len(items)} 個商品，{len(pending)} 個需要同步 (其中 {self.stats['adopted']} 個由商品快取找到既有的露天商品)，"
+                     f"{len(items) - len(pending)} 個未變更略過。")
+
+        results = []
+        start = time.monotonic()
+        uncertain = self._sync_all(pending, store, force, results)
+        if uncertain:
+            uncertain = self._sync_all(self.recheck_created(uncertain, item_cache), store, force, results)
+            for item in uncertain:
+                self.stats['failed'] += 1
+                logging.error(f"商品 {item['product_id']} 重新新增的結果仍不明，請執行 get_item_list.py 更新商品快取後再同步。")
+        elapsed = time.monotonic() - start
+        synced = self.stats['created'] + self.stats['updated']
+        rate = synced / elapsed * 60 if elapsed > 0 else 0
+        logging.info(f"同步完成：新增 {self.stats['created']} 個、更新 {self.stats['updated']} 個、略過 {self.stats['skipped']} 個、"
+                     f"失敗 {self.stats['failed']} 個商品 ({self.stats['images']} 張圖片)，"
+                     f"共 {self.client.stats['requests']} 次請求、重試 {self.client.stats['retries']} 次，耗時 {elapsed:.1f} 秒 ({rate:.1f} 個/分鐘)。")
+        return results
+
+    def _adopt(self, item, item_cache):
+        """以商品或規格料號在 item_cache 中找出已上架的商品，返回 adopted_state()；找不到時返回 None"""
+        option_ids = [spec['custom_no'] for spec in item['payload'].get('spec_info') or []]
+        found = item_cache.find_product(item['product_id'], option_ids)
+        if not found:
+            return None
+        self.stats['adopted'] += 1
+        return sync_state.adopted_state(item, *found)
+
+    def _sync_all(self, pending, store, force, results):
+        """並行執行 sync_product()，成功的狀態加入 results 並寫回 store；返回新增結果不明的商品列表"""
+        uncertain = []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(self.sync_product, item, state, force): item for item, state in pending}
+            for future in as_completed(futures):
+                item = futures[future]
+                try:
+                    new_state, actions = future.result()
+                except RutenAmbiguousError as e:
+                    self.stats['uncertain'] += 1
+                    uncertain.append(item)
+                    logging.warning(f"商品 {item['product_id']} 新增結果不明，稍後以商品快取確認: {e}")
+                    continue
+                except (RutenAPIError, OSError) as e:
+                    self.stats['failed'] += 1
+                    logging.error(f"商品 {item['product_id']} 同步失敗: {e}")
+                    continue
+                results.append(new_state)
+                self.stats['created' if sync_state.CREATE in actions else 'updated'] += 1
+                self.stats['images'] += new_state['images_uploaded'] if sync_state.IMAGES in actions else 0
+                logging.info(f"商品 {item['product_id']} 同步成功 (item_id: {new_state['item_id']}，{'、'.join(actions)})。")
+                if store:
+                    try:
+                        store.save(new_state)
+                    except mysql.connector.Error as err:
+                        logging.error(f"寫入商品 {item['product_id']} 的同步狀態失敗: {err}")
+        return uncertain
+
+    def recheck_created(self, items, item_cache):
+        """更新商品快取並以料號確認新增結果不明的商品；返回 [(item, state)]
+
+        已在露天上的商品改為更新 (state 為 adopted_state())，確認不存在的商品 (state 為 None) 才重新新增。
+        沒有 item_cache 或更新快取失敗時無法確認，這些商品記為失敗，不重新新增。
+        """
+        if item_cache is None:
+            self.stats['failed'] += len(items)
+            logging.error(f"無商品快取，無法確認 {len(items)} 個商品是否已新增，不重新新增："
+                          f"{', '.join(item['product_id'] for item in items)}")
+            return []
+        try:
+            refresh_cache(item_cache, workers=self.max_workers, client=self.client)
+        except RutenAPIError as e:
+            self.stats['failed'] += len(items)
+            logging.error(f"更新商品快取失敗，無法確認 {len(items)} 個商品是否已新增，不重新新增: {e}")
+            return []
+        return [(item, self._adopt(item, item_cache)) for item in items]
+
+def product_images(product_id, product_dir=PRODUCT_DIR, store_dir=DEFAULT_STORE_DIR):
+    """返回商品圖片路徑 (依編號排序)；image store 的 upload/<product_id>/ 下有符合露天限制的版本時優先使用"""
+    base_dir = os.path.join(product_dir, product_id)
+    pattern = re.compile(rf'^{re.escape(product_id)}_(\d+)\.jpg$')
+    images = []
+    if os.path.isdir(base_dir):
+        for file_name in os.listdir(base_dir):
+            match = pattern.match(file_name)
+            if match:
+                upload_file = upload_path(product_id, file_name, store_dir)
+                path = upload_file if os.path.exists(upload_file) else os.path.join(base_dir, file_name)
+                images.append((int(match.group(1)), path))
+    return [path for _, path in sorted(images)][:MAX_IMAGES]
+
+
+def build_item(rows, product_dir=PRODUCT_DIR):
+    """將同一 product_id 的規格資料 (dict 列表) 轉為露天新增商品的 payload"""
+    first = rows[0]
+    product_id = first['product_id']
+    name = replace_name(first['name']).replace('\\', '')[:130]
+    payload = {
+        'name': name,
+        'class_id': '00050008',
+        'store_class_id': '6529089' if '泡泡瑪特' in first['name'] else '6529088', # 泡泡瑪特的全丟到泡泡瑪特(6529089)，其他丟到公仔模型(6529088)
+        'condition': 1,
+        'stock_status': '21DAY',
+        'description': (first.get('detail') or '')[:60000],
+        'video_link': '',
+        'location_type': 1, # 預設為 1 (台灣)
+        'location': '03', # 預設為 03 (新北市)
+        'shipping_setting': 1,
+        'has_spec': len(rows) > 1,
+        'price': round_price(first['price']),
+        'qty': 10,
+        'custom_no': product_id,
+    }
+    if payload['has_spec']:
+        # 只設定第一層「規格」，每個 option 一組
+        payload['spec_info'] = [{
+            'spec_name': row['option'][:30] or row['option_id'],
+            'status': True,
+            'price': round_price(row['price']),
+            'qty': 10,
+            'custom_no': row['option_id'],
+        } for row in rows]
+    return {'product_id': product_id, 'payload': payload, 'images': product_images(product_id, product_dir)}
+
+
+def load_catalog(mydb, listing_filter=None, product_ids=None, limit=None):
+    """從 aowotoy_products 讀取並依 product_id 分組，返回 build_item() 的結果列表"""
+    if listing_filter is None:
+        listing_filter = ListingFilter.from_file()
+    sql = "SELECT product_id, option_id, name, price, `option`, detail FROM aowotoy_products"
+    conditions = []
+    params = []
+    if product_ids:
+        conditions.append(f"product_id IN ({', '.join(['%s'] * len(product_ids))})")
+        params.extend(product_ids)
+    condition, condition_params = listing_filter.sql_where()
+    if condition:
+        conditions.append(condition)
+        params.extend(condition_params)
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    sql += " ORDER BY product_id, id"
+
+    groups = {}
+    cursor = mydb.cursor(dictionary=True)
+    try:
+        cursor.execute(sql, tuple(params))
+        for row in cursor.fetchall():
+            if listing_filter.keep(row):
+                groups.setdefault(row['product_id'], []).append(row)
+    finally:
+        cursor.close()
+    items = [build_item(rows) for rows in groups.values()]
+    return items[:limit] if limit else items
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="並行上傳 aowotoy 商品與圖片到露天")
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help="同時上傳的商品數")
+    parser.add_argument('--rate', type=float, default=DEFAULT_RATE, help="每秒最多發出的 API 請求數")
+    parser.add_argument('--burst', type=int, default=DEFAULT_BURST, help="token bucket 最多累積的請求數")
+    parser.add_argument('--product-id', nargs='+', help="只上傳指定的 product_id")
+    parser.add_argument('--limit', type=int, help="最多上傳幾個商品")
+    parser.add_argument('--dry-run', action='store_true', help="只輸出將上傳的內容，不呼叫 API")
+    parser.add_argument('--item-cache', default=DEFAULT_CACHE_PATH,
+                        help="get_item_list.py 產生的商品快取；已上架但沒有同步記錄的商品改為更新，新增結果不明時更新快取後確認")
+    parser.add_argument('--force', action='store_true', help="已上架的商品不比對雜湊，全部重新更新資訊、售價與圖片")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    mydb = connect_to_db()
+    if not mydb:
+        logging.error("無法連接到資料庫，無法獲取產品資料。")
+        sys.exit(1)
+    try:
+        items = load_catalog(mydb, product_ids=args.product_id, limit=args.limit)
+        store = SyncStore(mydb)
+        logging.info(f"共 {len(items)} 個商品。")
+
+        if args.dry_run:
+            states = store.load()
+            for item in items:
+                actions = sync_state.plan(item, states.get(item['product_id']), args.force)
+                logging.info(f"{item['product_id']} 動作: {'、'.join(actions) or '略過'} "
+                             f"{json.dumps(item['payload'], ensure_ascii=False)} 圖片: {item['images']}")
+        else:
+            # 快取檔案不存在時建立空的快取，新增結果不明時更新後用來確認
+            item_cache = ItemCache(args.item_cache)
+            uploader = RutenUploader.from_env(max_workers=args.workers, rate=args.rate, burst=args.burst)
+            try:
+                uploader.upload_catalog(items, store=store, force=args.force, item_cache=item_cache)
+            finally:
+                uploader.close()
+                item_cache.close()
+    except mysql.connector.Error as err:
+        logging.error(f"讀取產品資料或同步狀態失敗: {err}")
+        sys.exit(1)
+    finally:
+        mydb.close()
@@ -0,0 +1,133 @@
+"""
+描述:
+    共用的 Playwright 瀏覽器管理器。整個爬取流程只啟動一次 Chromium，
+    列表頁與產品頁都從這裡借用 browser context，並在使用 N 次後回收以控制記憶體。
+"""
+import asyncio
+import logging
+import threading
+import time
+from contextlib import asynccontextmanager
+from playwright.async_api import async_playwright
+
+LAUNCH_ARGS = ['--no-sandbox', '--disable-gpu', '--disable-dev-shm-usage'] # 確保在無 X11 環境下執行
+
+
+class _Lease:
+    """一個 browser context 與其唯一的 page"""
+
+    def __init__(self, context, page):
+        self.context = context
+        self.page = page
+        self.uses = 0
+
+
+class BrowserManager:
+    """延遲啟動、可重複使用 context 的瀏覽器管理器
+
+    使用方式:
+        async with BrowserManager(headers=headers) as manager:
+            async with manager.page() as page:
+                await page.goto(url)
+    """
+
+    def __init__(self, headers=None, recycle_after=50, headless=True):
+        self.headers = headers or {}
+        self.recycle_after = max(1, recycle_after)
+        self.headless = headless
+        self._playwright = None
+        self._browser = None
+        self._idle = []
+        self._start_lock = asyncio.Lock()
+        # 統計資料；量測報告等其他執行緒可能同時讀取，讀寫都需持有 _stats_lock
+        self._stats_lock = threading.Lock()
+        self.launches = 0
+        self.launch_seconds = 0.0
+        self.leases = 0
+        self.contexts_created = 0
+        self.contexts_recycled = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def start(self):
+        """啟動瀏覽器；已啟動時直接返回"""
+        async with self._start_lock:
+            if self._browser is not None:
+                return
+            started = time.monotonic()
+            self._playwright = await async_playwright().start()
+            self._browser = await self._playwright.chromium.launch(headless=self.headless, args=LAUNCH_ARGS)
+            elapsed = time.monotonic() - started
+            with self._stats_lock:
+                self.launch_seconds += elapsed
+                self.launches += 1
+            logging.info(f"瀏覽器啟動完成，耗時 {elapsed:.2f} 秒。")
+
+    async def close(self):
+        """關閉所有 context 與瀏覽器"""
+        for lease in self._idle:
+            try:
+                await lease.context.close()
+            except Exception:
+                pass
+        self._idle = []
+        if self._browser is not None:
+            await self._browser.close()
+            self._browser = None
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
+
+    async def _new_lease(self):
+        context = await self._browser.new_context(extra_http_headers=self.headers)
+        page = await context.new_page()
+        with self._stats_lock:
+            self.contexts_created += 1
+        return _Lease(context, page)
+
+    @asynccontextmanager
+    async def page(self):
+        """借出一個 page；發生例外或使用次數達 recycle_after 時關閉其 context"""
+        await self.start()
+        lease = self._idle.pop() if self._idle else await self._new_lease()
+        with self._stats_lock:
+            self.leases += 1
+        healthy = False
+        try:
+            yield lease.page
+            healthy = True
+        finally:
+            lease.uses += 1
+            if not healthy or lease.page.is_closed() or lease.uses >= self.recycle_after:
+                with self._stats_lock:
+                    self.contexts_recycled += 1
+                try:
+                    await lease.context.close()
+                except Exception:
+                    pass
+            else:
+                self._idle.append(lease)
+
+    def startup_report(self, legacy_launches):
+        """與舊流程 (legacy_launches 次冷啟動) 比較，返回節省的啟動次數與秒數"""
+        with self._stats_lock:
+            launches, launch_seconds = self.launches, self.launch_seconds
+            leases, created, recycled = self.leases, self.contexts_created, self.contexts_recycled
+        if launches == 0:
+            average = 0.0
+        else:
+            average = launch_seconds / launches
+        avoided = max(0, legacy_launches - launches)
+        return {
+            'launches': launches,
+            'launches_avoided': avoided,
+            'launch_seconds': round(launch_seconds, 2),
+            'seconds_saved': round(avoided * average, 2),
+            'leases': leases,
+            'contexts_created': created,
+            'contexts_recycled': recycled,
+        }
@@ -1,24 +1,124 @@
+"""
+描述:
+    資料庫存取層。所有模組透過 connect_to_db() 從同一個 mysql.connector 連線池取得連線，
+    使用完畢呼叫 close() 即歸還連線池。取出連線時先 ping 檢查，斷線時自動重新連線；
+    連線池用盡時等待其他連線歸還，等待時間記錄在 pool_stats 中。
+    待翻譯文章以租約 (lease) 領取：claim_news_to_translate() 以 FOR UPDATE SKIP LOCKED 原子性地領取一批文章，
+    多個翻譯 worker 不會拿到同一篇；complete_translations() 在單一交易中寫回整批結果。
+    新聞以 url_hash (SHA-256，唯一索引) 去重：insert_news_batch() 以一次 IN 查詢找出已存在的 URL，
+    只以多列 INSERT IGNORE 寫入新的文章。
+    editors 與 proper_nouns 以 TableCache 快取在程序內 (TTL + CHECKSUM TABLE 判斷是否變更)，
+    get_editor_prompt() 在記憶體中隨機選取，get_proper_noun_rewriter() 返回已編譯的 Rewriter。
+    insert_proper_nouns() 先以快取的已知名詞集合去重，再以一次多列 INSERT IGNORE 寫入新名詞。
+"""
+import hashlib
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+
 import mysql.connector
+from mysql.connector import pooling
 import os
 from dotenv import load_dotenv
 
+from src.utils.rewrite import RewriteCache
+from src.utils.table_cache import TableCache
+
 load_dotenv() # 從 .env 文件載入環境變數
 
-def connect_to_db():
-    """建立並返回資料庫連線"""
+POOL_NAME = 'toybox'
+DEFAULT_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5")) # mysql.connector 上限為 32
+DEFAULT_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30")) # 連線池用盡時最多等待的秒數
+CHECKSUM_TABLES = ('proper_nouns', 'editors') # table_checksum() 可查詢的資料表 (表名無法參數化)
+POOL_RETRY_INTERVAL = 0.05 # 連線池用盡時重新嘗試取得連線的間隔
+URL_BATCH_SIZE = 1000 # 每次 IN 查詢的 URL 數
+INSERT_BATCH_SIZE = 100 # 每個多列 INSERT 的文章數 (文章內容較大，避免超過 max_allowed_packet)
+DEFAULT_LEASE_SECONDS = int(os.getenv("TRANSLATE_LEASE_SECONDS", "900")) # 領取的文章未寫回時，超過此秒數可被其他 worker 重新領取
+
+_pool = None
+_pool_lock = threading.Lock()
+pool_stats = Counter() # checkouts / waits / wait_seconds / max_wait_seconds / timeouts / reconnects
+_stats_lock = threading.Lock() # 多個執行緒同時取出連線，pool_stats 的讀寫都需持有此鎖
+
+def get_pool(pool_size=None):
+    """返回共用的連線池，第一次呼叫時建立；pool_size 只在建立時生效"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            size = pool_size or DEFAULT_POOL_SIZE
+            _pool = pooling.MySQLConnectionPool(
+                pool_name=POOL_NAME,
+                pool_size=size,
+                pool_reset_session=True,
+                host=os.getenv("DB_HOST"),
+                user=os.getenv("DB_USER"),
+                password=os.getenv("DB_PASSWORD"),
+                database=os.getenv("DB_NAME")
+            )
+            print(f"資料庫連線池建立成功 (大小 {size})。")
+        return _pool
+
+def _checkout(pool, timeout):
+    """從連線池取出連線；連線池用盡時等待，超過 timeout 秒拋出 PoolError"""
+    start = time.monotonic()
+    waited = False
+    while True:
+        try:
+            connection = pool.get_connection()
+            break
+        except pooling.PoolError:
+            if time.monotonic() - start >= timeout:
+                with _stats_lock:
+                    pool_stats['timeouts'] += 1
+                raise
+            waited = True
+            time.sleep(POOL_RETRY_INTERVAL)
+    wait = time.monotonic() - start
+    with _stats_lock:
+        pool_stats['checkouts'] += 1
+        if waited:
+            pool_stats['waits'] += 1
+        pool_stats['wait_seconds'] += wait
+        pool_stats['max_wait_seconds'] = max(pool_stats['max_wait_seconds'], wait)
+    return connection
+
+def connect_to_db(pool_size=None, timeout=DEFAULT_POOL_TIMEOUT):
+    """從連線池取得資料庫連線；呼叫 close() 時連線歸還連線池"""
     try:
-        mydb = mysql.connector.connect(
-            host=os.getenv("DB_HOST"),
-            user=os.getenv("DB_USER"),
-            password=os.getenv("DB_PASSWORD"),
-            database=os.getenv("DB_NAME")
-        )
-        print("資料庫連線成功。")
+        mydb = _checkout(get_pool(pool_size), timeout)
+        # 健康檢查：閒置過久被伺服器中斷的連線在交出前重新連線
+        if not mydb.is_connected():
+            with _stats_lock:
+                pool_stats['reconnects'] += 1
+            mydb.ping(reconnect=True, attempts=3, delay=1)
         return mydb
     except mysql.connector.Error as err:
         print(f"資料庫連線失敗：{err}")
         return None
 
+def pool_summary():
+    """返回連線池使用統計的說明文字"""
+    with _stats_lock:
+        stats = Counter(pool_stats)
+    checkouts = stats['checkouts']
+    average = stats['wait_seconds'] / checkouts if checkouts else 0
+    return (f"資料庫連線池：取出 {checkouts} 次，需等待 {stats['waits']} 次 "
+            f"(平均 {average * 1000:.1f} ms、最長 {stats['max_wait_seconds'] * 1000:.1f} ms)，"
+            f"逾時 {stats['timeouts']} 次、重新連線 {stats['reconnects']} 次。")
+
+def _end_read(mydb, started):
+    """唯讀查詢結束時結束它開始的交易 (autocommit 關閉時查詢會開始交易並保留讀取快照)
+
+    started 為查詢前連線是否沒有進行中的交易；呼叫端原本的交易不受影響。
+    """
+    if started and mydb.in_transaction:
+        try:
+            mydb.rollback()
+        except mysql.connector.Error as err:
+            print(f"結束唯讀交易時發生資料庫錯誤：{err}")
+
 def insert_news(mydb, news_data):
     """將新聞資料插入資料庫"""
     mycursor = None
@@ -48,6 +148,7 @@ def insert_news(mydb, news_data):
 def check_url_exists(mydb, url):
     """檢查指定的 URL 是否已存在於資料庫中"""
     mycursor = None
+    started = not mydb.in_transaction
     existing_news = None
     try:
         mycursor = mydb.cursor(dictionary=True) # 使用 dictionary cursor
@@ -61,56 +162,132 @@ def check_url_exists(mydb, url):
     finally:
         if mycursor:
             mycursor.close()
+        _end_read(mydb, started)
     return existing_news # 返回查詢結果 (字典或 None)
 
-def get_editor_prompt(mydb, language):
-    """從 editors 表隨機獲取一個啟用的編輯器設定"""
+def url_hash(url):
+    """返回 URL 的 SHA-256 (與 MySQL 的 SHA2(url, 256) 相同)"""
+    return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+def _existing_url_hashes(mycursor, hashes):
+    existing = set()
+    for i in range(0, len(hashes), URL_BATCH_SIZE):
+        batch = hashes[i:i + URL_BATCH_SIZE]
+        mycursor.execute(f"SELECT url_hash FROM news WHERE url_hash IN ({', '.join(['%s'] * len(batch))})", tuple(batch))
+        existing.update(row[0] for row in mycursor.fetchall())
+    return existing
+
+def filter_new_urls(mydb, urls):
+    """返回資料庫中尚不存在的 URL (去除重複並保持原順序)；每 URL_BATCH_SIZE 個 URL 一次查詢"""
+    unique = {url_hash(url): url for url in dict.fromkeys(urls)}
     mycursor = None
-    editor_config = None
+    started = not mydb.in_transaction
+    existing = set()
     try:
-        mycursor = mydb.cursor(dictionary=True) # 使用 dictionary cursor
-        # 隨機選取一個 is_deleted = 0 的編輯器
-        sql = f"SELECT title_prompt, content_prompt, editor_name FROM editors WHERE language = '{language}' AND is_deleted = 0 ORDER BY RAND() LIMIT 1"
-        print(sql) # 打印 SQL 查詢語句以便除錯
-        mycursor.execute(sql)
-        editor_config = mycursor.fetchone()
-        if editor_config:
-            print(f"成功從資料庫獲取編輯器設定: {editor_config.get('editor_name', '未知')}")
-        else:
-            print("在 editors 表中未找到啟用的編輯器設定。")
+        mycursor = mydb.cursor()
+        existing = _existing_url_hashes(mycursor, list(unique))
     except mysql.connector.Error as err:
-        print(f"讀取 editors 時發生資料庫錯誤：{err}")
-    except Exception as e:
-        print(f"讀取 editors 時發生未知錯誤：{e}")
+        print(f"批次檢查 URL 時發生資料庫錯誤：{err}")
+        return [] # 無法確認時不視為新 URL，避免重複抓取
     finally:
         if mycursor:
             mycursor.close()
-    return editor_config # 返回字典或 None
+        _end_read(mydb, started)
+    return [url for hashed, url in unique.items() if hashed not in existing]
 
-def get_news_to_translate(mydb, limit):
-    """從 news 表獲取指定數量需要翻譯的文章"""
+def insert_news_batch(mydb, news_list):
+    """批次寫入新聞，已存在 (或同一批重複) 的 URL 會略過；返回 {url: 新 ID}
+
+    以一次 IN 查詢排除已存在的 URL，新文章以多列 INSERT IGNORE 寫入 (url_hash 唯一索引防止並行寫入重複)，
+    所有文章在同一個交易中提交。news_data 的欄位與 insert_news() 相同。
+    新 ID 以這一批的 url_hash 查回，其他程序同時寫入同一 URL 而無法分辨時，該批次的 ID 不列入返回值。
+    """
+    unique = {}
+    for news_data in news_list:
+        unique.setdefault(url_hash(news_data["url"]), news_data)
+    if not unique:
+        return {}
     mycursor = None
-    results = []
+    inserted = {}
+    total_written = 0
+    try:
+        mycursor = mydb.cursor()
+        existing = _existing_url_hashes(mycursor, list(unique))
+        new_items = [(hashed, news_data) for hashed, news_data in unique.items() if hashed not in existing]
+        columns = "(source, language, url, article_title, article_content, status, feature_picture, links)"
+        for i in range(0, len(new_items), INSERT_BATCH_SIZE):
+            batch = new_items[i:i + INSERT_BATCH_SIZE]
+            values = []
+            for _, news_data in batch:
+                values.extend((news_data["source"], news_data["language"], news_data["url"], news_data["article_title"],
+                               news_data["article_content"], news_data.get("status", 0), news_data.get("feature_picture"),
+                               news_data["links"]))
+            sql = f"INSERT IGNORE INTO news {columns} VALUES " + ', '.join(['(%s, %s, %s, %s, %s, %s, %s, %s)'] * len(batch))
+            mycursor.execute(sql, tuple(values))
+            written = mycursor.rowcount
+            total_written += written
+            if written:
+                # 只查詢這一批的 url_hash (寫入前都不存在)，不依賴 ID 的大小；其他程序並行寫入的 URL 在
+                # REPEATABLE READ 下不會被讀到，讀到的筆數與寫入筆數不符時無法分辨哪些是這次寫入的，不返回這一批的 ID
+                urls = {hashed: news_data["url"] for hashed, news_data in batch}
+                mycursor.execute(f"SELECT id, url_hash FROM news WHERE url_hash IN ({', '.join(['%s'] * len(urls))})",
+                                 tuple(urls))
+                found = {urls[hashed]: news_id for news_id, hashed in mycursor.fetchall() if hashed in urls}
+                if len(found) == written:
+                    inserted.update(found)
+                else:
+                    print(f"批次寫入新聞：{len(batch)} 篇中有 {len(batch) - written} 篇已由其他程序寫入，這一批的 ID 不返回。")
+        mydb.commit()
+        print(f"批次寫入新聞：共 {len(news_list)} 篇，已存在或重複 {len(news_list) - len(new_items)} 篇，新增 {total_written} 篇。")
+    except mysql.connector.Error as err:
+        print(f"批次寫入新聞時發生資料庫錯誤：{err}")
+        mydb.rollback()
+        inserted = {}
+    finally:
+        if mycursor:
+            mycursor.close()
+    return inserted
+
+def _load_editors(mydb):
+    """讀取所有啟用的編輯器設定，返回 {language: [編輯器設定]}；失敗時返回 None (快取下次重新讀取)"""
+    mycursor = None
+    started = not mydb.in_transaction
+    editors = {}
     try:
         mycursor = mydb.cursor(dictionary=True) # 使用 dictionary cursor
-        sql = """
-            SELECT id, source, language, url, article_title, article_content, links
-            FROM news
-            WHERE status = 0 AND (translated_title IS NULL OR translated_content IS NULL OR translated_title = '' OR translated_content = '')
-            ORDER BY id DESC
-            LIMIT %s
-        """
-        mycursor.execute(sql, (limit,))
-        results = mycursor.fetchall()
-        print(f"找到 {len(results)} 篇待翻譯文章。")
+        mycursor.execute("SELECT language, title_prompt, content_prompt, editor_name FROM editors WHERE is_deleted = %s", (0,))
+        for row in mycursor.fetchall():
+            editors.setdefault(row.pop('language'), []).append(row)
+        print(f"從 editors 表載入 {sum(len(configs) for configs in editors.values())} 個編輯器設定 ({len(editors)} 種語言)。")
     except mysql.connector.Error as err:
-        print(f"讀取待翻譯新聞時發生資料庫錯誤：{err}")
-    except Exception as e:
-        print(f"讀取待翻譯新聞時發生未知錯誤：{e}")
+        print(f"讀取 editors 時發生資料庫錯誤：{err}")
+        editors = None
     finally:
         if mycursor:
             mycursor.close()
-    return results # 返回列表，可能為空
+        _end_read(mydb, started)
+    return editors
+
+def get_editor_prompt(mydb, language):
+    """從快取的 editors 中隨機取得一個該語言啟用的編輯器設定"""
+    configs = (editor_cache.get(mydb) or {}).get(language)
+    if not configs:
+        print(f"在 editors 表中未找到語言 {language} 的啟用編輯器設定。")
+        return None
+    editor_config = dict(random.choice(configs)) # 複製一份，避免呼叫端修改快取內容
+    print(f"成功取得編輯器設定: {editor_config.get('editor_name', '未知')}")
+    return editor_config # 返回字典或 None
+
+def _translation_values(translated_title, translated_content, tags, slug, translator, status):
+    """將翻譯結果轉為 UPDATE 的參數 (title, content, tags, slug, translator, status)"""
+    # 處理 None 值，轉換為資料庫 NULL
+    db_title = translated_title if translated_title and "翻譯失敗" not in translated_title else None
+    db_content = translated_content if translated_content and "翻譯失敗" not in translated_content else None
+    db_tags = tags if tags else None
+    db_slug = slug if slug else None
+    db_translator = translator if translator else 'kakasong' # 提供預設翻譯者
+    # status 參數直接使用，不需要預設值或檢查
+    return (db_title, db_content, db_tags, db_slug, db_translator, status)
 
 def update_translated_news(mydb, article_id, translated_title, translated_content, tags, slug, translator, status):
     """更新 news 表中的翻譯結果、標籤、slug、翻譯者和狀態"""
@@ -129,16 +306,8 @@ def update_translated_news(mydb, article_id, translated_title, translated_conten
                 updated_at = NOW()
             WHERE id = %s
         """
-        # 處理 None 值，轉換為資料庫 NULL
-        db_title = translated_title if translated_title and "翻譯失敗" not in translated_title else None
-        db_content = translated_content if translated_content and "翻譯失敗" not in translated_content else None
-        db_tags = tags if tags else None
-        db_slug = slug if slug else None
-        db_translator = translator if translator else 'kakasong' # 提供預設翻譯者
-        # status 參數直接使用，不需要預設值或檢查
-
-        # 修正：將 news_type 和 status 加入 val 元組，並確保順序正確
-        val = (db_title, db_content, db_tags, db_slug, db_translator, status, article_id)
+        val = _translation_values(translated_title, translated_content, tags, slug, translator, status) + (article_id,)
+        db_translator = val[4]
         mycursor.execute(update_query, val)
         mydb.commit()
         print(f"文章 ID: {article_id} 更新成功 (Translator: {db_translator}, Status: {status})。") # 更新 print 訊息以包含 status
@@ -154,6 +323,120 @@ def update_translated_news(mydb, article_id, translated_title, translated_conten
             mycursor.close()
     return success # 返回 True 表示成功，False 表示失敗
 
+def claim_news_to_translate(mydb, limit, lease_seconds=DEFAULT_LEASE_SECONDS):
+    """原子性地領取一批待翻譯文章，返回 (lease_token, 文章列表)
+
+    以 SELECT ... FOR UPDATE SKIP LOCKED 選出未被領取 (或租約已過期) 的文章並寫入租約，交易隨即提交，
+    翻譯期間不持有資料列鎖；其他 worker 同時領取時會略過這些文章。需要 MySQL 8.0 / MariaDB 10.6 以上。
+    寫回時將 lease_token 交給 complete_translations()；翻譯失敗時以 release_news() 歸還。
+    mydb 不可有進行中的交易 (例如 autocommit 關閉時先前的查詢)，否則拋出 RuntimeError；
+    領取時提交交易會一併寫入呼叫端尚未決定的變更，請先 commit / rollback，或以 connect_to_db() 取得專用的連線。
+    """
+    if mydb.in_transaction:
+        raise RuntimeError("領取待翻譯文章需要沒有進行中交易的連線，請先 commit 或 rollback，或使用專用的連線。")
+    lease_token = uuid.uuid4().hex
+    mycursor = None
+    results = []
+    try:
+        mydb.start_transaction()
+        mycursor = mydb.cursor(dictionary=True)
+        mycursor.execute("""
+            SELECT id
+            FROM news
+            WHERE status = 0 AND (lease_until IS NULL OR lease_until < NOW())
+              AND (translated_title IS NULL OR translated_content IS NULL OR translated_title = '' OR translated_content = '')
+            ORDER BY id DESC
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        """, (limit,))
+        ids = [row['id'] for row in mycursor.fetchall()]
+        if ids:
+            placeholders = ', '.join(['%s'] * len(ids))
+            mycursor.execute(
+                f"UPDATE news SET lease_token = %s, lease_until = NOW() + INTERVAL %s SECOND WHERE id IN ({placeholders})",
+                (lease_token, lease_seconds, *ids),
+            )
+            # 在同一個交易中讀取內容，提交後連線不會留下進行中的交易
+            mycursor.execute(
+                f"SELECT id, source, language, url, article_title, article_content, links FROM news WHERE id IN ({placeholders}) ORDER BY id DESC",
+                tuple(ids),
+            )
+            results = mycursor.fetchall()
+        mydb.commit()
+        print(f"領取 {len(results)} 篇待翻譯文章 (租約 {lease_seconds} 秒)。")
+    except mysql.connector.Error as err:
+        print(f"領取待翻譯新聞時發生資料庫錯誤：{err}")
+        mydb.rollback()
+        results = []
+    finally:
+        if mycursor:
+            mycursor.close()
+    return lease_token, results
+
+def complete_translations(mydb, lease_token, translations):
+    """在單一交易中寫回一批翻譯結果並釋放租約，返回實際更新的文章數
+
+    translations 為 dict 列表，欄位: id, translated_title, translated_content, tags, slug, translator, status。
+    只更新仍由此 lease_token 持有的文章；租約過期後被其他 worker 重新領取的文章不會被覆寫。
+    """
+    if not translations:
+        return 0
+    mycursor = None
+    updated = 0
+    try:
+        mycursor = mydb.cursor()
+        update_query = """
+            UPDATE news
+            SET translated_title = %s,
+                translated_content = %s,
+                tags = %s,
+                slug = %s,
+                translator = %s,
+                status = %s,
+                lease_token = NULL,
+                lease_until = NULL,
+                updated_at = NOW()
+            WHERE id = %s AND lease_token = %s
+        """
+        rows = [_translation_values(item.get('translated_title'), item.get('translated_content'), item.get('tags'),
+                                    item.get('slug'), item.get('translator'), item['status']) + (item['id'], lease_token)
+                for item in translations]
+        mycursor.executemany(update_query, rows)
+        updated = mycursor.rowcount
+        mydb.commit()
+        skipped = len(rows) - updated
+        print(f"寫回 {updated} 篇翻譯結果" + (f"，{skipped} 篇的租約已失效未寫入。" if skipped else "。"))
+    except mysql.connector.Error as err:
+        print(f"批次寫回翻譯結果時發生資料庫錯誤: {err}")
+        mydb.rollback()
+        updated = 0
+    finally:
+        if mycursor:
+            mycursor.close()
+    return updated
+
+def release_news(mydb, lease_token, article_ids=None):
+    """歸還領取但未完成的文章 (未指定 article_ids 時歸還整批)，讓其他 worker 可立即重新領取"""
+    mycursor = None
+    released = 0
+    try:
+        mycursor = mydb.cursor()
+        sql = "UPDATE news SET lease_token = NULL, lease_until = NULL WHERE lease_token = %s"
+        params = [lease_token]
+        if article_ids:
+            sql += f" AND id IN ({', '.join(['%s'] * len(article_ids))})"
+            params.extend(article_ids)
+        mycursor.execute(sql, tuple(params))
+        released = mycursor.rowcount
+        mydb.commit()
+    except mysql.connector.Error as err:
+        print(f"歸還待翻譯文章時發生資料庫錯誤: {err}")
+        mydb.rollback()
+    finally:
+        if mycursor:
+            mycursor.close()
+    return released
+
 def insert_proper_noun(mydb, noun, url):
     """將專有名詞插入 proper_nouns 表的 unknown_noun 欄位"""
     mycursor = None
@@ -195,9 +478,67 @@ def insert_proper_noun(mydb, noun, url):
             mycursor.close() # 確保游標關閉
     return success # 返回 True 表示成功，False 表示失敗
 
+def _load_known_nouns(mydb):
+    """讀取 proper_nouns 中所有名詞 (不論是否已翻譯)，返回 set；失敗時返回 None"""
+    mycursor = None
+    started = not mydb.in_transaction
+    known = set()
+    try:
+        mycursor = mydb.cursor()
+        mycursor.execute("SELECT unknown_noun FROM proper_nouns")
+        known = {row[0] for row in mycursor.fetchall()}
+    except mysql.connector.Error as err:
+        print(f"讀取 proper_nouns 時發生資料庫錯誤：{err}")
+        known = None
+    finally:
+        if mycursor:
+            mycursor.close()
+        _end_read(mydb, started)
+    return known
+
+def insert_proper_nouns(mydb, nouns, url):
+    """批次新增一篇文章中找到的專有名詞，返回新加入的名詞列表
+
+    名詞去除前後空白與重複後，先以快取的已知名詞集合排除，其餘以一次多列 INSERT IGNORE 寫入
+    (unknown_noun 唯一索引，見 doc/proper_nouns.sql)，並行的 worker 同時寫入同一名詞也不會重複。
+    """
+    candidates = [noun for noun in dict.fromkeys(noun.strip() for noun in nouns if noun) if noun]
+    known = known_noun_cache.get(mydb) or set()
+    candidates = [noun for noun in candidates if noun not in known]
+    if not candidates:
+        return []
+    mycursor = None
+    inserted = []
+    try:
+        mycursor = mydb.cursor()
+        sql = "INSERT IGNORE INTO proper_nouns (unknown_noun, url) VALUES " + ', '.join(['(%s, %s)'] * len(candidates))
+        mycursor.execute(sql, tuple(value for noun in candidates for value in (noun, url)))
+        if mycursor.rowcount == len(candidates):
+            inserted = candidates
+        elif mycursor.rowcount:
+            # 部分名詞已由其他 worker 寫入 (或只有大小寫不同)；lastrowid 為此次寫入的第一個 ID
+            mycursor.execute(
+                f"SELECT unknown_noun FROM proper_nouns WHERE id >= %s AND unknown_noun IN ({', '.join(['%s'] * len(candidates))})",
+                (mycursor.lastrowid, *candidates),
+            )
+            inserted = [row[0] for row in mycursor.fetchall()]
+        mydb.commit()
+        known.update(candidates) # 同一個快取週期內不再嘗試寫入這些名詞
+        if inserted:
+            print(f"已將 {len(inserted)} 個新名詞插入 proper_nouns 表：{'、'.join(inserted)}")
+    except mysql.connector.Error as err:
+        print(f"批次插入專有名詞時發生資料庫錯誤: {err}")
+        mydb.rollback()
+        inserted = []
+    finally:
+        if mycursor:
+            mycursor.close()
+    return inserted
+
 def get_proper_nouns(mydb):
     """從 proper_nouns 表獲取已翻譯的專有名詞對列表"""
     mycursor = None
+    started = not mydb.in_transaction
     proper_noun_pairs = [] # 初始化一個空列表來存放名詞對
     try:
         mycursor = mydb.cursor()
@@ -224,5 +565,42 @@ ORDER BY LENGTH(unknown_noun) DESC
     finally:
         if mycursor:
             mycursor.close()
+        _end_read(mydb, started)
             
     return proper_noun_pairs # 返回包含元組的單一列表
+
+def table_checksum(mydb, table):
+    """返回資料表的 CHECKSUM TABLE 值，用來判斷快取是否過期；失敗時返回 None"""
+    if table not in CHECKSUM_TABLES:
+        raise ValueError(f"不支援的資料表: {table}")
+    mycursor = None
+    started = not mydb.in_transaction
+    checksum = None
+    try:
+        mycursor = mydb.cursor()
+        mycursor.execute(f"CHECKSUM TABLE {table}")
+        rows = mycursor.fetchall() # 讀完結果，避免留下未讀取的結果
+        if rows:
+            checksum = rows[0][1]
+    except mysql.connector.Error as err:
+        print(f"讀取 {table} 的 checksum 時發生資料庫錯誤：{err}")
+    finally:
+        if mycursor:
+            mycursor.close()
+        _end_read(mydb, started)
+    return checksum
+
+def proper_nouns_checksum(mydb):
+    """返回 proper_nouns 的 CHECKSUM TABLE 值，用來判斷已編譯的取代規則是否過期；失敗時返回 None"""
+    return table_checksum(mydb, 'proper_nouns')
+
+def editors_checksum(mydb):
+    return table_checksum(mydb, 'editors')
+
+def get_proper_noun_rewriter(mydb):
+    """返回以 proper_nouns 已翻譯名詞編譯的 Rewriter；資料表未變更時不查詢資料庫"""
+    return proper_noun_cache.get(mydb)
+
+editor_cache = TableCache(_load_editors, editors_checksum)
+proper_noun_cache = RewriteCache(get_proper_nouns, proper_nouns_checksum)
+known_noun_cache = TableCache(_load_known_nouns, proper_nouns_checksum)
@@ -1,28 +1,28 @@
+import argparse
 import csv
 import os
+import sys
+import time
 import mysql.connector
-from dotenv import load_dotenv
 
-# Load environment variables from .env file
-load_dotenv()
+# 將專案根目錄添加到 Python 路徑
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from src.utils.db import connect_to_db, get_proper_nouns, proper_nouns_checksum
+from src.utils.marketplace import MARKETPLACES, NAME_REPLACEMENTS, RutenWriter, product_description
+from src.utils.rewrite import RewriteCache
+from src.utils.listing_filter import DEFAULT_RULES_PATH, ListingFilter
+from src.utils.metrics import metrics
 
 # CSV file name
 csv_file = 'ruten_auction_new.csv'
 
-def connect_to_db():
-    """建立並返回資料庫連線"""
-    try:
-        mydb = mysql.connector.connect(
-            host=os.getenv("DB_HOST"),
-            user=os.getenv("DB_USER"),
-            password=os.getenv("DB_PASSWORD"),
-            database=os.getenv("DB_NAME")
-        )
-        print("資料庫連線成功。")
-        return mydb
-    except mysql.connector.Error as err:
-        print(f"資料庫連線失敗：{err}")
-        return None
+DEFAULT_CHUNK_SIZE = 1000 # 每次從資料庫讀取的筆數
+# proper_nouns 的翻譯詞與固定的名稱取代編譯成一個 Rewriter，資料表未變更時重複使用
+rewrite_cache = RewriteCache(get_proper_nouns, proper_nouns_checksum, extra_pairs=NAME_REPLACEMENTS)
+
+EXPORT_FIELDS = ('product_id', 'option_id', 'name', 'price', 'option')
+EXPORT_SQL = "SELECT product_id, option_id, name, price, `option` FROM aowotoy_products"
 
 def delete_csv():
     """Traverse directories and delete all CSV files."""
@@ -36,8 +36,82 @@ def delete_csv():
                 except OSError as e:
                     print(f"Error deleting file {file_path}: {e}")
 
-def export_csv_by_product_id(test_flag=False):
+def stream_rows(conn, sql, params=(), chunk_size=DEFAULT_CHUNK_SIZE):
+    """以未緩衝 (unbuffered) 的游標逐批讀取查詢結果
+
+    伺服器端結果只會一次送出 chunk_size 筆到用戶端，記憶體用量與資料表大小無關。
+    中途發生例外或提前結束時，剩下的結果會被丟棄，連線仍可繼續使用；
+    清理時的錯誤只記錄下來，不會蓋掉原本的例外。
+    """
+    cursor = conn.cursor(buffered=False)
+    try:
+        cursor.execute(sql, params)
+        while True:
+            with metrics.timer('export_fetch'):
+                rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield rows
+    finally:
+        try:
+            # 未讀完的結果留在連線上時 close() 會拋出 "Unread result found"
+            conn.consume_results()
+            cursor.close()
+        except mysql.connector.Error as e:
+            print(f"關閉匯出游標時發生錯誤: {e}")
+
+class ExportProgress:
+    """統計匯出筆數並定期輸出進度與每秒筆數"""
+
+    def __init__(self, label, report_every=DEFAULT_CHUNK_SIZE * 10):
+        self.label = label
+        self.report_every = report_every
+        self.rows = 0
+        self._next_report = report_every
+        self._start = time.monotonic()
+
+    def add(self, count):
+        self.rows += count
+        metrics.inc('export_rows', count)
+        if self.rows >= self._next_report:
+            self._next_report += self.report_every
+            print(f"{self.label}：已匯出 {self.rows} 筆 ({self.rate():.0f} 筆/秒)。")
+
+    def rate(self):
+        elapsed = time.monotonic() - self._start
+        return self.rows / elapsed if elapsed > 0 else 0.0
+
+    def finish(self):
+        elapsed = time.monotonic() - self._start
+        print(f"{self.label}：共匯出 {self.rows} 筆，耗時 {elapsed:.1f} 秒 ({self.rate():.0f} 筆/秒)。")
+
+def _export_query(order_by, test_flag, listing_filter):
+    """返回 (SQL, 參數)；排除規則能轉成 SQL 的部分直接放進 WHERE"""
+    sql = EXPORT_SQL
+    condition, params = listing_filter.sql_where()
+    if condition:
+        sql += f" WHERE {condition}"
+    # 測試模式只讀取兩筆，讓未緩衝游標不會留下未讀取的結果
+    return f"{sql} ORDER BY {order_by}" + (" LIMIT 2" if test_flag else ""), params
+
+def _report_excluded(conn, listing_filter, report_excluded):
+    """report_excluded 為 True 時輸出每條規則排除的筆數
+
+    SQL 規則排除的規格不會被讀出，統計需要另外掃描一次整個資料表，因此預設不執行。
+    """
+    if report_excluded:
+        total, counts = listing_filter.excluded_counts(conn)
+        print(listing_filter.report(total, counts))
+
+def export_csv_by_product_id(test_flag=False, chunk_size=DEFAULT_CHUNK_SIZE, listing_filter=None, report_excluded=False):
+    """每個產品輸出一個露天 CSV；listing_filter 未指定時使用 src/utils/listing_filter.py 的設定
+
+    report_excluded 為 True 時另外掃描一次資料表，輸出每條排除規則命中的筆數。
+    """
+    if listing_filter is None:
+        listing_filter = ListingFilter.from_file()
     conn = None
+    f = None
     try:
         # Connect to the database
         conn = connect_to_db()
@@ -45,72 +119,83 @@ def export_csv_by_product_id(test_flag=False):
             print("無法連線到資料庫，匯出失敗。")
             return
 
-        cursor = conn.cursor()
-
-        cursor.execute("SELECT product_id, name, price, option FROM aowotoy_products")
-
-        rows = cursor.fetchall()
-
         column_names = ['類別(必填)', '物品名稱(必填)', '商品價格(必填)', '數量(必填)', '自訂賣場分類', '物品說明', '物品新舊', '圖片1', '圖片2', '圖片3', '物品所在地', '評價總分需大於', '差勁評價需小於', '棄單不可超過次數', '手工製品', '附禮盒/提袋', '原廠保固', '賣家保固', '到府安裝', 'DIY安裝', '專櫃正品', '公司貨', '平行輸入', '可開發票', '可開收據', '附保證書', '附鑑定書', '有多種尺寸', '有多種顏色', '海外運送', '賣家自用料號', '備貨狀態', '預計出貨年月(若備貨狀態為2，則必填)', '較長備商品出貨天數(若備貨狀態為6，則必填)']
 
-        # Export data for each product to a separate CSV file
-        for i, row in enumerate(rows):
-            if test_flag and i >= 2:
-                print("Test flag is set, processing stopped after 2 rows.")
-                break
-
-            product_id, name, price, option = row
-
-            # Create directory for the product if it doesn't exist
-            product_dir = os.path.join('products', str(product_id))
-            os.makedirs(product_dir, exist_ok=True)
-
-            # Define the CSV file path
-            product_csv_file = os.path.join(product_dir, csv_file)
-
-            # 如果不存在就製作
-            if not os.path.exists(product_csv_file):
-                with open(product_csv_file, 'w', newline='', encoding='utf-8-sig') as f:
-                    writer = csv.writer(f)
-                    writer.writerow(column_names)
-
-            # 名稱取代
-            name = name.replace('高達', '鋼彈')
-            name = name.replace('AOWOBOX', '阿庫力')
-
-            # Transform data row to the new format
-            transformed_row = [
-                '50008',
-                name,
-                str(float(price) * 1.6),
-                '10',
-                '6438417',
-                f'專為 {name} 設計的壓克力公仔模型展示盒，附有噴繪背景與底板設計。\n\n商品材質：壓克力\n\n商品規格：{option}\n\n如有其他商品疑問，例如燈款、電源等，歡迎小窗詢問。',
-                '',
-                f'{product_id}_1.jpg',
-                f'{product_id}_2.jpg'
-            ]
-            # Add 26 empty strings
-            transformed_row.extend([''] * 26)
-
-            # Write data to CSV file for the current product
-            with open(product_csv_file, 'a', newline='', encoding='utf-8-sig') as f:
-                writer = csv.writer(f)
-                writer.writerow(transformed_row)
-
-            print(f"Data for product {product_id} exported to {product_csv_file}")
+        rewriter = rewrite_cache.get(conn)
+        progress = ExportProgress("產品 CSV")
+        current_product_id = None
+        writer = None
+        # 結果依 product_id 排序，每個產品的 CSV 只開啟一次
+        sql, params = _export_query('product_id, id', test_flag, listing_filter)
+        for rows in stream_rows(conn, sql, params, chunk_size=chunk_size):
+            with metrics.timer('export_write'):
+                for row in rows:
+                    product_id, _, name, price, option = row
+                    if not listing_filter.keep(dict(zip(EXPORT_FIELDS, row))):
+                        continue
+                    if product_id != current_product_id:
+                        if f:
+                            f.close()
+                        current_product_id = product_id
+
+                        # Create directory for the product if it doesn't exist
+                        product_dir = os.path.join('products', str(product_id))
+                        os.makedirs(product_dir, exist_ok=True)
+
+                        # Define the CSV file path
+                        product_csv_file = os.path.join(product_dir, csv_file)
+
+                        # 已存在時接續寫入，不存在就製作並寫入標題
+                        exists = os.path.exists(product_csv_file)
+                        f = open(product_csv_file, 'a' if exists else 'w', newline='', encoding='utf-8-sig')
+                        writer = csv.writer(f)
+                        if not exists:
+                            writer.writerow(column_names)
+
+                    name = rewriter.rewrite(name)
+
+                    # Transform data row to the new format
+                    transformed_row = [
+                        '50008',
+                        name,
+                        str(float(price) * 1.6),
+                        '10',
+                        '6438417',
+                        product_description(name, rewriter.rewrite(option)),
+                        '',
+                        f'{product_id}_1.jpg',
+                        f'{product_id}_2.jpg'
+                    ]
+                    # Add 26 empty strings
+                    transformed_row.extend([''] * 26)
+
+                    # Write data to CSV file for the current product
+                    writer.writerow(transformed_row)
+            progress.add(len(rows))
+        progress.finish()
+        _report_excluded(conn, listing_filter, report_excluded)
 
     except mysql.connector.Error as e:
         print(f"Database error: {e}")
     except Exception as e:
         print(f"An error occurred: {e}")
     finally:
-        if conn and conn.is_connected():
+        if f:
+            f.close()
+        if conn: # 歸還連線池
             conn.close()
             print("資料庫連線已關閉。")
 
-def export_all_csv(output_filename='ruten_auction_new.csv', test_flag=False):
+def export_marketplaces(writers, test_flag=False, chunk_size=DEFAULT_CHUNK_SIZE, listing_filter=None, report_excluded=False):
+    """掃描一次 aowotoy_products，同時輸出多個平台的 CSV；writers 為 MarketplaceWriter 列表
+
+    listing_filter (ListingFilter) 排除不上架的規格，未指定時使用 src/utils/listing_filter.py 的設定。
+    report_excluded 為 True 時另外掃描一次資料表，輸出每條排除規則命中的筆數。
+    """
+    if listing_filter is None:
+        listing_filter = ListingFilter.from_file()
     conn = None
+    opened = []
     try:
         # Connect to the database
         conn = connect_to_db()
@@ -118,69 +203,70 @@ def export_all_csv(output_filename='ruten_auction_new.csv', test_flag=False):
             print("無法連線到資料庫，匯出失敗。")
             return
 
-        cursor = conn.cursor()
-
-        cursor.execute("SELECT product_id, name, price, option FROM aowotoy_products")
-
-        rows = cursor.fetchall()
-
-        column_names = ['類別(必填)', '物品名稱(必填)', 'OPTION', '商品價格(必填)', '數量(必填)', '自訂賣場分類', '物品說明', '物品新舊', '圖片1', '圖片2', '圖片3', '物品所在地', '評價總分需大於', '差勁評價需小於', '棄單不可超過次數', '手工製品', '附禮盒/提袋', '原廠保固', '賣家保固', '到府安裝', 'DIY安裝', '專櫃正品', '公司貨', '平行輸入', '可開發票', '可開收據', '附保證書', '附鑑定書', '有多種尺寸', '有多種顏色', '海外運送', '賣家自用料號', '備貨狀態', '預計出貨年月(若備貨狀態為2，則必填)', '較長備商品出貨天數(若備貨狀態為6，則必填)']
-
-        # Define the single CSV file path
-        all_csv_file = output_filename
-
-        with open(all_csv_file, 'w', newline='', encoding='utf-8-sig') as f:
-            writer = csv.writer(f)
-            writer.writerow(column_names)
-
-            # Export data for each product to the single CSV file
-            for i, row in enumerate(rows):
-                if test_flag and i >= 2:
-                    print("Test flag is set, processing stopped after 2 rows.")
-                    break
-
-                product_id, name, price, option = row
-
-                # 名稱取代
-                name = name.replace('高達', '鋼彈')
-                name = name.replace('AOWOBOX', '阿庫力')
-
-                # Transform data row to the new format
-                calculated_price = round(float(price) * 1.6)
-                final_price = calculated_price - (calculated_price % 10)
-                transformed_row = [
-                    '50008',
-                    name,
-                    option,
-                    str(final_price),
-                    '10',
-                    '6438417',
-                    f'專為 {name} 設計的壓克力公仔模型展示盒，附有噴繪背景與底板設計。\n\n商品材質：壓克力\n\n商品規格：{option}\n\n如有其他商品疑問，例如燈款、電源等，歡迎小窗詢問。',
-                    '',
-                    f'{product_id}_1.jpg',
-                    f'{product_id}_2.jpg'
-                ]
-                # Add 26 empty strings
-                transformed_row.extend([''] * 26)
-
-                # Write data to the single CSV file
-                writer.writerow(transformed_row)
-
-                print(f"Data for product {product_id} exported to {all_csv_file}")
-
-        print(f"All product data exported to {all_csv_file}")
+        rewriter = rewrite_cache.get(conn)
+        for writer in writers:
+            writer.rewriter = rewriter
+            writer.open()
+            opened.append(writer)
+        progress = ExportProgress("、".join(writer.name for writer in writers))
+
+        # 逐批讀取，每一批同時交給所有平台的 writer
+        sql, params = _export_query('id', test_flag, listing_filter)
+        for rows in stream_rows(conn, sql, params, chunk_size=chunk_size):
+            with metrics.timer('export_write'):
+                products = [product for product in (dict(zip(EXPORT_FIELDS, row)) for row in rows) if listing_filter.keep(product)]
+                for writer in writers:
+                    writer.write(products)
+            progress.add(len(rows))
+
+        progress.finish()
+        _report_excluded(conn, listing_filter, report_excluded)
+        for writer in writers:
+            print(f"{writer.name}：{writer.rows} 筆匯出到 {writer.output_filename}")
 
     except mysql.connector.Error as e:
         print(f"Database error: {e}")
     except Exception as e:
         print(f"An error occurred: {e}")
     finally:
-        if conn and conn.is_connected():
+        for writer in opened:
+            writer.close()
+        if conn: # 歸還連線池
             conn.close()
             print("資料庫連線已關閉。")
 
+def export_all_csv(output_filename='ruten_auction_new.csv', test_flag=False, chunk_size=DEFAULT_CHUNK_SIZE, listing_filter=None):
+    """只輸出露天格式的單一 CSV"""
+    export_marketplaces([RutenWriter(output_filename)], test_flag=test_flag, chunk_size=chunk_size, listing_filter=listing_filter)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="匯出 aowotoy 產品資料為各平台 CSV")
+    parser.add_argument('--marketplaces', nargs='+', choices=sorted(MARKETPLACES), default=['ruten'], help="要輸出的平台，一次掃描資料庫同時輸出")
+    parser.add_argument('--shopee-category', default=os.getenv('SHOPEE_CATEGORY_ID'),
+                        help="蝦皮的分類 ID (必填，輸出 shopee 時使用；預設讀取環境變數 SHOPEE_CATEGORY_ID)")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help="每次從資料庫讀取的筆數")
+    parser.add_argument('--test', action='store_true', help="只匯出兩筆資料")
+    parser.add_argument('--filter-rules', default=DEFAULT_RULES_PATH, help="上架排除規則的 JSON 設定檔 (不存在時使用預設規則)")
+    parser.add_argument('--no-filter', action='store_true', help="不套用上架排除規則")
+    parser.add_argument('--report-excluded', action='store_true', help="匯出後輸出每條排除規則命中的筆數 (需要另外掃描一次資料表)")
+    parser.add_argument('--metrics-out', default=None, help="匯出結束後寫入讀取與寫檔耗時的量測檔案 (.prom 為 Prometheus 文字格式，其他為 JSON)")
+    return parser.parse_args()
+
 if __name__ == "__main__":
     # delete_csv() # Optional: uncomment if you want to delete existing CSVs before exporting
     
-    # test_flag = True  # Set to True for testing, False for full export
-    export_all_csv(output_filename='all_products.csv')
+    args = parse_args()
+    # 露天沿用 all_products.csv，其他平台使用預設檔名
+    filenames = {'ruten': 'all_products.csv'}
+    options = {'shopee': {'category': args.shopee_category}} # 各平台 writer 的必填設定
+    try:
+        writers = [MARKETPLACES[name](filenames.get(name), **options.get(name, {})) for name in args.marketplaces]
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+    listing_filter = ListingFilter([]) if args.no_filter else ListingFilter.from_file(args.filter_rules)
+    export_marketplaces(writers, test_flag=args.test, chunk_size=args.chunk_size, listing_filter=listing_filter,
+                        report_excluded=args.report_excluded)
+    print(metrics.summary())
+    if args.metrics_out:
+        metrics.write(args.metrics_out)
@@ -0,0 +1,94 @@
+"""
+描述:
+    產品內容指紋。將產品 JSON 中會影響上架資料的欄位 (標題、價格、規格、圖片 URL、updated_at 等)
+    正規化後計算 SHA-256，存放在 aowotoy_products.fingerprint 欄位。
+    重新爬取時指紋相同即代表內容未變，可略過資料庫寫入與圖片下載。
+"""
+import hashlib
+import json
+import logging
+import re
+from collections import Counter
+
+
+def _strip_query(url):
+    return re.sub(r'\?.*$', '', url or '')
+
+
+def product_fingerprint(json_data, product_detail=''):
+    """計算產品內容指紋 (64 字元十六進位字串)"""
+    variations = []
+    for variation in json_data.get('variations', []):
+        variations.append({
+            'key': variation.get('key', ''),
+            'price': variation.get('price', {}).get('dollars'),
+            'fields': [field.get('name_translations', {}).get('zh-hant', '') for field in variation.get('fields', [])],
+        })
+    media = [
+        _strip_query(image.get('images', {}).get('original', {}).get('url', ''))
+        for image in json_data.get('media', [])
+    ]
+    payload = {
+        'title': json_data.get('title_translations', {}).get('zh-hant', ''),
+        'summary': json_data.get('summary_translations', {}).get('zh-hant', ''),
+        # HTTP 與瀏覽器取得的描述文字只有換行與空白不同，忽略空白讓 fetch mode 不影響指紋
+        'detail': ''.join((product_detail or '').split()),
+        'price': json_data.get('price', {}).get('dollars'),
+        'variations': variations,
+        'media': media,
+        'updated_at': json_data.get('updated_at'),
+    }
+    encoded = json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+class FingerprintIndex:
+    """product_id -> 指紋 的對照表，並統計略過與變更的產品數"""
+
+    def __init__(self, fingerprints=None):
+        self._fingerprints = dict(fingerprints or {})
+        self.stats = Counter()
+
+    @classmethod
+    def load(cls, mydb):
+        """從 aowotoy_products 一次載入所有產品的指紋
+
+        只採用所有規格資料列的指紋都相同 (且不為空) 的產品；資料列的指紋不一致時 (例如舊版留下的已移除規格)
+        無法判斷哪一個代表目前的內容，不載入指紋，下次爬取時視為新產品重新寫入。
+        """
+        cursor = mydb.cursor()
+        try:
+            cursor.execute(
+                "SELECT product_id, MIN(fingerprint) FROM aowotoy_products GROUP BY product_id "
+                "HAVING COUNT(DISTINCT fingerprint) = 1 AND MIN(fingerprint) != ''"
+            )
+            fingerprints = {product_id: fingerprint for product_id, fingerprint in cursor.fetchall()}
+        finally:
+            cursor.close()
+        logging.info(f"已載入 {len(fingerprints)} 個產品指紋。")
+        return cls(fingerprints)
+
+    def __len__(self):
+        return len(self._fingerprints)
+
+    def is_unchanged(self, product_id, fingerprint):
+        """內容與已記錄的指紋相同時返回 True；不會記錄新的指紋，處理成功後再呼叫 record()"""
+        previous = self._fingerprints.get(product_id)
+        if previous == fingerprint:
+            self.stats['unchanged'] += 1
+            return True
+        self.stats['new' if previous is None else 'changed'] += 1
+        return False
+
+    def record(self, product_id, fingerprint):
+        """產品資料已 commit 且圖片完整後記錄指紋"""
+        self._fingerprints[product_id] = fingerprint
+
+    def forget(self, product_id):
+        """移除產品的指紋，下一次檢查時視為新產品"""
+        self._fingerprints.pop(product_id, None)
+
+    def summary(self):
+        total = sum(self.stats[key] for key in ('unchanged', 'changed', 'new'))
+        return (f"共檢查 {total} 個產品：未變 {self.stats['unchanged']} (略過寫入與 {self.stats['images_skipped']} 張圖片)、"
+                f"變更 {self.stats['changed']}、新產品 {self.stats['new']}。")
@@ -0,0 +1,113 @@
+"""
+描述:
+    持久化的爬取佇列 (crawl frontier)。以 SQLite 記錄每個產品 URL 的狀態
+    (pending / in_progress / done / failed)、嘗試次數與最後一次錯誤，
+    程式中斷 (斷線、OOM、Ctrl-C) 後重新執行可從上次的進度繼續，失敗的 URL 可另外重試。
+"""
+import sqlite3
+import time
+
+PENDING = 'pending'
+IN_PROGRESS = 'in_progress'
+DONE = 'done'
+FAILED = 'failed'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS frontier (
+    url TEXT PRIMARY KEY,
+    seq INTEGER NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_frontier_state ON frontier (state, seq);
+"""
+
+
+class Frontier:
+    """SQLite 上的 URL 狀態表；每次狀態變更都立即寫入磁碟"""
+
+    def __init__(self, path='crawl_frontier.sqlite3'):
+        self.path = path
+        self._conn = sqlite3.connect(path, isolation_level=None) # autocommit，狀態變更立即生效
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        row = self._conn.execute("SELECT COALESCE(MAX(seq), 0) FROM frontier").fetchone()
+        self._seq = row[0]
+
+    def close(self):
+        self._conn.close()
+
+    def reset(self):
+        """清空所有紀錄，開始新的一輪爬取"""
+        self._conn.execute("DELETE FROM frontier")
+        self._seq = 0
+
+    def recover(self):
+        """把上次中斷時仍在處理中的 URL 放回 pending；返回筆數"""
+        cursor = self._conn.execute(
+            "UPDATE frontier SET state = ?, updated_at = ? WHERE state = ?",
+            (PENDING, time.time(), IN_PROGRESS),
+        )
+        return cursor.rowcount
+
+    def add(self, urls):
+        """加入 URL，返回先前不存在而新加入的 URL (保持原順序)"""
+        added = []
+        now = time.time()
+        self._conn.execute("BEGIN")
+        try:
+            for url in urls:
+                cursor = self._conn.execute(
+                    "INSERT OR IGNORE INTO frontier (url, seq, state, updated_at) VALUES (?, ?, ?, ?)",
+                    (url, self._seq + 1, PENDING, now),
+                )
+                if cursor.rowcount:
+                    self._seq += 1
+                    added.append(url)
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+        return added
+
+    def claim(self, url):
+        """將 URL 標記為處理中；已完成或已被其他 worker 取走時返回 False"""
+        cursor = self._conn.execute(
+            "UPDATE frontier SET state = ?, attempts = attempts + 1, updated_at = ? WHERE url = ? AND state IN (?, ?)",
+            (IN_PROGRESS, time.time(), url, PENDING, FAILED),
+        )
+        return cursor.rowcount == 1
+
+    def mark_done(self, url):
+        self._conn.execute(
+            "UPDATE frontier SET state = ?, last_error = NULL, updated_at = ? WHERE url = ?",
+            (DONE, time.time(), url),
+        )
+
+    def mark_failed(self, url, error):
+        self._conn.execute(
+            "UPDATE frontier SET state = ?, last_error = ?, updated_at = ? WHERE url = ?",
+            (FAILED, str(error)[:1000], time.time(), url),
+        )
+
+    def pending(self):
+        """依加入順序返回所有 pending 的 URL"""
+        rows = self._conn.execute("SELECT url FROM frontier WHERE state = ? ORDER BY seq", (PENDING,))
+        return [row[0] for row in rows]
+
+    def failed(self, max_attempts):
+        """返回嘗試次數尚未達到 max_attempts 的失敗 URL"""
+        rows = self._conn.execute(
+            "SELECT url FROM frontier WHERE state = ? AND attempts < ? ORDER BY seq",
+            (FAILED, max_attempts),
+        )
+        return [row[0] for row in rows]
+
+    def counts(self):
+        """返回各狀態的 URL 數量"""
+        counts = {PENDING: 0, IN_PROGRESS: 0, DONE: 0, FAILED: 0}
+        for state, count in self._conn.execute("SELECT state, COUNT(*) FROM frontier GROUP BY state"):
+            counts[state] = count
+        return counts
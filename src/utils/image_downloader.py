@@ -0,0 +1,187 @@
+"""
+描述:
+    並行的產品圖片下載器。以 semaphore 限制同時下載數，將回應分段串流寫入暫存檔並同時計算 SHA-256，
+    完成後放入 ImageStore (content-addressed)，再以 hardlink 放到產品目錄，因此記憶體用量與圖片大小無關。
+    ImageStore 已知的 URL 不會重新下載；中斷留下的暫存檔會以 Range 請求續傳。
+    指定 processor (ImageProcessor) 時，產品目錄中的檔案改為指向轉檔後的真正 JPEG，
+    露天上傳版本放在 ImageStore 的 upload/<product_id>/ 下。
+"""
+import asyncio
+import hashlib
+import logging
+import os
+from collections import Counter
+
+import aiofiles
+import aiohttp
+
+from src.utils.metrics import metrics
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class DownloadError(Exception):
+    """下載失敗且不需重試的錯誤 (例如 404)"""
+
+
+class _RangeNotSatisfiable(Exception):
+    """續傳請求回應 416：暫存檔的長度已不小於伺服器上的檔案"""
+
+
+class ImageDownloader:
+    """以共用 aiohttp session 下載圖片並存入 store (ImageStore)"""
+
+    def __init__(self, session, store, processor=None, concurrency=8, retries=3, backoff=1.0, chunk_size=64 * 1024):
+        self.session = session
+        self.store = store
+        self.processor = processor
+        self.retries = max(1, retries)
+        self.backoff = backoff
+        self.chunk_size = chunk_size
+        self._semaphore = asyncio.Semaphore(max(1, concurrency))
+        self._inflight = {} # url -> 下載中的 task
+        self.stats = Counter()
+
+    async def _hash_partial(self, part_path):
+        """續傳前先計算已下載部分的雜湊"""
+        digest = hashlib.sha256()
+        async with aiofiles.open(part_path, 'rb') as f:
+            while True:
+                chunk = await f.read(self.chunk_size)
+                if not chunk:
+                    break
+                digest.update(chunk)
+        return digest
+
+    async def _fetch(self, url):
+        """下載 url 到 store，返回內容雜湊"""
+        try:
+            return await self._fetch_once(url, resume=True)
+        except _RangeNotSatisfiable:
+            # 暫存檔已是完整內容 (上次在放入 store 前中斷) 或伺服器上的檔案變短，丟棄後重新下載
+            os.remove(self.store.temp_path(url))
+            self.stats['restarted'] += 1
+            return await self._fetch_once(url, resume=False)
+
+    async def _fetch_once(self, url, resume):
+        entry = self.store.entry(url)
+        part_path = self.store.temp_path(url)
+        request_headers = {}
+        offset = os.path.getsize(part_path) if resume and os.path.exists(part_path) else 0
+        if offset and entry.get('etag'):
+            # 續傳上次中斷的下載；ETag 不同時伺服器會回傳完整內容
+            request_headers['Range'] = f"bytes={offset}-"
+            request_headers['If-Range'] = entry['etag']
+
+        async with self.session.get(url, headers=request_headers) as response:
+            if response.status == 416 and 'Range' in request_headers:
+                raise _RangeNotSatisfiable()
+            if response.status in RETRYABLE_STATUS:
+                raise aiohttp.ClientResponseError(response.request_info, response.history,
+                                                  status=response.status, message=response.reason)
+            if response.status not in (200, 206):
+                raise DownloadError(f"HTTP {response.status}")
+
+            if response.status == 206:
+                mode = 'ab'
+                digest = await self._hash_partial(part_path)
+            else:
+                mode = 'wb'
+                digest = hashlib.sha256()
+            etag = response.headers.get('ETag')
+            # 先記錄 ETag，程式中斷時下一次可以續傳暫存檔
+            self.store.set_partial(url, etag)
+            received = 0
+            try:
+                async with aiofiles.open(part_path, mode) as f:
+                    async for chunk in response.content.iter_chunked(self.chunk_size):
+                        digest.update(chunk)
+                        await f.write(chunk)
+                        received += len(chunk)
+            finally:
+                self.stats['bytes'] += received
+                metrics.add_bytes('image_download', received)
+
+        return self.store.add(part_path, url, digest.hexdigest(), etag)
+
+    async def _download_with_retry(self, url):
+        """下載失敗時以指數退避重試；返回內容雜湊，失敗時返回 None"""
+        async with self._semaphore:
+            for attempt in range(self.retries):
+                try:
+                    with metrics.timer('image_download'):
+                        return await self._fetch(url)
+                except DownloadError as e:
+                    logging.warning(f"下載圖片 {url} 失敗: {e}")
+                    return None
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    if attempt + 1 < self.retries:
+                        delay = self.backoff * (2 ** attempt)
+                        logging.info(f"下載圖片 {url} 失敗 ({e})，{delay:.1f} 秒後重試。")
+                        await asyncio.sleep(delay)
+                    else:
+                        logging.warning(f"下載圖片 {url} 失敗，已重試 {self.retries} 次: {e}")
+        return None
+
+    async def _place(self, digest, path):
+        """把圖片放到產品目錄；有 processor 時使用正規化後的 JPEG，並在 store 的 upload/<product_id>/ 放上傳版本"""
+        if self.processor is None:
+            self.store.link(digest, path)
+            return
+        try:
+            with metrics.timer('image_process'):
+                await self.processor.process(digest)
+        except Exception as e:
+            logging.warning(f"圖片 {digest} 轉檔失敗，改用原始檔: {e}")
+            self.stats['process_failed'] += 1
+            self.store.link(digest, path)
+            return
+        self.store.link(digest, path, variant='jpeg')
+        # 上傳版本不放在 products/ 下，避免 rename.py 把它當成產品圖片改名
+        product_id = os.path.basename(os.path.dirname(path))
+        self.store.link(digest, self.store.upload_path(product_id, os.path.basename(path)), variant='upload')
+
+    async def download(self, url, path):
+        """將圖片放到 path；返回 downloaded / skipped / failed"""
+        digest = self.store.lookup(url)
+        if digest:
+            # 已知的 URL 直接連結，不需下載
+            await self._place(digest, path)
+            self.stats['skipped'] += 1
+            return 'skipped'
+
+        # 多個產品共用同一張圖片時，同一 URL 只下載一次
+        task = self._inflight.get(url)
+        owner = task is None
+        if owner:
+            task = asyncio.ensure_future(self._download_with_retry(url))
+            self._inflight[url] = task
+            task.add_done_callback(lambda _: self._inflight.pop(url, None))
+        digest = await task
+        if digest is None:
+            self.stats['failed'] += 1
+            return 'failed'
+        await self._place(digest, path)
+        result = 'downloaded' if owner else 'skipped'
+        self.stats[result] += 1
+        return result
+
+    async def download_many(self, items):
+        """並行下載多張圖片；items 為 (url, path) 列表
+
+        單張圖片的例外 (例如磁碟錯誤) 記為 failed，不會中斷同一產品的其他圖片。
+        """
+        results = await asyncio.gather(*[self.download(url, path) for url, path in items], return_exceptions=True)
+        for (url, _), result in zip(items, results):
+            if isinstance(result, BaseException):
+                logging.warning(f"處理圖片 {url} 時發生錯誤: {result}")
+                self.stats['failed'] += 1
+        return ['failed' if isinstance(result, BaseException) else result for result in results]
+
+    def save_index(self):
+        self.store.save_index()
+
+    def summary(self):
+        return (f"圖片下載：完成 {self.stats['downloaded']} 張 ({self.stats['bytes'] / 1024 / 1024:.1f} MB)、"
+                f"已知 URL 略過 {self.stats['skipped']} 張、內容重複 {self.store.stats['deduplicated']} 張、"
+                f"失敗 {self.stats['failed']} 張、轉檔失敗 {self.stats['process_failed']} 張。")
@@ -0,0 +1,80 @@
+"""
+描述:
+    圖片後處理：把下載的原始圖片 (常見為 WebP/PNG) 轉成真正的 JPEG，限制解析度、移除 metadata，
+    並產生符合露天上傳限制 (最長邊 800px、單張 2MB 以內) 的上傳版本。
+    編碼屬 CPU 密集工作，ImageProcessor 透過 ProcessPoolExecutor 執行，不會阻塞爬蟲的 event loop。
+"""
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image, ImageOps
+
+# 各版本的最長邊與 JPEG 品質
+VARIANTS = {
+    'jpeg': {'max_side': 1600, 'quality': 85},
+    'upload': {'max_side': 800, 'quality': 82},
+}
+UPLOAD_MAX_BYTES = 2 * 1024 * 1024 # 露天單張圖片上限
+
+
+def _to_rgb(image):
+    """透明背景以白色填滿後轉為 RGB"""
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def _save_jpeg(image, dst_path, quality, max_bytes=None):
+    """寫成不含 EXIF 等 metadata 的 JPEG；超過 max_bytes 時逐步降低品質"""
+    os.makedirs(os.path.dirname(dst_path), exist_ok=True)
+    tmp_path = f"{dst_path}.tmp"
+    while True:
+        image.save(tmp_path, 'JPEG', quality=quality, optimize=True, progressive=True)
+        if max_bytes is None or os.path.getsize(tmp_path) <= max_bytes or quality <= 50:
+            break
+        quality -= 10
+    os.replace(tmp_path, dst_path)
+
+
+def normalize_image(src_path, outputs):
+    """在子行程中執行：outputs 為 {版本名稱: 目標路徑}，返回實際產生的版本"""
+    with Image.open(src_path) as source:
+        # 先套用 EXIF 方向，之後存檔時 metadata 會被捨棄
+        image = _to_rgb(ImageOps.exif_transpose(source))
+    for variant, dst_path in outputs.items():
+        settings = VARIANTS[variant]
+        resized = image.copy()
+        resized.thumbnail((settings['max_side'], settings['max_side']), Image.LANCZOS)
+        max_bytes = UPLOAD_MAX_BYTES if variant == 'upload' else None
+        _save_jpeg(resized, dst_path, settings['quality'], max_bytes)
+    return list(outputs)
+
+
+class ImageProcessor:
+    """以行程池產生 ImageStore 物件的 JPEG 版本；同一物件只處理一次"""
+
+    def __init__(self, store, max_workers=None):
+        self.store = store
+        self._pool = ProcessPoolExecutor(max_workers=max_workers)
+        self._inflight = {} # digest -> 處理中的 future
+
+    async def process(self, digest):
+        """確保 digest 的所有版本都已產生；返回 {版本名稱: 路徑}"""
+        outputs = {variant: self.store.variant_path(digest, variant) for variant in VARIANTS}
+        missing = {variant: path for variant, path in outputs.items() if not os.path.exists(path)}
+        if missing:
+            future = self._inflight.get(digest)
+            if future is None:
+                loop = asyncio.get_running_loop()
+                future = loop.run_in_executor(self._pool, normalize_image, self.store.object_path(digest), missing)
+                self._inflight[digest] = future
+                future.add_done_callback(lambda _: self._inflight.pop(digest, None))
+            await future
+        return outputs
+
+    def close(self):
+        self._pool.shutdown(wait=True)
@@ -0,0 +1,116 @@
+"""
+描述:
+    以內容雜湊 (SHA-256) 儲存圖片的 content-addressed store。
+    每張圖片只在 objects/<前兩碼>/<雜湊> 存一份 (衍生的 JPEG 版本在 variants/<版本>/ 下)，
+    產品目錄下的 <product_id>_<n>.jpg 以 hardlink 指向它 (檔案系統不支援時改為複製)，
+    因此 CSV 匯出與露天上傳看到的檔名不變。露天上傳版本放在 upload/<product_id>/ 下，
+    不在 products/ 之內，src/utils/rename.py 不會改到這些檔名。
+    index.json 記錄 URL -> 雜湊，已知的 URL 不需要再下載。
+"""
+import hashlib
+import json
+import os
+import shutil
+from collections import Counter
+
+DEFAULT_STORE_DIR = os.getenv('IMAGE_STORE_DIR', 'image_store')
+
+
+def upload_path(product_id, file_name, root=DEFAULT_STORE_DIR):
+    """產品圖片 file_name 的露天上傳版本路徑 (<root>/upload/<product_id>/<file_name>)"""
+    return os.path.join(root, 'upload', product_id, file_name)
+
+
+def file_sha256(path, chunk_size=64 * 1024):
+    """計算檔案的 SHA-256"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ImageStore:
+    """content-addressed 圖片儲存區"""
+
+    def __init__(self, root=DEFAULT_STORE_DIR):
+        self.root = root
+        self.objects_dir = os.path.join(root, 'objects')
+        self.tmp_dir = os.path.join(root, 'tmp')
+        self.index_path = os.path.join(root, 'index.json')
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        self._urls = self._load_index()
+        self.stats = Counter()
+
+    def _load_index(self):
+        try:
+            with open(self.index_path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save_index(self):
+        """原子地寫回 URL 索引"""
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._urls, f, ensure_ascii=False)
+        os.replace(tmp_path, self.index_path)
+
+    def object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest)
+
+    def variant_path(self, digest, variant):
+        """衍生版本 (例如正規化後的 JPEG) 的路徑，見 src/utils/image_process.py"""
+        return os.path.join(self.root, 'variants', variant, digest[:2], f"{digest}.jpg")
+
+    def upload_path(self, product_id, file_name):
+        return upload_path(product_id, file_name, self.root)
+
+    def temp_path(self, url):
+        """下載中暫存檔的路徑；同一 URL 固定對應同一檔案以便續傳"""
+        return os.path.join(self.tmp_dir, hashlib.sha1(url.encode('utf-8')).hexdigest() + '.part')
+
+    def entry(self, url):
+        return self._urls.get(url, {})
+
+    def set_partial(self, url, etag):
+        """記錄下載中的 ETag，供中斷後續傳時使用"""
+        self._urls[url] = {'hash': None, 'etag': etag}
+
+    def lookup(self, url):
+        """URL 已下載且物件仍存在時返回其雜湊，否則返回 None"""
+        digest = self._urls.get(url, {}).get('hash')
+        if digest and os.path.exists(self.object_path(digest)):
+            return digest
+        return None
+
+    def add(self, src_path, url, digest, etag=None):
+        """將下載完成的暫存檔放入 store；內容已存在時丟棄暫存檔"""
+        object_path = self.object_path(digest)
+        if os.path.exists(object_path):
+            os.remove(src_path)
+            self.stats['deduplicated'] += 1
+        else:
+            os.makedirs(os.path.dirname(object_path), exist_ok=True)
+            os.replace(src_path, object_path)
+            self.stats['stored'] += 1
+        self._urls[url] = {'hash': digest, 'etag': etag, 'size': os.path.getsize(object_path)}
+        return digest
+
+    def link(self, digest, dest_path, variant=None):
+        """讓 dest_path 指向雜湊為 digest 的物件；指定 variant 時指向該衍生版本"""
+        object_path = self.object_path(digest) if variant is None else self.variant_path(digest, variant)
+        if os.path.exists(dest_path) and os.path.samefile(object_path, dest_path):
+            return
+        os.makedirs(os.path.dirname(dest_path) or '.', exist_ok=True)
+        tmp_path = f"{dest_path}.link"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        try:
+            os.link(object_path, tmp_path)
+        except OSError:
+            # 跨檔案系統或不支援 hardlink 時改為複製
+            shutil.copyfile(object_path, tmp_path)
+            self.stats['copied'] += 1
+        os.replace(tmp_path, dest_path)
@@ -0,0 +1,119 @@
+"""
+描述:
+    上架排除規則。README 列出不上架的規格 (無需拼裝一體式、無需拼裝、透明無噴繪、預購、解放玩具)，
+    規則改由 JSON 設定檔定義：contains 規則轉成 SQL 的 NOT LIKE 條件，在資料庫端就排除，
+    無法轉成 SQL 的 pattern (正則表達式) 規則則在讀取後以預先編譯的 matcher 排除。
+    excluded_counts() 以一次查詢統計每條規則排除的筆數。
+
+    設定檔格式 (LISTING_FILTER_RULES 環境變數或 --filter-rules 指定路徑):
+    [
+        {"name": "預購", "fields": ["name", "option"], "contains": "預購"},
+        {"name": "限定色", "fields": ["option"], "pattern": "限定.?色"}
+    ]
+"""
+import json
+import os
+import re
+from collections import Counter
+
+DEFAULT_RULES_PATH = os.getenv('LISTING_FILTER_RULES', 'listing_filter.json')
+
+# 可用於規則的欄位 -> SQL 欄位名稱
+FIELDS = {
+    'name': 'name',
+    'option': '`option`',
+    'summary': 'summary',
+    'detail': 'detail',
+}
+
+DEFAULT_RULES = [
+    {'name': '無需拼裝一體式', 'fields': ['option'], 'contains': '無需拼裝一體式'},
+    {'name': '無需拼裝', 'fields': ['option'], 'contains': '無需拼裝'},
+    {'name': '透明無噴繪', 'fields': ['option'], 'contains': '透明無噴繪'},
+    {'name': '預購', 'fields': ['name', 'option'], 'contains': '預購'},
+    {'name': '解放玩具', 'fields': ['name', 'option'], 'contains': '解放玩具'},
+]
+
+
+def _like_pattern(text):
+    # 跳脫 LIKE 的萬用字元
+    escaped = text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f"%{escaped}%"
+
+
+def load_rules(path=DEFAULT_RULES_PATH):
+    """讀取規則設定檔；檔案不存在時使用 DEFAULT_RULES"""
+    if path and os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    return DEFAULT_RULES
+
+
+class ListingFilter:
+    """排除不上架的產品規格"""
+
+    def __init__(self, rules=None):
+        self.rules = list(DEFAULT_RULES if rules is None else rules)
+        self._sql_rules = []
+        self._matchers = []
+        for rule in self.rules:
+            fields = rule.get('fields') or ['option']
+            unknown = [field for field in fields if field not in FIELDS]
+            if unknown:
+                raise ValueError(f"規則 {rule.get('name')} 使用了不支援的欄位: {unknown}")
+            if rule.get('contains'):
+                self._sql_rules.append((rule['name'], fields, rule['contains']))
+            elif rule.get('pattern'):
+                self._matchers.append((rule['name'], fields, re.compile(rule['pattern'])))
+            else:
+                raise ValueError(f"規則 {rule.get('name')} 需要 contains 或 pattern")
+        self.stats = Counter() # 由 matcher 排除的筆數 (規則名稱 -> 筆數)
+
+    @classmethod
+    def from_file(cls, path=DEFAULT_RULES_PATH):
+        return cls(load_rules(path))
+
+    def _condition(self, fields, text):
+        condition = ' OR '.join(f"{FIELDS[field]} LIKE %s" for field in fields)
+        return f"({condition})", [_like_pattern(text)] * len(fields)
+
+    def sql_where(self):
+        """返回 (條件, 參數)，可直接接在 WHERE 或 AND 之後；沒有 SQL 規則時返回 ('', [])"""
+        conditions = []
+        params = []
+        for _, fields, text in self._sql_rules:
+            condition, condition_params = self._condition(fields, text)
+            conditions.append(f"NOT {condition}")
+            params.extend(condition_params)
+        return ' AND '.join(conditions), params
+
+    def keep(self, row):
+        """以 pattern 規則檢查一筆資料 (dict)；被排除時記錄規則名稱並返回 False"""
+        for name, fields, matcher in self._matchers:
+            if any(matcher.search(str(row.get(field) or '')) for field in fields):
+                self.stats[name] += 1
+                return False
+        return True
+
+    def excluded_counts(self, mydb, table='aowotoy_products'):
+        """以一次查詢統計每條 SQL 規則命中的筆數 (一筆可能同時命中多條規則)；返回 (總筆數, {規則名稱: 筆數})"""
+        columns = ['COUNT(*)']
+        params = []
+        for _, fields, text in self._sql_rules:
+            condition, condition_params = self._condition(fields, text)
+            columns.append(f"COALESCE(SUM({condition}), 0)")
+            params.extend(condition_params)
+        cursor = mydb.cursor()
+        try:
+            cursor.execute(f"SELECT {', '.join(columns)} FROM {table}", tuple(params))
+            row = cursor.fetchall()[0]
+        finally:
+            cursor.close()
+        return int(row[0]), {name: int(count) for (name, _, _), count in zip(self._sql_rules, row[1:])}
+
+    def report(self, total, sql_counts):
+        """返回每條規則排除筆數的說明文字"""
+        counts = dict(sql_counts)
+        counts.update(self.stats)
+        details = '、'.join(f"{rule['name']} {counts.get(rule['name'], 0)}" for rule in self.rules)
+        return f"上架排除規則 (共 {total} 筆規格)：{details}。"
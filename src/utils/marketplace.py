@@ -0,0 +1,170 @@
+"""
+描述:
+    各拍賣平台的 CSV 匯出格式。每個 MarketplaceWriter 定義自己的欄位、輸出檔名與轉換規則，
+    export_aowotoy.export_marketplaces() 只掃描一次 aowotoy_products，將每一筆資料同時交給多個 writer。
+    新增平台時繼承 MarketplaceWriter，實作 columns 與 transform()，再登記到 MARKETPLACES。
+"""
+import csv
+
+from src.utils.rewrite import Rewriter
+
+WRITE_BUFFER_SIZE = 1024 * 1024 # CSV 寫入緩衝區大小
+PRICE_MARKUP = 1.6 # 售價 = 進價 × PRICE_MARKUP
+
+# 名稱取代；匯出時與 proper_nouns 的翻譯詞合併成一個 Rewriter，同一原詞以這裡為準
+NAME_REPLACEMENTS = (
+    ('高達', '鋼彈'),
+    ('AOWOBOX', '阿庫力'),
+)
+DEFAULT_REWRITER = Rewriter(NAME_REPLACEMENTS)
+
+
+def replace_name(name, rewriter=None):
+    """取代產品名稱中的詞語；未指定 rewriter 時只套用 NAME_REPLACEMENTS"""
+    return (DEFAULT_REWRITER if rewriter is None else rewriter).rewrite(name)
+
+
+def round_price(price, markup=PRICE_MARKUP):
+    """加價後向下取整到 10 的倍數"""
+    calculated_price = round(float(price) * markup)
+    return calculated_price - (calculated_price % 10)
+
+
+def product_description(name, option):
+    return f'專為 {name} 設計的壓克力公仔模型展示盒，附有噴繪背景與底板設計。\n\n商品材質：壓克力\n\n商品規格：{option}\n\n如有其他商品疑問，例如燈款、電源等，歡迎小窗詢問。'
+
+
+class MarketplaceWriter:
+    """單一平台的 CSV writer；product 為含 product_id、option_id、name、price、option 的 dict
+
+    rewriter (Rewriter) 用於取代名稱與說明中的詞語，未指定時只套用 NAME_REPLACEMENTS。
+    """
+
+    name = ''
+    columns = []
+    default_filename = ''
+
+    def __init__(self, output_filename=None, rewriter=None):
+        self.output_filename = output_filename or self.default_filename
+        self.rewriter = DEFAULT_REWRITER if rewriter is None else rewriter
+        self.rows = 0
+        self._file = None
+        self._writer = None
+
+    def transform(self, product):
+        """將一筆產品資料轉為 CSV 的一列；返回 None 表示此平台不匯出該筆"""
+        raise NotImplementedError
+
+    def name_and_description(self, product):
+        """返回取代後的產品名稱與物品說明"""
+        name = self.rewriter.rewrite(product['name'])
+        return name, product_description(name, self.rewriter.rewrite(product['option']))
+
+    def open(self):
+        self._file = open(self.output_filename, 'w', newline='', encoding='utf-8-sig', buffering=WRITE_BUFFER_SIZE)
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(self.columns)
+
+    def write(self, products):
+        """轉換並寫入一批產品資料"""
+        transformed_rows = [row for row in map(self.transform, products) if row is not None]
+        self._writer.writerows(transformed_rows)
+        self.rows += len(transformed_rows)
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+
+class RutenWriter(MarketplaceWriter):
+    """露天拍賣大量上架格式"""
+
+    name = 'ruten'
+    default_filename = 'ruten_auction_new.csv'
+    columns = ['類別(必填)', '物品名稱(必填)', 'OPTION', '商品價格(必填)', '數量(必填)', '自訂賣場分類', '物品說明', '物品新舊', '圖片1', '圖片2', '圖片3', '物品所在地', '評價總分需大於', '差勁評價需小於', '棄單不可超過次數', '手工製品', '附禮盒/提袋', '原廠保固', '賣家保固', '到府安裝', 'DIY安裝', '專櫃正品', '公司貨', '平行輸入', '可開發票', '可開收據', '附保證書', '附鑑定書', '有多種尺寸', '有多種顏色', '海外運送', '賣家自用料號', '備貨狀態', '預計出貨年月(若備貨狀態為2，則必填)', '較長備商品出貨天數(若備貨狀態為6，則必填)']
+
+    def transform(self, product):
+        product_id = product['product_id']
+        name, description = self.name_and_description(product)
+        option = product['option']
+        transformed_row = [
+            '50008',
+            name,
+            option,
+            str(round_price(product['price'])),
+            '10',
+            '6438417',
+            description,
+            '',
+            f'{product_id}_1.jpg',
+            f'{product_id}_2.jpg'
+        ]
+        # Add 26 empty strings
+        transformed_row.extend([''] * 26)
+        return transformed_row
+
+
+class ShopeeWriter(MarketplaceWriter):
+    """蝦皮大量上架格式 (一個規格一列，以主商品貨號串起同一產品的規格)
+
+    category 為必填的蝦皮分類 ID (依賣家後台的大量上架範本)，未指定時拋出 ValueError，不輸出分類空白的檔案。
+    欄位尚未與實際的蝦皮大量上架範本核對，上傳前請先以範本確認欄位順序。
+    """
+
+    name = 'shopee'
+    default_filename = 'shopee_mass_upload.csv'
+    columns = ['分類', '商品名稱', '商品描述', '主商品貨號', '規格名稱1', '選項名稱1', '價格', '庫存', '商品選項貨號', '主商品圖片', '商品圖片1', '重量', '出貨天數']
+
+    def __init__(self, output_filename=None, rewriter=None, category=None):
+        super().__init__(output_filename, rewriter)
+        self.category = str(category or '').strip()
+        if not self.category:
+            raise ValueError("蝦皮的分類為必填欄位，請以 --shopee-category 或環境變數 SHOPEE_CATEGORY_ID 指定分類 ID。")
+
+    def transform(self, product):
+        product_id = product['product_id']
+        name, description = self.name_and_description(product)
+        option = product['option']
+        return [
+            self.category,
+            name,
+            description,
+            product_id,
+            '規格',
+            option,
+            str(round_price(product['price'])),
+            '10',
+            product['option_id'],
+            f'{product_id}_1.jpg',
+            f'{product_id}_2.jpg',
+            '1',
+            '3',
+        ]
+
+
+class JollyWriter(MarketplaceWriter):
+    """Jolly 商品匯入格式 (欄位尚未與實際的 Jolly 匯入範本核對)"""
+
+    name = 'jolly'
+    default_filename = 'jolly_products.csv'
+    columns = ['商品編號', '商品名稱', '規格', '售價', '數量', '商品說明', '圖片1', '圖片2']
+
+    def transform(self, product):
+        product_id = product['product_id']
+        name, description = self.name_and_description(product)
+        option = product['option']
+        return [
+            product['option_id'],
+            name,
+            option,
+            str(round_price(product['price'])),
+            '10',
+            description,
+            f'{product_id}_1.jpg',
+            f'{product_id}_2.jpg',
+        ]
+
+
+# 平台名稱 -> writer 類別
+MARKETPLACES = {writer.name: writer for writer in (RutenWriter, ShopeeWriter, JollyWriter)}
@@ -0,0 +1,213 @@
+"""
+描述:
+    爬蟲與匯出流程的量測。以 stage (例如 list_page、product_http、json_parse、image_download、db_write)
+    為單位記錄延遲分佈 (固定 bucket 的 histogram)、次數、錯誤數與位元組數，另有不分 stage 的計數器 (例如完成的產品數)。
+    summary() 輸出各 stage 的平均 / p50 / p95 延遲、錯誤率與每秒處理量，用來判斷瓶頸在頁面載入、解析、資料庫或圖片；
+    write() 依副檔名輸出 JSON 或 Prometheus 文字格式 (.prom)，可交給 node_exporter 的 textfile collector 讀取。
+    計數在多個執行緒之間共用 (資料庫寫入執行緒)，以 lock 保護。
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+# 延遲 histogram 的 bucket 上限 (秒)，涵蓋 JSON 解析 (毫秒) 到瀏覽器渲染 (數十秒)
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+DEFAULT_REPORT_INTERVAL = 30 # 定期輸出摘要的間隔 (秒)
+PROMETHEUS_PREFIX = 'toybox'
+
+
+class Histogram:
+    """固定 bucket 的延遲分佈；counts[i] 為落在 (buckets[i-1], buckets[i]] 的次數，最後一格為超過上限的次數"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """以 bucket 上限估計分位數；落在最後一格時返回觀察到的最大值"""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            if cumulative >= target:
+                return min(bound, self.max)
+        return self.max
+
+    def cumulative(self):
+        """返回 [(上限, 累計次數)]，最後一筆上限為 '+Inf'"""
+        result = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            cumulative += count
+            result.append((bound, cumulative))
+        return result
+
+
+class Metrics:
+    """stage 延遲、錯誤、位元組與計數器的集合"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.histograms = {} # stage -> Histogram
+        self.errors = Counter() # stage -> 錯誤次數
+        self.bytes = Counter() # stage -> 位元組數
+        self.counters = Counter() # 名稱 -> 次數
+        self._start = time.monotonic()
+        self._lock = threading.Lock()
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, stage):
+        """記錄 with 區塊的耗時；區塊拋出例外時同時記錄一次錯誤 (例外照常拋出)，可用在包含 await 的區塊"""
+        start = time.monotonic()
+        try:
+            yield
+        except BaseException:
+            self.error(stage)
+            raise
+        finally:
+            self.observe(stage, time.monotonic() - start)
+
+    def error(self, stage, count=1):
+        """記錄沒有拋出例外的失敗 (例如 HTTP 狀態碼錯誤、找不到產品 JSON)"""
+        with self._lock:
+            self.errors[stage] += count
+
+    def add_bytes(self, stage, count):
+        with self._lock:
+            self.bytes[stage] += count
+
+    def inc(self, name, count=1):
+        with self._lock:
+            self.counters[name] += count
+
+    def uptime(self):
+        return time.monotonic() - self._start
+
+    def snapshot(self):
+        """返回可序列化為 JSON 的目前數值"""
+        with self._lock:
+            uptime = self.uptime()
+            stages = {}
+            for stage in sorted(set(self.histograms) | set(self.errors) | set(self.bytes)):
+                histogram = self.histograms.get(stage) or Histogram(self.buckets)
+                stages[stage] = {
+                    'count': histogram.count,
+                    'errors': self.errors[stage],
+                    'bytes': self.bytes[stage],
+                    'seconds_sum': round(histogram.sum, 6),
+                    'seconds_avg': round(histogram.sum / histogram.count, 6) if histogram.count else 0.0,
+                    'seconds_p50': histogram.quantile(0.5),
+                    'seconds_p95': histogram.quantile(0.95),
+                    'seconds_max': round(histogram.max, 6),
+                    'buckets': [[str(bound), count] for bound, count in histogram.cumulative()],
+                }
+            return {
+                'uptime_seconds': round(uptime, 3),
+                'stages': stages,
+                'counters': dict(self.counters),
+            }
+
+    def summary(self):
+        """各 stage 的耗時與錯誤率，以及計數器的每秒處理量 (多行文字)"""
+        snapshot = self.snapshot()
+        uptime = snapshot['uptime_seconds']
+        lines = [f"執行 {uptime:.0f} 秒的量測摘要："]
+        # 依總耗時排序，最可能是瓶頸的 stage 排在前面
+        stages = sorted(snapshot['stages'].items(), key=lambda item: item[1]['seconds_sum'], reverse=True)
+        for stage, values in stages:
+            calls = values['count']
+            line = (f"  {stage}: {calls} 次，共 {values['seconds_sum']:.1f} 秒，平均 {values['seconds_avg']:.3f} 秒，"
+                    f"p50 {values['seconds_p50']:.3f} 秒，p95 {values['seconds_p95']:.3f} 秒")
+            if values['errors']:
+                line += f"，錯誤 {values['errors']} 次 ({values['errors'] / calls:.1%})" if calls else f"，錯誤 {values['errors']} 次"
+            if values['bytes']:
+                line += f"，{values['bytes'] / 1024 / 1024:.1f} MB"
+            lines.append(line)
+        for name, value in sorted(snapshot['counters'].items()):
+            lines.append(f"  {name}: {value} ({value / uptime if uptime > 0 else 0:.2f}/秒)")
+        return "\n".join(lines)
+
+    def to_prometheus(self, prefix=PROMETHEUS_PREFIX):
+        """Prometheus 文字格式 (text exposition format 0.0.4)"""
+        snapshot = self.snapshot()
+        lines = [
+            f"# TYPE {prefix}_uptime_seconds gauge",
+            f"{prefix}_uptime_seconds {snapshot['uptime_seconds']}",
+            f"# TYPE {prefix}_stage_seconds histogram",
+        ]
+        for stage, values in snapshot['stages'].items():
+            for bound, count in values['buckets']:
+                lines.append(f'{prefix}_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {count}')
+            lines.append(f'{prefix}_stage_seconds_sum{{stage="{stage}"}} {values["seconds_sum"]}')
+            lines.append(f'{prefix}_stage_seconds_count{{stage="{stage}"}} {values["count"]}')
+        for metric, key in (('stage_errors_total', 'errors'), ('stage_bytes_total', 'bytes')):
+            lines.append(f"# TYPE {prefix}_{metric} counter")
+            for stage, values in snapshot['stages'].items():
+                lines.append(f'{prefix}_{metric}{{stage="{stage}"}} {values[key]}')
+        lines.append(f"# TYPE {prefix}_events_total counter")
+        for name, value in sorted(snapshot['counters'].items()):
+            lines.append(f'{prefix}_events_total{{name="{name}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """寫入量測檔案；副檔名為 .prom 時使用 Prometheus 文字格式，其他為 JSON。先寫暫存檔再取代，讀取端不會讀到一半的內容"""
+        if path.endswith('.prom'):
+            content = self.to_prometheus()
+        else:
+            content = json.dumps(self.snapshot(), ensure_ascii=False, indent=2)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        os.replace(temp_path, path)
+
+    def reset(self):
+        with self._lock:
+            self.histograms.clear()
+            self.errors.clear()
+            self.bytes.clear()
+            self.counters.clear()
+            self._start = time.monotonic()
+
+
+async def report_periodically(registry, interval=DEFAULT_REPORT_INTERVAL, path=None):
+    """每 interval 秒以 logging 輸出摘要，並在指定 path 時更新量測檔案；以 task.cancel() 結束"""
+    while True:
+        await asyncio.sleep(interval)
+        logging.info(registry.summary())
+        if path:
+            try:
+                registry.write(path)
+            except OSError as e:
+                logging.warning(f"寫入量測檔案 {path} 失敗: {e}")
+
+
+# 爬蟲、圖片下載、資料庫寫入與匯出共用的量測
+metrics = Metrics()
@@ -0,0 +1,270 @@
+"""
+描述:
+    aowotoy_products 的批次寫入器。爬蟲將每個產品的規格資料交給 ProductWriter 暫存，
+    累積到 batch_size 筆後以 executemany 執行 INSERT ... ON DUPLICATE KEY UPDATE 並只 commit 一次。
+    以 option_id (UNIQUE) 判斷新增、更新或內容未變；未變的資料不會送出寫入。
+    產品的規格被移除後，該產品在資料庫中不屬於這次寫入的規格資料會在同一個交易中刪除，
+    同一產品的所有資料列都保有最新的指紋 (見 fingerprint.FingerprintIndex.load)。
+    AsyncProductWriter 讓 asyncio 爬蟲透過有界佇列把資料交給專用執行緒寫入，不阻塞 event loop。
+"""
+import asyncio
+import logging
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal, ROUND_HALF_UP
+import mysql.connector
+
+from src.utils.metrics import metrics
+
+COLUMNS = ('product_id', 'option_id', 'url', 'name', 'summary', 'price', 'option', 'detail', 'fingerprint')
+
+UPSERT_SQL = (
+    "INSERT INTO aowotoy_products (product_id, option_id, url, name, summary, price, `option`, detail, fingerprint) "
+    "VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s) "
+    "ON DUPLICATE KEY UPDATE product_id = VALUES(product_id), url = VALUES(url), name = VALUES(name), "
+    "summary = VALUES(summary), price = VALUES(price), `option` = VALUES(`option`), detail = VALUES(detail), "
+    "fingerprint = VALUES(fingerprint)"
+)
+
+
+def normalize_price(price):
+    """price 欄位為 INT，MySQL 寫入時會四捨五入；先轉成相同的整數，與資料庫中的值比對時才會相等"""
+    return int(Decimal(str(price or 0)).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def _notify(callbacks, ok):
+    """呼叫各產品的 on_commit；通知本身的錯誤不影響寫入"""
+    for callback in callbacks:
+        try:
+            callback(ok)
+        except Exception as e:
+            logging.error(f"通知寫入結果時發生錯誤: {e}")
+
+
+class ProductWriter:
+    """暫存產品規格資料並批次寫入 aowotoy_products"""
+
+    def __init__(self, mydb, batch_size=200):
+        self.mydb = mydb
+        self.batch_size = max(1, batch_size)
+        self._buffer = {} # option_id -> row tuple，同一批次內重複的 option_id 以最後一筆為準
+        self._options = {} # product_id -> 本批次寫入的 option_id
+        self._callbacks = [] # 本批次各產品的 on_commit
+        self.stats = Counter()
+
+    def add_product(self, rows, on_commit=None):
+        """加入一個產品的所有規格資料 (dict，鍵為 COLUMNS)；同一產品不會被拆到兩個批次
+
+        on_commit(ok) 在包含這些資料的批次 commit 後 (ok 為 True) 或寫入失敗時 (False) 呼叫一次，
+        呼叫端可據此判斷資料是否真的已寫入資料庫。
+        """
+        try:
+            values = [tuple(normalize_price(row.get(column)) if column == 'price' else row.get(column, '') for column in COLUMNS)
+                      for row in rows]
+        except Exception:
+            _notify([on_commit] if on_commit else [], False)
+            raise
+        for row in values:
+            self._buffer[row[1]] = row
+            self._options.setdefault(row[0], set()).add(row[1])
+        if on_commit is not None:
+            self._callbacks.append(on_commit)
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
+
+    def _existing_rows(self, cursor, option_ids):
+        placeholders = ', '.join(['%s'] * len(option_ids))
+        sql = (
+            "SELECT product_id, option_id, url, name, summary, price, `option`, detail, fingerprint "
+            f"FROM aowotoy_products WHERE option_id IN ({placeholders})"
+        )
+        cursor.execute(sql, tuple(option_ids))
+        return {row[1]: tuple(row) for row in cursor.fetchall()}
+
+    def _stale_options(self, cursor, options):
+        """返回資料庫中屬於這些產品、但不在這次寫入中的 option_id (已移除的規格)"""
+        product_ids = list(options)
+        cursor.execute(
+            f"SELECT product_id, option_id FROM aowotoy_products WHERE product_id IN ({', '.join(['%s'] * len(product_ids))})",
+            tuple(product_ids),
+        )
+        return [option_id for product_id, option_id in cursor.fetchall() if option_id not in options[product_id]]
+
+    def _rollback(self):
+        try:
+            if self.mydb.is_connected():
+                self.mydb.rollback() # 發生錯誤時回滾事務
+        except mysql.connector.Error as err:
+            logging.error(f"回滾事務時發生錯誤: {err}")
+
+    def flush(self):
+        """寫入暫存的資料並 commit；返回本批次的新增/更新/未變筆數
+
+        結束後以批次結果通知本批次的 on_commit；mysql.connector 以外的例外在通知失敗後照常拋出。
+        """
+        if not self._buffer and not self._callbacks:
+            return Counter()
+        batch, options, callbacks = self._buffer, self._options, self._callbacks
+        self._buffer, self._options, self._callbacks = {}, {}, []
+        result = Counter()
+        cursor = None
+        committed = False
+        start = time.monotonic()
+        try:
+            if batch:
+                cursor = self.mydb.cursor()
+                existing = self._existing_rows(cursor, list(batch))
+                pending = []
+                for option_id, values in batch.items():
+                    current = existing.get(option_id)
+                    if current is None:
+                        result['inserted'] += 1
+                        pending.append(values)
+                    elif current != values:
+                        result['updated'] += 1
+                        pending.append(values)
+                    else:
+                        result['unchanged'] += 1
+                stale = self._stale_options(cursor, options)
+                if pending:
+                    cursor.executemany(UPSERT_SQL, pending)
+                if stale:
+                    cursor.execute(f"DELETE FROM aowotoy_products WHERE option_id IN ({', '.join(['%s'] * len(stale))})",
+                                   tuple(stale))
+                    result['deleted'] += len(stale)
+                if pending or stale:
+                    self.mydb.commit()
+                logging.debug(f"批次寫入 {len(batch)} 筆：新增 {result['inserted']}、更新 {result['updated']}、"
+                              f"未變 {result['unchanged']}，刪除已移除的規格 {result['deleted']} 筆。")
+            committed = True
+        except mysql.connector.Error as err:
+            logging.error(f"批次寫入資料庫時發生錯誤: {err}")
+            self._rollback()
+            result = Counter(failed=len(batch))
+        except Exception:
+            self._rollback()
+            result = Counter(failed=len(batch))
+            raise
+        finally:
+            if cursor:
+                cursor.close()
+            metrics.observe('db_write', time.monotonic() - start)
+            if not committed:
+                metrics.error('db_write')
+            self.stats.update(result)
+            for key, count in result.items():
+                metrics.inc(f"db_rows_{key}", count)
+            _notify(callbacks, committed)
+        return result
+
+    def close(self):
+        """寫入剩餘的資料並返回累計統計"""
+        self.flush()
+        return self.stats
+
+
+class AsyncProductWriter:
+    """ProductWriter 的 asyncio 包裝：產品資料放入有界佇列，由單一執行緒依序寫入
+
+    資料庫寫入較慢、佇列已滿時 add_product 會等待，讓爬蟲自然放慢 (backpressure)。
+    連線只在寫入執行緒中使用，mysql.connector 的阻塞呼叫不會卡住 event loop。
+    放入佇列不代表已寫入：需要確認的呼叫端傳入 on_commit，批次 commit 或失敗後在 event loop 中呼叫。
+    """
+
+    def __init__(self, writer, max_pending=50):
+        self.writer = writer
+        self._queue = asyncio.Queue(maxsize=max(1, max_pending)) # 以產品為單位
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='db-writer')
+        self._task = None
+        self.error = None # 寫入執行緒第一個未預期的例外，close() 時拋出
+        self.stats = Counter() # queued / backpressure_waits / backpressure_seconds / errors
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._drain())
+        return self
+
+    def _write(self, products, flush=False):
+        """在寫入執行緒中執行；products 為 (rows, on_commit) 列表，flush 為 True 時最後 commit 目前的批次"""
+        try:
+            for index, (rows, on_commit) in enumerate(products):
+                try:
+                    self.writer.add_product(rows, on_commit)
+                except Exception:
+                    # 之後的產品沒有交給 ProductWriter，直接通知寫入失敗
+                    _notify([callback for _, callback in products[index + 1:] if callback], False)
+                    raise
+        finally:
+            if flush:
+                self.writer.flush()
+
+    async def _drain(self):
+        """取出佇列中所有已到達的產品，一次交給寫入執行緒；取到 None 時結束"""
+        loop = asyncio.get_running_loop()
+        done = False
+        while not done:
+            items = [await self._queue.get()]
+            while not self._queue.empty():
+                items.append(self._queue.get_nowait())
+            done = None in items
+            products = [item for item in items if isinstance(item, tuple)]
+            waiters = [item for item in items if isinstance(item, asyncio.Future)] # flush() 放入的 future
+            try:
+                await loop.run_in_executor(self._executor, self._write, products, bool(waiters))
+            except Exception as e:
+                # 避免寫入執行緒的例外讓佇列塞滿、爬蟲永遠等待；受影響的產品已收到 on_commit(False)
+                logging.error(f"寫入資料庫時發生未預期錯誤: {e}")
+                self.stats['errors'] += 1
+                if self.error is None:
+                    self.error = e
+            for waiter in waiters:
+                if not waiter.done():
+                    waiter.set_result(None)
+
+    async def add_product(self, rows, on_commit=None):
+        """將一個產品的規格資料放入佇列；佇列已滿時等待寫入執行緒消化
+
+        on_commit(ok) 在資料所屬的批次 commit 或寫入失敗後，於目前的 event loop 中呼叫。
+        """
+        if self._task is None:
+            self.start()
+        callback = None
+        if on_commit is not None:
+            loop = asyncio.get_running_loop()
+            callback = lambda ok: loop.call_soon_threadsafe(on_commit, ok)
+        if self._queue.full():
+            start = time.monotonic()
+            await self._queue.put((rows, callback))
+            waited = time.monotonic() - start
+            self.stats['backpressure_waits'] += 1
+            self.stats['backpressure_seconds'] += waited
+            metrics.observe('db_queue_wait', waited)
+        else:
+            self._queue.put_nowait((rows, callback))
+        self.stats['queued'] += 1
+
+    async def flush(self):
+        """等待已放入佇列的產品都交給寫入執行緒，並 commit 目前未滿的批次"""
+        if self._task is None:
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        await self._queue.put(waiter)
+        await waiter
+
+    async def close(self):
+        """等待佇列清空、寫入剩餘批次並返回 ProductWriter 的累計統計
+
+        寫入執行緒曾發生未預期的例外時，寫完剩餘資料後拋出該例外。
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            if self._task is not None:
+                await self._queue.put(None)
+                await self._task
+            stats = await loop.run_in_executor(self._executor, self.writer.close)
+        finally:
+            self._executor.shutdown(wait=True)
+        if self.error is not None:
+            raise self.error
+        return stats
@@ -0,0 +1,90 @@
+"""
+描述:
+    以 token bucket 實作的速率限制器，用來取代爬蟲中固定的隨機延遲。
+    HostRateLimiter 依照 URL 的 host 各自維護一個 bucket，不同網域互不影響。
+    ThreadTokenBucket 是供多執行緒 (例如露天 API 上傳) 共用的版本。
+"""
+import asyncio
+import threading
+import time
+from urllib.parse import urlsplit
+
+
+class TokenBucket:
+    """每秒補充 rate 個 token，最多累積 burst 個；acquire 會等到有 token 可用"""
+
+    def __init__(self, rate, burst=1):
+        if rate <= 0:
+            raise ValueError("rate 必須大於 0")
+        self.rate = float(rate)
+        self.burst = max(1, int(burst))
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        """取得一個 token，必要時等待；返回實際等待的秒數"""
+        waited = 0.0
+        async with self._lock: # 排隊取得 token，避免多個 worker 同時搶到同一批 token
+            while True:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+                waited += delay
+                await asyncio.sleep(delay)
+
+
+class HostRateLimiter:
+    """依 host 分流的 token bucket 集合"""
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self._buckets = {}
+
+    def bucket_for(self, url):
+        host = urlsplit(url).netloc
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            bucket = TokenBucket(self.rate, self.burst)
+            self._buckets[host] = bucket
+        return bucket
+
+    async def acquire(self, url):
+        """在對 url 發出請求前呼叫，返回等待秒數"""
+        return await self.bucket_for(url).acquire()
+
+
+class ThreadTokenBucket:
+    """TokenBucket 的多執行緒版本；acquire 會阻塞呼叫的執行緒直到有 token 可用"""
+
+    def __init__(self, rate, burst=1):
+        if rate <= 0:
+            raise ValueError("rate 必須大於 0")
+        self.rate = float(rate)
+        self.burst = max(1, int(burst))
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """取得一個 token，必要時等待；返回實際等待的秒數"""
+        waited = 0.0
+        with self._lock: # 排隊取得 token，等待期間其他執行緒不會搶走
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+                waited += delay
+                time.sleep(delay)
@@ -0,0 +1,53 @@
+"""
+描述:
+    名稱與關鍵字取代引擎。把所有 (原詞, 取代詞) 編譯成單一個 alternation 正則表達式，
+    每段文字只需掃描一次，詞數增加到上千個也不會變成逐詞 replace。
+    同一位置可匹配多個詞時以最長的詞為準，取代後的文字不會再被其他規則取代。
+    RewriteCache 以 CHECKSUM TABLE 偵測 proper_nouns 是否變更，未變更時重複使用已編譯的 Rewriter。
+"""
+import logging
+import re
+
+from src.utils.table_cache import DEFAULT_CACHE_TTL, TableCache
+
+
+class Rewriter:
+    """一次掃描完成所有取代的 rewriter"""
+
+    def __init__(self, pairs=()):
+        self.mapping = {}
+        for old, new in pairs:
+            if old:
+                self.mapping[old] = new # 同一原詞重複時以後出現的為準
+        if self.mapping:
+            # 最長的詞排在前面，讓同一位置優先匹配較長的詞
+            terms = sorted(self.mapping, key=len, reverse=True)
+            self.pattern = re.compile('|'.join(re.escape(term) for term in terms))
+        else:
+            self.pattern = None
+
+    def __len__(self):
+        return len(self.mapping)
+
+    def rewrite(self, text):
+        if not text or self.pattern is None:
+            return text
+        return self.pattern.sub(lambda match: self.mapping[match.group(0)], text)
+
+
+class RewriteCache(TableCache):
+    """快取由資料表編譯出的 Rewriter，資料表變更時重新編譯
+
+    load_pairs(mydb) 返回 (原詞, 取代詞) 列表；checksum(mydb) 返回代表資料表內容的值。
+    extra_pairs 為程式內固定的規則，優先於資料表中的同一原詞。
+    """
+
+    def __init__(self, load_pairs, checksum, extra_pairs=(), ttl=DEFAULT_CACHE_TTL):
+        super().__init__(self._compile, checksum, ttl)
+        self.load_pairs = load_pairs
+        self.extra_pairs = tuple(extra_pairs)
+
+    def _compile(self, mydb):
+        rewriter = Rewriter(list(self.load_pairs(mydb)) + list(self.extra_pairs))
+        logging.debug(f"已編譯 {len(rewriter)} 條取代規則。")
+        return rewriter
@@ -0,0 +1,42 @@
+"""
+描述:
+    參考資料表 (proper_nouns、editors 等) 的程序內快取。build(mydb) 從資料表建立可直接使用的結構，
+    checksum(mydb) 返回代表資料表內容的值 (例如 CHECKSUM TABLE)；距離上次檢查超過 ttl 秒才查詢 checksum，
+    資料表未變更時重複使用已建立的結構，每篇文章或每筆資料的處理不需要查詢資料庫。
+"""
+import threading
+import time
+
+DEFAULT_CACHE_TTL = 300 # 兩次檢查資料表是否變更的最短間隔 (秒)
+
+
+class TableCache:
+    """以 TTL 與資料表 checksum 判斷是否過期的快取；可在多個執行緒之間共用"""
+
+    def __init__(self, build, checksum, ttl=DEFAULT_CACHE_TTL):
+        self.build = build
+        self.checksum = checksum
+        self.ttl = ttl
+        self._value = None
+        self._checksum = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self, mydb):
+        """返回目前有效的內容；距離上次檢查未超過 ttl 秒時不查詢資料庫"""
+        with self._lock:
+            now = time.monotonic()
+            if self._value is not None and now - self._checked_at < self.ttl:
+                return self._value
+            checksum = self.checksum(mydb)
+            self._checked_at = now
+            # checksum 取得失敗 (None) 時無法判斷是否變更，重新建立
+            if self._value is None or checksum is None or checksum != self._checksum:
+                self._value = self.build(mydb)
+                self._checksum = checksum
+            return self._value
+
+    def invalidate(self):
+        """強制下一次 get() 重新載入"""
+        with self._lock:
+            self._value = None
@@ -0,0 +1,196 @@
+import unittest
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+from contextlib import asynccontextmanager
+
+import aiohttp
+
+from src.aowotoy import detail_worker, extract_product_detail, extract_product_json, fetch_product
+from src.utils.fingerprint import FingerprintIndex, product_fingerprint
+from src.utils.frontier import Frontier
+
+EXAMPLE_JSON = os.path.join(os.path.dirname(__file__), '..', 'example.json')
+
+DETAIL_HTML = """
+<div class="ProductDetail-description">
+  <h3>商品描述</h3>
+  <p>適用 <b>POP MART</b> 盲盒</p>
+  <p>尺寸：10 x 10 cm<br>材質：壓克力</p>
+</div>
+"""
+# Playwright inner_text() 對同一段 HTML 的結果：行內元素不換行、段落之間有空行
+BROWSER_TEXT = "商品描述\n\n適用 POP MART 盲盒\n\n尺寸：10 x 10 cm\n材質：壓克力\n"
+
+
+def product_page(product, detail_html=DETAIL_HTML):
+    """模擬伺服器端輸出的產品頁：JSON 以 app.value('product', JSON.parse('...')) 內嵌"""
+    embedded = json.dumps(product, ensure_ascii=False).replace('"', '\\"')
+    return f"<html><body>{detail_html}<script>app.value('product', JSON.parse('{embedded}'));</script></body></html>"
+
+
+class FakePage:
+
+    def __init__(self, html, text):
+        self.html = html
+        self.text = text
+
+    async def goto(self, url, timeout=None):
+        pass
+
+    async def content(self):
+        return self.html
+
+    def locator(self, selector):
+        return self
+
+    async def inner_text(self):
+        return self.text
+
+
+class FakeBrowserManager:
+
+    def __init__(self, page):
+        self._page = page
+        self.pages = 0
+
+    @asynccontextmanager
+    async def page(self):
+        self.pages += 1
+        yield self._page
+
+
+class FailingSession:
+
+    def get(self, url, timeout=None):
+        raise aiohttp.ClientConnectionError("connection reset")
+
+
+class TestProductPage(unittest.TestCase):
+
+    def setUp(self):
+        with open(EXAMPLE_JSON, encoding='utf-8') as f:
+            self.product = json.load(f)
+
+    def test_extract_product_json(self):
+        self.assertEqual(extract_product_json(product_page(self.product)), self.product)
+        self.assertIsNone(extract_product_json("<html></html>"))
+        self.assertIsNone(extract_product_json("app.value('product', JSON.parse('{bad'));"))
+
+    def test_extract_product_detail(self):
+        self.assertEqual(extract_product_detail(DETAIL_HTML), "適用\nPOP MART\n盲盒\n尺寸：10 x 10 cm\n材質：壓克力")
+        self.assertEqual(extract_product_detail("<div class='Other'>x</div>"), '')
+
+    def test_http_and_browser_detail_share_fingerprint(self):
+        browser_detail = BROWSER_TEXT.replace("商品描述", "").strip()
+        self.assertEqual(product_fingerprint(self.product, extract_product_detail(DETAIL_HTML)),
+                         product_fingerprint(self.product, browser_detail))
+
+
+class TestFetchProduct(unittest.IsolatedAsyncioTestCase):
+
+    async def test_auto_falls_back_to_browser_on_http_error(self):
+        product = {'_id': 'p1', 'title_translations': {'zh-hant': '展示盒'}}
+        browser_manager = FakeBrowserManager(FakePage(product_page(product), BROWSER_TEXT))
+        limiter = FakeLimiter()
+        json_data, detail = await fetch_product(FailingSession(), browser_manager, limiter, 'https://example.com/p1', 'auto')
+        self.assertEqual(json_data, product)
+        self.assertTrue(detail.startswith("適用 POP MART"))
+        self.assertEqual(browser_manager.pages, 1)
+        # 改用瀏覽器時再發出一次請求，需另外取得 token
+        self.assertEqual(limiter.urls, ['https://example.com/p1'])
+
+    async def test_http_mode_raises(self):
+        browser_manager = FakeBrowserManager(FakePage('', ''))
+        with self.assertRaises(aiohttp.ClientError):
+            await fetch_product(FailingSession(), browser_manager, FakeLimiter(), 'https://example.com/p1', 'http')
+        self.assertEqual(browser_manager.pages, 0)
+
+class FakeWriter:
+    """記錄交給 AsyncProductWriter 的產品，由測試決定批次 commit 的結果"""
+
+    def __init__(self):
+        self.products = []
+
+    async def add_product(self, rows, on_commit=None):
+        self.products.append((rows, on_commit))
+
+
+class FakeDownloader:
+
+    def __init__(self, error=None):
+        self.error = error
+
+    async def download_many(self, items):
+        if self.error:
+            raise self.error
+        return ['downloaded' for _ in items]
+
+
+class FakeLimiter:
+
+    def __init__(self):
+        self.urls = []
+
+    async def acquire(self, url):
+        self.urls.append(url)
+
+
+class TestDetailWorker(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.cwd = os.getcwd()
+        os.chdir(self.test_dir) # process_product 在目前目錄建立 products/<product_id>
+        self.frontier = Frontier(os.path.join(self.test_dir, "frontier.sqlite3"))
+        self.writer = FakeWriter()
+        self.fingerprints = FingerprintIndex()
+        product = {'_id': 'p1', 'variations': [{'key': 'o1', 'price': {'dollars': 10}}],
+                   'media': [{'images': {'original': {'url': 'https://img.example.com/1.png'}}}]}
+        self.browser_manager = FakeBrowserManager(FakePage(product_page(product), BROWSER_TEXT))
+
+    def tearDown(self):
+        self.frontier.close()
+        os.chdir(self.cwd)
+        shutil.rmtree(self.test_dir)
+
+    async def _crawl(self, url, downloader=None):
+        self.frontier.add([url])
+        queue = asyncio.Queue()
+        for item in (url, None):
+            queue.put_nowait(item)
+        await detail_worker(0, self.browser_manager, None, queue, FakeLimiter(), self.writer, self.fingerprints,
+                            downloader or FakeDownloader(), self.frontier, fetch_mode='browser')
+
+    async def test_url_done_only_after_commit(self):
+        await self._crawl('https://example.com/p1')
+        # 資料尚在寫入佇列或批次中，中斷後續跑時會重新處理
+        self.assertEqual(self.frontier.counts()['in_progress'], 1)
+        _, on_commit = self.writer.products[0]
+        on_commit(True)
+        self.assertEqual(self.frontier.counts()['done'], 1)
+
+    async def test_failed_batch_marks_url_failed(self):
+        await self._crawl('https://example.com/p1')
+        _, on_commit = self.writer.products[0]
+        on_commit(False)
+        self.assertEqual(self.frontier.failed(max_attempts=3), ['https://example.com/p1'])
+        self.assertEqual(len(self.fingerprints), 0)
+
+    async def test_fingerprint_recorded_only_after_success(self):
+        url = 'https://example.com/p1'
+        await self._crawl(url, FakeDownloader(OSError("disk full")))
+        # products/p1 已建立，但指紋未記錄，重試時不會被當成內容未變而略過
+        self.assertTrue(os.path.isdir(os.path.join('products', 'p1')))
+        self.assertEqual((len(self.fingerprints), self.writer.products), (0, []))
+        self.assertEqual(self.frontier.failed(max_attempts=3), [url])
+        await self._crawl(url)
+        _, on_commit = self.writer.products[0]
+        self.assertEqual(len(self.fingerprints), 0)
+        on_commit(True)
+        self.assertEqual(len(self.fingerprints), 1)
+
+if __name__ == '__main__':
+    unittest.main()
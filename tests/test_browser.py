@@ -0,0 +1,75 @@
+import unittest
+
+from src.utils.browser import BrowserManager
+
+
+class FakePage:
+
+    def __init__(self):
+        self.closed = False
+
+    def is_closed(self):
+        return self.closed
+
+
+class FakeContext:
+
+    def __init__(self):
+        self.closed = False
+
+    async def new_page(self):
+        return FakePage()
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeBrowser:
+
+    def __init__(self):
+        self.contexts = []
+
+    async def new_context(self, extra_http_headers=None):
+        self.contexts.append(FakeContext())
+        return self.contexts[-1]
+
+    async def close(self):
+        pass
+
+
+class TestBrowserManager(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.browser = FakeBrowser()
+        self.manager = BrowserManager(recycle_after=2)
+        self.manager._browser = self.browser # 已啟動的瀏覽器，start() 直接返回
+
+    async def test_context_recycled_after_n_uses(self):
+        pages = []
+        for _ in range(5):
+            async with self.manager.page() as page:
+                pages.append(page)
+        # 每個 context 使用 2 次後關閉，第 5 次使用的 context 仍在閒置列表中
+        self.assertEqual(pages[0], pages[1])
+        self.assertNotEqual(pages[1], pages[2])
+        self.assertEqual([context.closed for context in self.browser.contexts], [True, True, False])
+        report = self.manager.startup_report(legacy_launches=5)
+        self.assertEqual((report['leases'], report['contexts_created'], report['contexts_recycled']), (5, 3, 2))
+
+    async def test_context_closed_after_error(self):
+        with self.assertRaises(RuntimeError):
+            async with self.manager.page():
+                raise RuntimeError("頁面載入失敗")
+        async with self.manager.page():
+            pass
+        self.assertEqual([context.closed for context in self.browser.contexts], [True, False])
+        self.assertEqual(self.manager.contexts_recycled, 1)
+
+    async def test_closed_page_is_not_reused(self):
+        async with self.manager.page() as page:
+            page.closed = True
+        self.assertEqual(self.manager._idle, [])
+        self.assertTrue(self.browser.contexts[0].closed)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,327 @@
+import unittest
+import copy
+import re
+import threading
+from collections import Counter
+from unittest import mock
+
+import mysql.connector
+from mysql.connector import pooling
+
+from src.utils import db
+from src.utils.db import (claim_news_to_translate, complete_translations, editor_cache, filter_new_urls, get_editor_prompt,
+                          get_proper_noun_rewriter, insert_news_batch, proper_noun_cache, release_news, url_hash)
+
+
+class FakeCursor:
+    """依 SQL 開頭分派到 FakeNewsDB 的 news 表 (只支援 db.py 使用的查詢)"""
+
+    def __init__(self, db, dictionary=False):
+        self.db = db
+        self.dictionary = dictionary
+        self.rows = []
+        self.rowcount = 0
+        self.lastrowid = None
+
+    def execute(self, sql, params=()):
+        if self.db.fail:
+            raise self.db.fail
+        self.db.begin()
+        sql = ' '.join(sql.split())
+        self.rows, self.rowcount = self.db.run(sql, list(params))
+        if sql.startswith("INSERT"):
+            self.db.before_insert = None
+        if not self.dictionary and self.rows and isinstance(self.rows[0], dict):
+            self.rows = [tuple(row.values()) for row in self.rows]
+
+    def executemany(self, sql, rows):
+        total = 0
+        for params in rows:
+            self.execute(sql, params)
+            total += self.rowcount
+        self.rowcount = total
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+
+class FakeNewsDB:
+    """autocommit 關閉的連線：第一個查詢開始交易，rollback 時還原到交易開始時的內容"""
+
+    def __init__(self, articles=()):
+        self.news = {}
+        self.now = 1000
+        self.in_transaction = False
+        self.commits = 0
+        self.fail = None # 設定例外時 execute 拋出該例外
+        self.before_insert = None # INSERT 前呼叫一次，模擬其他程序在檢查與寫入之間寫入同一 URL
+        self._snapshot = None
+        for article in articles:
+            self.add(**article)
+
+    def add(self, id, status=0, translated_title=None, lease_token=None, lease_until=None, url=None):
+        url = url or f'https://example.com/{id}'
+        self.news[id] = dict(id=id, source='s', language='en', url=url, url_hash=url_hash(url), article_title=f't{id}',
+                             article_content='c', links='', status=status, translated_title=translated_title,
+                             translated_content=None, lease_token=lease_token, lease_until=lease_until)
+
+    def begin(self):
+        if not self.in_transaction:
+            self.in_transaction = True
+            self._snapshot = copy.deepcopy(self.news)
+
+    def start_transaction(self):
+        if self.in_transaction:
+            raise mysql.connector.ProgrammingError("Transaction already in progress")
+        self.begin()
+
+    def commit(self):
+        self.in_transaction = False
+        self.commits += 1
+
+    def rollback(self):
+        if self._snapshot is not None:
+            self.news = self._snapshot
+        self.in_transaction = False
+
+    def cursor(self, dictionary=False):
+        return FakeCursor(self, dictionary)
+
+    def run(self, sql, params):
+        if sql.startswith("SELECT id FROM news WHERE status = 0"):
+            ids = sorted((row['id'] for row in self.news.values() if row['status'] == 0 and not row['translated_title']
+                          and (row['lease_until'] is None or row['lease_until'] < self.now)), reverse=True)
+            return [{'id': news_id} for news_id in ids[:params[0]]], 0
+        if sql.startswith("UPDATE news SET lease_token = %s"):
+            token, seconds, *ids = params
+            for news_id in ids:
+                self.news[news_id].update(lease_token=token, lease_until=self.now + seconds)
+            return [], len(ids)
+        if sql.startswith("SELECT id, source"):
+            return [{key: self.news[news_id][key] for key in ('id', 'source', 'language', 'url', 'article_title',
+                                                              'article_content', 'links')}
+                    for news_id in sorted(params, reverse=True)], 0
+        if sql.startswith("UPDATE news SET translated_title"):
+            *values, news_id, token = params
+            row = self.news.get(news_id)
+            if not row or row['lease_token'] != token:
+                return [], 0
+            row.update(dict(zip(('translated_title', 'translated_content', 'tags', 'slug', 'translator', 'status'), values)),
+                       lease_token=None, lease_until=None)
+            return [], 1
+        if sql.startswith("UPDATE news SET lease_token = NULL"):
+            token, *ids = params
+            rows = [row for row in self.news.values() if row['lease_token'] == token and (not ids or row['id'] in ids)]
+            for row in rows:
+                row.update(lease_token=None, lease_until=None)
+            return [], len(rows)
+        if sql.startswith("SELECT url_hash FROM news") or sql.startswith("SELECT id, url_hash FROM news"):
+            return [{'id': row['id'], 'url_hash': row['url_hash']} if sql.startswith("SELECT id") else {'url_hash': row['url_hash']}
+                    for row in sorted(self.news.values(), key=lambda row: row['id']) if row['url_hash'] in params], 0
+        if sql.startswith("INSERT IGNORE INTO news"):
+            if self.before_insert:
+                self.before_insert()
+            written = 0
+            hashes = {row['url_hash'] for row in self.news.values()}
+            for i in range(0, len(params), 8):
+                url = params[i + 2]
+                if url_hash(url) not in hashes:
+                    self.add(max(self.news, default=0) + 1, url=url)
+                    hashes.add(url_hash(url))
+                    written += 1
+            return [], written
+        if sql.startswith("SELECT language, title_prompt"):
+            return [{'language': 'en', 'title_prompt': 'tp', 'content_prompt': 'cp', 'editor_name': 'editor'}], 0
+        if sql.startswith("SELECT unknown_noun, translated_noun"):
+            return [('POP MART', '泡泡瑪特')], 0
+        if sql.startswith("CHECKSUM TABLE"):
+            return [(sql.split()[-1], 1)], 0
+        raise AssertionError(f"未支援的 SQL: {re.sub(r'%s', '?', sql)}")
+
+
+def translation(news_id, status=1):
+    return {'id': news_id, 'translated_title': f'標題{news_id}', 'translated_content': '內容', 'tags': '', 'slug': '',
+            'translator': 'tester', 'status': status}
+
+
+def news(url):
+    return {'source': 's', 'language': 'en', 'url': url, 'article_title': 't', 'article_content': 'c', 'links': ''}
+
+
+class TestNewsUrls(unittest.TestCase):
+
+    def setUp(self):
+        self.db = FakeNewsDB([{'id': 1, 'url': 'https://example.com/old'}])
+
+    def test_filter_new_urls(self):
+        urls = ['https://example.com/b', 'https://example.com/old', 'https://example.com/a', 'https://example.com/b']
+        self.assertEqual(filter_new_urls(self.db, urls), ['https://example.com/b', 'https://example.com/a'])
+        # 無法確認時不視為新 URL
+        self.db.fail = mysql.connector.Error("lost connection")
+        self.assertEqual(filter_new_urls(self.db, urls), [])
+
+    def test_insert_news_batch_returns_new_ids(self):
+        news_list = [news('https://example.com/a'), news('https://example.com/old'), news('https://example.com/b'),
+                     news('https://example.com/a')]
+        self.assertEqual(insert_news_batch(self.db, news_list), {'https://example.com/a': 2, 'https://example.com/b': 3})
+        self.assertEqual((len(self.db.news), self.db.in_transaction), (3, False))
+        self.assertEqual(insert_news_batch(self.db, news_list), {})
+
+    def test_concurrent_writer_ids_are_not_returned(self):
+        # 其他程序在檢查之後、寫入之前寫入 b，不可被當成這次新增的文章
+        self.db.before_insert = lambda: self.db.add(10, url='https://example.com/b')
+        inserted = insert_news_batch(self.db, [news('https://example.com/a'), news('https://example.com/b')])
+        self.assertNotIn('https://example.com/b', inserted)
+        self.assertEqual(self.db.news[11]['url'], 'https://example.com/a')
+
+    def test_failed_insert_rolls_back(self):
+        self.db.fail = mysql.connector.Error("lost connection")
+        self.assertEqual(insert_news_batch(self.db, [news('https://example.com/a')]), {})
+        self.assertEqual(list(self.db.news), [1])
+
+
+class TestTranslationLease(unittest.TestCase):
+
+    def setUp(self):
+        self.db = FakeNewsDB([{'id': 1}, {'id': 2}, {'id': 3}, {'id': 4, 'translated_title': '已翻譯'},
+                              {'id': 5, 'lease_token': 'other', 'lease_until': 2000}])
+
+    def test_claim_skips_leased_and_translated(self):
+        token, articles = claim_news_to_translate(self.db, limit=2, lease_seconds=60)
+        self.assertEqual([article['id'] for article in articles], [3, 2])
+        self.assertEqual((self.db.news[3]['lease_token'], self.db.news[3]['lease_until']), (token, 1060))
+        # 第二個 worker 只拿到剩下的文章
+        other_token, articles = claim_news_to_translate(self.db, limit=10)
+        self.assertNotEqual(token, other_token)
+        self.assertEqual([article['id'] for article in articles], [1])
+        # 租約過期後可被重新領取
+        self.db.now = 3000
+        _, articles = claim_news_to_translate(self.db, limit=10)
+        self.assertEqual([article['id'] for article in articles], [5, 3, 2, 1])
+
+    def test_claim_refuses_open_transaction(self):
+        self.db.begin() # 呼叫端的查詢開始了交易，尚未 commit
+        self.db.news[1]['status'] = 9
+        with self.assertRaises(RuntimeError):
+            claim_news_to_translate(self.db, limit=10)
+        self.assertEqual(self.db.commits, 0)
+        self.db.rollback()
+        self.assertEqual(self.db.news[1]['status'], 0)
+
+    def test_claim_after_cached_reads_on_same_connection(self):
+        # 翻譯 worker 先在同一條連線讀取編輯器設定、專有名詞與新 URL，再領取文章
+        editor_cache.invalidate()
+        proper_noun_cache.invalidate()
+        self.assertEqual(get_editor_prompt(self.db, 'en')['editor_name'], 'editor')
+        self.assertFalse(self.db.in_transaction)
+        self.assertEqual(get_proper_noun_rewriter(self.db).rewrite('POP MART 盲盒'), '泡泡瑪特 盲盒')
+        self.assertEqual(filter_new_urls(self.db, ['https://example.com/new']), ['https://example.com/new'])
+        self.assertFalse(self.db.in_transaction)
+        _, articles = claim_news_to_translate(self.db, limit=1)
+        self.assertEqual([article['id'] for article in articles], [3])
+
+    def test_complete_only_updates_own_lease(self):
+        token, _ = claim_news_to_translate(self.db, limit=2, lease_seconds=60)
+        # 文章 3 的租約過期後被其他 worker 領取
+        self.db.now = 2000
+        other_token, articles = claim_news_to_translate(self.db, limit=1)
+        self.assertEqual([article['id'] for article in articles], [3])
+        self.assertEqual(complete_translations(self.db, token, [translation(3), translation(2)]), 1)
+        self.assertEqual((self.db.news[2]['translated_title'], self.db.news[2]['lease_token']), ('標題2', None))
+        self.assertEqual((self.db.news[3]['translated_title'], self.db.news[3]['lease_token']), (None, other_token))
+
+    def test_release_returns_articles(self):
+        token, _ = claim_news_to_translate(self.db, limit=3)
+        self.assertEqual(release_news(self.db, token, [3]), 1)
+        self.assertEqual(release_news(self.db, 'other'), 1) # 只歸還該 lease_token 的文章
+        self.assertEqual(release_news(self.db, token), 2)
+        _, articles = claim_news_to_translate(self.db, limit=10)
+        self.assertEqual([article['id'] for article in articles], [5, 3, 2, 1])
+
+class FakePooledConnection:
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.connected = True
+
+    def is_connected(self):
+        return self.connected
+
+    def ping(self, reconnect=False, attempts=1, delay=0):
+        self.connected = True
+
+    def close(self):
+        self.pool.release(self)
+
+
+class FakePool:
+    """與 MySQLConnectionPool 相同：沒有閒置連線時 get_connection() 立即拋出 PoolError"""
+
+    def __init__(self, size):
+        self.idle = [FakePooledConnection(self) for _ in range(size)]
+        self.lock = threading.Lock()
+
+    def get_connection(self):
+        with self.lock:
+            if not self.idle:
+                raise pooling.PoolError("Failed getting connection; pool exhausted")
+            return self.idle.pop()
+
+    def release(self, connection):
+        with self.lock:
+            self.idle.append(connection)
+
+
+class TestConnectionPool(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = FakePool(2)
+        for patcher in (mock.patch.object(db, 'pool_stats', Counter()), mock.patch.object(db, 'POOL_RETRY_INTERVAL', 0.001),
+                        mock.patch.object(db, 'get_pool', return_value=self.pool)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_checkout_and_release(self):
+        first, second = db.connect_to_db(), db.connect_to_db()
+        self.assertEqual(self.pool.idle, [])
+        # 連線池用盡且沒有連線歸還時逾時
+        with self.assertRaises(pooling.PoolError):
+            db._checkout(self.pool, timeout=0.01)
+        first.close()
+        self.assertIs(db.connect_to_db(), first)
+        second.close()
+        self.assertEqual((db.pool_stats['checkouts'], db.pool_stats['timeouts'], db.pool_stats['waits']), (3, 1, 0))
+
+    def test_waits_for_release(self):
+        connections = [db.connect_to_db(), db.connect_to_db()]
+        timer = threading.Timer(0.05, connections[0].close)
+        timer.start()
+        self.assertIs(db.connect_to_db(timeout=5), connections[0])
+        timer.join()
+        self.assertEqual(db.pool_stats['waits'], 1)
+        self.assertGreater(db.pool_stats['max_wait_seconds'], 0)
+        self.assertIn("需等待 1 次", db.pool_summary())
+
+    def test_reconnects_stale_connection(self):
+        self.pool.idle[-1].connected = False
+        self.assertTrue(db.connect_to_db().is_connected())
+        self.assertEqual(db.pool_stats['reconnects'], 1)
+
+    def test_concurrent_checkouts_are_counted(self):
+        def worker():
+            for _ in range(200):
+                db.connect_to_db(timeout=5).close()
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(db.pool_stats['checkouts'], 1600)
+        self.assertEqual(len(self.pool.idle), 2)
+
+if __name__ == '__main__':
+    unittest.main()
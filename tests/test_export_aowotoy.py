@@ -0,0 +1,65 @@
+import unittest
+
+import mysql.connector
+
+from src.utils.export_aowotoy import stream_rows
+
+
+class FakeCursor:
+    """未緩衝游標：還有未讀的結果時 close() 拋出與 mysql.connector 相同的錯誤"""
+
+    def __init__(self, conn, rows):
+        self.conn = conn
+        self.rows = rows
+
+    def execute(self, sql, params=()):
+        self.conn.unread = True
+
+    def fetchmany(self, size):
+        rows, self.rows = self.rows[:size], self.rows[size:]
+        if not rows:
+            self.conn.unread = False
+        return rows
+
+    def close(self):
+        if self.conn.unread:
+            raise mysql.connector.InternalError("Unread result found")
+
+
+class FakeConnection:
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.unread = False
+
+    def cursor(self, buffered=True):
+        return FakeCursor(self, list(self.rows))
+
+    def consume_results(self):
+        self.unread = False
+
+
+class TestStreamRows(unittest.TestCase):
+
+    def setUp(self):
+        self.conn = FakeConnection([(i,) for i in range(5)])
+
+    def test_reads_in_chunks(self):
+        self.assertEqual(list(stream_rows(self.conn, 'SELECT', chunk_size=2)), [[(0,), (1,)], [(2,), (3,)], [(4,)]])
+        self.assertFalse(self.conn.unread)
+
+    def test_error_midway_is_not_masked(self):
+        with self.assertRaises(ValueError):
+            for rows in stream_rows(self.conn, 'SELECT', chunk_size=2):
+                raise ValueError("寫入 CSV 失敗")
+        # 剩下的結果已被丟棄，連線可繼續使用
+        self.assertFalse(self.conn.unread)
+
+    def test_early_close_discards_results(self):
+        chunks = stream_rows(self.conn, 'SELECT', chunk_size=2)
+        next(chunks)
+        chunks.close()
+        self.assertFalse(self.conn.unread)
+
+if __name__ == '__main__':
+    unittest.main()
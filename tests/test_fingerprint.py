@@ -0,0 +1,68 @@
+import unittest
+import copy
+import json
+import os
+import sqlite3
+from src.utils.fingerprint import product_fingerprint, FingerprintIndex
+
+EXAMPLE_JSON = os.path.join(os.path.dirname(__file__), '..', 'example.json')
+
+class TestProductFingerprint(unittest.TestCase):
+
+    def setUp(self):
+        with open(EXAMPLE_JSON, encoding='utf-8') as f:
+            self.product = json.load(f)
+
+    def test_stable(self):
+        self.assertEqual(product_fingerprint(self.product, 'detail'), product_fingerprint(copy.deepcopy(self.product), 'detail'))
+
+    def test_price_change(self):
+        changed = copy.deepcopy(self.product)
+        changed['variations'][0]['price']['dollars'] += 1
+        self.assertNotEqual(product_fingerprint(self.product), product_fingerprint(changed))
+
+    def test_media_query_string_ignored(self):
+        # 圖片 URL 的 query string 不影響指紋
+        changed = copy.deepcopy(self.product)
+        original = changed['media'][0]['images']['original']
+        original['url'] = original['url'].split('?')[0] + '?v=2'
+        self.assertEqual(product_fingerprint(self.product), product_fingerprint(changed))
+
+    def test_detail_change(self):
+        self.assertNotEqual(product_fingerprint(self.product, 'a'), product_fingerprint(self.product, 'b'))
+
+class TestFingerprintIndex(unittest.TestCase):
+
+    def test_is_unchanged_and_record(self):
+        index = FingerprintIndex({'p1': 'aaa'})
+        self.assertTrue(index.is_unchanged('p1', 'aaa'))
+        self.assertFalse(index.is_unchanged('p1', 'bbb'))
+        self.assertFalse(index.is_unchanged('p2', 'ccc'))
+        # 比對不會記錄指紋，處理成功後才呼叫 record()
+        self.assertFalse(index.is_unchanged('p2', 'ccc'))
+        index.record('p2', 'ccc')
+        self.assertTrue(index.is_unchanged('p2', 'ccc'))
+        self.assertEqual(index.stats['unchanged'], 2)
+        self.assertEqual(index.stats['changed'], 1)
+        self.assertEqual(index.stats['new'], 2)
+
+    def test_load_skips_products_with_disagreeing_rows(self):
+        # sqlite 與 MySQL 的 GROUP BY / HAVING 語意相同
+        mydb = sqlite3.connect(':memory:')
+        mydb.execute("CREATE TABLE aowotoy_products (product_id TEXT, option_id TEXT, fingerprint TEXT)")
+        mydb.executemany("INSERT INTO aowotoy_products VALUES (?, ?, ?)", [
+            ('p1', 'o1', 'aaa'), ('p1', 'o2', 'aaa'),
+            ('p2', 'o3', 'bbb'), ('p2', 'o4', 'old'), # 已移除的規格留下舊指紋
+            ('p3', 'o5', ''), ('p4', 'o6', 'ddd'), ('p4', 'o7', ''),
+        ])
+        index = FingerprintIndex.load(mydb)
+        self.assertEqual(len(index), 1)
+        self.assertTrue(index.is_unchanged('p1', 'aaa'))
+        # 內容改回舊版 (A -> B -> A) 時不會因為殘留的資料列被誤判為未變
+        self.assertFalse(index.is_unchanged('p2', 'old'))
+        self.assertFalse(index.is_unchanged('p4', 'ddd'))
+        mydb.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+import unittest
+import os
+import shutil
+import tempfile
+from src.utils.frontier import Frontier
+
+class TestFrontier(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.test_dir, "frontier.sqlite3")
+        self.frontier = Frontier(self.path)
+
+    def tearDown(self):
+        self.frontier.close()
+        shutil.rmtree(self.test_dir)
+
+    def test_add_returns_only_new_urls(self):
+        self.assertEqual(self.frontier.add(["a", "b"]), ["a", "b"])
+        self.assertEqual(self.frontier.add(["b", "c"]), ["c"])
+        self.assertEqual(self.frontier.pending(), ["a", "b", "c"])
+
+    def test_resume_after_interrupt(self):
+        self.frontier.add(["a", "b", "c"])
+        self.assertTrue(self.frontier.claim("a"))
+        self.frontier.mark_done("a")
+        self.assertTrue(self.frontier.claim("b"))
+        # 模擬程式在處理 b 時中斷
+        self.frontier.close()
+        self.frontier = Frontier(self.path)
+        self.assertEqual(self.frontier.recover(), 1)
+        self.assertEqual(self.frontier.pending(), ["b", "c"])
+        self.assertFalse(self.frontier.claim("a"))
+
+    def test_failed_urls_retry_until_max_attempts(self):
+        self.frontier.add(["a"])
+        for _ in range(2):
+            self.assertTrue(self.frontier.claim("a"))
+            self.frontier.mark_failed("a", "timeout")
+        self.assertEqual(self.frontier.failed(3), ["a"])
+        self.assertEqual(self.frontier.failed(2), [])
+        self.assertEqual(self.frontier.counts()['failed'], 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,151 @@
+import unittest
+import hashlib
+import os
+import shutil
+import tempfile
+from types import SimpleNamespace
+
+from src.utils.image_downloader import ImageDownloader
+from src.utils.image_store import ImageStore
+
+CONTENT = b"0123456789" * 100
+URL = "https://img.example.com/1.png"
+
+
+class FakeContent:
+
+    def __init__(self, body):
+        self.body = body
+
+    async def iter_chunked(self, size):
+        for start in range(0, len(self.body), size):
+            yield self.body[start:start + size]
+
+
+class FakeResponse:
+
+    def __init__(self, status, body=b'', etag='"v1"'):
+        self.status = status
+        self.headers = {'ETag': etag} if etag else {}
+        self.content = FakeContent(body)
+        self.request_info = SimpleNamespace(real_url=URL)
+        self.history = ()
+        self.reason = 'test'
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakeSession:
+    """依序回傳預先設定的回應，並記錄每次請求的 headers"""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def get(self, url, headers=None):
+        self.requests.append(dict(headers or {}))
+        return self.responses.pop(0)
+
+
+class FakeProcessor:
+    """以原始內容代替轉檔結果，產生 ImageStore 的各個版本"""
+
+    def __init__(self, store):
+        self.store = store
+
+    async def process(self, digest):
+        for variant in ('jpeg', 'upload'):
+            path = self.store.variant_path(digest, variant)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            shutil.copyfile(self.store.object_path(digest), path)
+
+
+class TestImageDownloader(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.store = ImageStore(os.path.join(self.test_dir, "store"))
+        self.path = os.path.join(self.test_dir, "products", "p1", "p1_1.jpg")
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def _downloader(self, *responses):
+        self.session = FakeSession(*responses)
+        return ImageDownloader(self.session, self.store, backoff=0, chunk_size=64)
+
+    def _partial(self, content, etag='"v1"'):
+        # 模擬上次中斷時留下的暫存檔
+        with open(self.store.temp_path(URL), 'wb') as f:
+            f.write(content)
+        self.store.set_partial(URL, etag)
+
+    def _assert_stored(self):
+        with open(self.path, 'rb') as f:
+            self.assertEqual(f.read(), CONTENT)
+        self.assertEqual(self.store.lookup(URL), hashlib.sha256(CONTENT).hexdigest())
+        self.assertFalse(os.path.exists(self.store.temp_path(URL)))
+
+    async def test_download(self):
+        downloader = self._downloader(FakeResponse(200, CONTENT))
+        self.assertEqual(await downloader.download(URL, self.path), 'downloaded')
+        self.assertEqual(downloader.stats['bytes'], len(CONTENT))
+        self._assert_stored()
+
+    async def test_resume_with_range(self):
+        self._partial(CONTENT[:300])
+        downloader = self._downloader(FakeResponse(206, CONTENT[300:]))
+        self.assertEqual(await downloader.download(URL, self.path), 'downloaded')
+        self.assertEqual(self.session.requests[0], {'Range': 'bytes=300-', 'If-Range': '"v1"'})
+        self._assert_stored()
+
+    async def test_resume_replaced_when_etag_changed(self):
+        # If-Range 不符時伺服器回傳完整內容，暫存檔從頭寫入
+        self._partial(b"stale content")
+        downloader = self._downloader(FakeResponse(200, CONTENT, etag='"v2"'))
+        self.assertEqual(await downloader.download(URL, self.path), 'downloaded')
+        self._assert_stored()
+
+    async def test_complete_partial_restarts_on_416(self):
+        self._partial(CONTENT)
+        downloader = self._downloader(FakeResponse(416), FakeResponse(200, CONTENT))
+        self.assertEqual(await downloader.download(URL, self.path), 'downloaded')
+        self.assertEqual(self.session.requests, [{'Range': f'bytes={len(CONTENT)}-', 'If-Range': '"v1"'}, {}])
+        self.assertEqual(downloader.stats['restarted'], 1)
+        self._assert_stored()
+
+    async def test_retryable_status_is_retried(self):
+        downloader = self._downloader(FakeResponse(503), FakeResponse(200, CONTENT))
+        self.assertEqual(await downloader.download(URL, self.path), 'downloaded')
+        self.assertEqual(len(self.session.requests), 2)
+
+    async def test_client_error_is_not_retried(self):
+        downloader = self._downloader(FakeResponse(404), FakeResponse(200, CONTENT))
+        self.assertEqual(await downloader.download(URL, self.path), 'failed')
+        self.assertEqual(len(self.session.requests), 1)
+
+    async def test_filesystem_error_fails_only_that_image(self):
+        other_url = "https://img.example.com/2.png"
+        blocked = os.path.join(self.test_dir, "blocked")
+        with open(blocked, 'w') as f:
+            f.write("not a directory")
+        downloader = self._downloader(FakeResponse(200, CONTENT), FakeResponse(200, b"other"))
+        results = await downloader.download_many([(URL, self.path), (other_url, os.path.join(blocked, "p1_2.jpg"))])
+        self.assertEqual(results, ['downloaded', 'failed'])
+        self.assertEqual(downloader.stats['failed'], 1)
+        self._assert_stored()
+
+    async def test_upload_variant_kept_out_of_products(self):
+        # rename.py 會走訪 products/，上傳版本放在 store 的 upload/<product_id>/ 下
+        downloader = self._downloader(FakeResponse(200, CONTENT))
+        downloader.processor = FakeProcessor(self.store)
+        self.assertEqual(await downloader.download(URL, self.path), 'downloaded')
+        self.assertEqual(os.listdir(os.path.dirname(self.path)), ['p1_1.jpg'])
+        self.assertTrue(os.path.exists(self.store.upload_path('p1', 'p1_1.jpg')))
+
+if __name__ == '__main__':
+    unittest.main()
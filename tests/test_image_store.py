@@ -0,0 +1,51 @@
+import unittest
+import os
+import shutil
+import tempfile
+from src.utils.image_store import ImageStore, file_sha256
+
+class TestImageStore(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.store = ImageStore(os.path.join(self.test_dir, "store"))
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def _download(self, url, content):
+        # 模擬下載完成的暫存檔
+        part_path = self.store.temp_path(url)
+        with open(part_path, 'wb') as f:
+            f.write(content)
+        return self.store.add(part_path, url, file_sha256(part_path))
+
+    def test_same_content_stored_once(self):
+        a = self._download("https://img.example.com/a.png", b"background")
+        b = self._download("https://img.example.com/b.png", b"background")
+        self.assertEqual(a, b)
+        self.assertEqual(self.store.stats['stored'], 1)
+        self.assertEqual(self.store.stats['deduplicated'], 1)
+
+    def test_link_keeps_product_file_names(self):
+        digest = self._download("https://img.example.com/a.png", b"image")
+        path_1 = os.path.join(self.test_dir, "products", "p1", "p1_1.jpg")
+        path_2 = os.path.join(self.test_dir, "products", "p2", "p2_3.jpg")
+        self.store.link(digest, path_1)
+        self.store.link(digest, path_2)
+        with open(path_1, 'rb') as f:
+            self.assertEqual(f.read(), b"image")
+        self.assertTrue(os.path.samefile(path_1, path_2))
+        # 重複連結不應出錯
+        self.store.link(digest, path_1)
+
+    def test_lookup_survives_reload(self):
+        digest = self._download("https://img.example.com/a.png", b"image")
+        self.store.save_index()
+        reloaded = ImageStore(self.store.root)
+        self.assertEqual(reloaded.lookup("https://img.example.com/a.png"), digest)
+        self.assertIsNone(reloaded.lookup("https://img.example.com/unknown.png"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+import unittest
+import os
+import shutil
+import tempfile
+from src.ruten.item_cache import ItemCache
+
+class TestItemCache(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.test_dir, "items.sqlite3")
+        self.cache = ItemCache(self.path)
+
+    def tearDown(self):
+        self.cache.close()
+        shutil.rmtree(self.test_dir)
+
+    def test_only_new_or_updated_items_are_stale(self):
+        self.cache.update_listing([{'item_id': '1', 'last_update': 100}, {'item_id': '2', 'last_update': 100}])
+        self.assertEqual(self.cache.stale(), ['1', '2'])
+        self.cache.store_detail({'item_id': '1', 'custom_no': 'p1', 'has_spec': False})
+        self.assertEqual(self.cache.stale(), ['2'])
+        self.cache.update_listing([{'item_id': '1', 'last_update': 200}])
+        self.assertEqual(self.cache.stale(), ['1', '2'])
+
+    def test_lookup_by_item_and_spec_custom_no(self):
+        self.cache.update_listing([{'item_id': '1', 'last_update': 1}, {'item_id': '2', 'last_update': 1}])
+        self.cache.store_detail({'item_id': '1', 'custom_no': 'p1', 'has_spec': False})
+        self.cache.store_detail({'item_id': '2', 'has_spec': True, 'spec_info': [
+            {'spec_id': 's1', 'custom_no': 'o1'}, {'spec_id': 's2', 'custom_no': 'o2'}]})
+        self.assertEqual(self.cache.item_id('p1'), '1')
+        self.assertEqual(self.cache.item_id('o2'), '2')
+        self.assertEqual(self.cache.find_product('p2', ['o1', 'o2']), ('2', {'o1': 's1', 'o2': 's2'}))
+        self.assertIsNone(self.cache.find_product('p3', ['o3']))
+
+    def test_complete_listing_removes_deleted_items(self):
+        self.cache.update_listing([{'item_id': '1'}, {'item_id': '2'}])
+        self.cache.store_detail({'item_id': '2', 'spec_info': [{'spec_id': 's1', 'custom_no': 'o1'}]})
+        self.cache.update_listing([{'item_id': '1'}], complete=True)
+        self.assertIsNone(self.cache.get('2'))
+        self.assertIsNone(self.cache.item_id('o1'))
+        self.assertEqual(self.cache.counts()['items'], 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,33 @@
+import unittest
+from src.utils.listing_filter import ListingFilter
+
+class TestListingFilter(unittest.TestCase):
+
+    def test_contains_rules_become_sql(self):
+        listing_filter = ListingFilter([
+            {'name': '無需拼裝', 'fields': ['option'], 'contains': '無需拼裝'},
+            {'name': '預購', 'fields': ['name', 'option'], 'contains': '預購'},
+        ])
+        condition, params = listing_filter.sql_where()
+        self.assertEqual(condition, "NOT (`option` LIKE %s) AND NOT (name LIKE %s OR `option` LIKE %s)")
+        self.assertEqual(params, ['%無需拼裝%', '%預購%', '%預購%'])
+
+    def test_like_wildcards_are_escaped(self):
+        _, params = ListingFilter([{'name': '折扣', 'contains': '50%_off'}]).sql_where()
+        self.assertEqual(params, ['%50\\%\\_off%'])
+
+    def test_pattern_rules_match_after_fetch(self):
+        listing_filter = ListingFilter([{'name': '限定色', 'fields': ['option'], 'pattern': '限定.?色'}])
+        self.assertEqual(listing_filter.sql_where(), ('', []))
+        self.assertFalse(listing_filter.keep({'name': 'A', 'option': '限定金色'}))
+        self.assertTrue(listing_filter.keep({'name': 'A', 'option': '一般款'}))
+        self.assertEqual(listing_filter.stats['限定色'], 1)
+
+    def test_invalid_rules(self):
+        with self.assertRaises(ValueError):
+            ListingFilter([{'name': 'x', 'fields': ['price'], 'contains': '1'}])
+        with self.assertRaises(ValueError):
+            ListingFilter([{'name': 'x'}])
+
+if __name__ == '__main__':
+    unittest.main()
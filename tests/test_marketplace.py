@@ -0,0 +1,58 @@
+import unittest
+import csv
+import os
+import shutil
+import tempfile
+from src.utils.marketplace import MARKETPLACES, RutenWriter, ShopeeWriter, replace_name, round_price
+
+PRODUCTS = [
+    {'product_id': 'p1', 'option_id': 'o1', 'name': '高達 AOWOBOX 展示盒', 'price': 333, 'option': '大'},
+    {'product_id': 'p1', 'option_id': 'o2', 'name': '高達 AOWOBOX 展示盒', 'price': 250, 'option': '小'},
+]
+
+class TestMarketplace(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_replace_name(self):
+        self.assertEqual(replace_name('高達 AOWOBOX 展示盒'), '鋼彈 阿庫力 展示盒')
+
+    def test_round_price(self):
+        # 333 × 1.6 = 532.8 -> 533 -> 530
+        self.assertEqual(round_price(333), 530)
+        self.assertEqual(round_price(250), 400)
+
+    def test_writers_share_one_batch(self):
+        options = {'shopee': {'category': '100644'}}
+        writers = [writer(os.path.join(self.test_dir, f"{name}.csv"), **options.get(name, {})) for name, writer in MARKETPLACES.items()]
+        for writer in writers:
+            writer.open()
+            writer.write(PRODUCTS)
+            writer.close()
+            with open(writer.output_filename, encoding='utf-8-sig') as f:
+                rows = list(csv.reader(f))
+            self.assertEqual(rows[0], writer.columns)
+            self.assertEqual(len(rows), len(PRODUCTS) + 1)
+            self.assertEqual(writer.rows, len(PRODUCTS))
+
+    def test_ruten_and_shopee_rows(self):
+        ruten = RutenWriter().transform(PRODUCTS[0])
+        self.assertEqual(ruten[1:4], ['鋼彈 阿庫力 展示盒', '大', '530'])
+        self.assertEqual(ruten[8:10], ['p1_1.jpg', 'p1_2.jpg'])
+        shopee = ShopeeWriter(category='100644').transform(PRODUCTS[1])
+        self.assertEqual(shopee[0], '100644')
+        self.assertEqual(shopee[3], 'p1')
+        self.assertEqual(shopee[8], 'o2')
+
+    def test_shopee_requires_category(self):
+        # 分類為蝦皮的必填欄位，不可輸出空白
+        for category in (None, '', '  '):
+            with self.assertRaises(ValueError):
+                ShopeeWriter(category=category)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import unittest
+import json
+import os
+import shutil
+import tempfile
+from src.utils.metrics import Histogram, Metrics
+
+class TestMetrics(unittest.TestCase):
+
+    def test_timer_records_latency_and_errors(self):
+        metrics = Metrics()
+        with metrics.timer('json_parse'):
+            pass
+        with self.assertRaises(ValueError):
+            with metrics.timer('json_parse'):
+                raise ValueError("bad json")
+        metrics.error('json_parse')
+        metrics.add_bytes('product_http', 2048)
+        metrics.inc('products_done', 3)
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot['stages']['json_parse']['count'], 2)
+        self.assertEqual(snapshot['stages']['json_parse']['errors'], 2)
+        self.assertEqual(snapshot['stages']['product_http']['bytes'], 2048)
+        self.assertEqual(snapshot['counters'], {'products_done': 3})
+        self.assertIn('json_parse', metrics.summary())
+
+    def test_histogram_buckets_and_quantiles(self):
+        histogram = Histogram(buckets=(0.1, 1, 10))
+        for value in (0.05, 0.5, 0.5, 5, 50):
+            histogram.observe(value)
+        self.assertEqual(histogram.cumulative(), [(0.1, 1), (1, 3), (10, 4), ('+Inf', 5)])
+        self.assertEqual(histogram.quantile(0.5), 1)
+        self.assertEqual(histogram.quantile(1.0), 50)
+
+    def test_write_json_and_prometheus(self):
+        metrics = Metrics(buckets=(1,))
+        metrics.observe('db_write', 0.5)
+        metrics.inc('variations', 4)
+        test_dir = tempfile.mkdtemp()
+        try:
+            json_path = os.path.join(test_dir, 'metrics.json')
+            metrics.write(json_path)
+            with open(json_path, encoding='utf-8') as f:
+                self.assertEqual(json.load(f)['stages']['db_write']['count'], 1)
+            prom_path = os.path.join(test_dir, 'metrics.prom')
+            metrics.write(prom_path)
+            with open(prom_path, encoding='utf-8') as f:
+                content = f.read()
+            self.assertIn('toybox_stage_seconds_bucket{stage="db_write",le="1"} 1', content)
+            self.assertIn('toybox_stage_seconds_bucket{stage="db_write",le="+Inf"} 1', content)
+            self.assertIn('toybox_events_total{name="variations"} 4', content)
+        finally:
+            shutil.rmtree(test_dir)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,166 @@
+import unittest
+import mysql.connector
+from src.utils.product_writer import COLUMNS, AsyncProductWriter, ProductWriter, normalize_price
+
+class FakeCursor:
+
+    def __init__(self, db):
+        self.db = db
+        self._rows = []
+
+    def execute(self, sql, params=()):
+        if sql.startswith("DELETE"):
+            for option_id in params:
+                self.db.pending[option_id] = None
+        elif sql.startswith("SELECT product_id, option_id FROM"):
+            self._rows = [(row[0], row[1]) for row in self.db.table.values() if row[0] in params]
+        else:
+            # _existing_rows 的 SELECT ... WHERE option_id IN (...)
+            self._rows = [self.db.table[option_id] for option_id in params if option_id in self.db.table]
+
+    def fetchall(self):
+        return self._rows
+
+    def executemany(self, sql, rows):
+        if self.db.fail:
+            raise self.db.fail
+        self.db.upserts.append(list(rows))
+        for row in rows:
+            self.db.pending[row[1]] = row
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    """以 option_id 為鍵的 aowotoy_products；commit 前的寫入 (None 代表刪除) 在 rollback 時捨棄"""
+
+    def __init__(self):
+        self.table = {}
+        self.pending = {}
+        self.upserts = []
+        self.commits = 0
+        self.rollbacks = 0
+        self.fail = None # 設定例外時 executemany 拋出該例外
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.table.update(self.pending)
+        self.table = {option_id: row for option_id, row in self.table.items() if row is not None}
+        self.pending = {}
+        self.commits += 1
+
+    def rollback(self):
+        self.pending = {}
+        self.rollbacks += 1
+
+    def is_connected(self):
+        return True
+
+
+def product_row(option_id, price=100, name='展示盒'):
+    return {'product_id': 'p1', 'option_id': option_id, 'url': 'https://example.com/p1', 'name': name,
+            'summary': '', 'price': price, 'option': '', 'detail': '', 'fingerprint': 'f'}
+
+
+class TestProductWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.db = FakeConnection()
+        self.writer = ProductWriter(self.db, batch_size=10)
+
+    def test_classifies_inserted_updated_unchanged(self):
+        self.writer.add_product([product_row('o1'), product_row('o2'), product_row('o3')])
+        self.assertEqual(self.writer.flush(), {'inserted': 3})
+        self.writer.add_product([product_row('o1'), product_row('o2', name='新名稱'), product_row('o4')])
+        result = self.writer.flush()
+        self.assertEqual((result['inserted'], result['updated'], result['unchanged']), (1, 1, 1))
+        # 只送出新增與變更的資料，一個批次只 commit 一次
+        self.assertEqual(sorted(row[1] for row in self.db.upserts[-1]), ['o2', 'o4'])
+        self.assertEqual(self.db.commits, 2)
+        self.assertEqual(self.db.table['o2'][COLUMNS.index('name')], '新名稱')
+
+    def test_fractional_price_is_unchanged_after_write(self):
+        # dollars * 4 可能是小數，資料庫以 INT 儲存
+        self.writer.add_product([product_row('o1', price=12.5 * 4 + 0.5)])
+        self.writer.flush()
+        self.assertEqual(self.db.table['o1'][COLUMNS.index('price')], 51)
+        self.writer.add_product([product_row('o1', price=12.5 * 4 + 0.5)])
+        self.assertEqual(self.writer.flush(), {'unchanged': 1})
+        self.assertEqual((normalize_price(49.5), normalize_price(None), normalize_price('20')), (50, 0, 20))
+
+    def test_removed_options_are_deleted(self):
+        # 規格被移除後，舊的資料列不可留下舊指紋
+        self.writer.add_product([product_row('o1'), product_row('o2')])
+        self.writer.flush()
+        self.writer.add_product([product_row('o1')])
+        self.assertEqual(self.writer.flush(), {'unchanged': 1, 'deleted': 1})
+        self.assertEqual(list(self.db.table), ['o1'])
+        self.assertEqual(self.db.commits, 2)
+
+    def test_batch_size_triggers_flush(self):
+        writer = ProductWriter(self.db, batch_size=2)
+        writer.add_product([product_row('o1')])
+        self.assertEqual(self.db.commits, 0)
+        writer.add_product([product_row('o2')])
+        self.assertEqual(self.db.commits, 1)
+
+    def test_failed_batch_rolls_back(self):
+        self.db.fail = mysql.connector.Error("lost connection")
+        self.writer.add_product([product_row('o1'), product_row('o2')])
+        self.assertEqual(self.writer.flush(), {'failed': 2})
+        self.assertEqual((self.db.rollbacks, self.db.table), (1, {}))
+        self.assertEqual(self.writer.close()['failed'], 2)
+
+class TestAsyncProductWriter(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.db = FakeConnection()
+        self.results = []
+
+    def _on_commit(self, option_id):
+        return lambda ok: self.results.append((option_id, ok))
+
+    async def test_close_writes_remaining_rows_in_order(self):
+        writer = AsyncProductWriter(ProductWriter(self.db, batch_size=100)).start()
+        for option_id in ('o1', 'o2', 'o3'):
+            await writer.add_product([product_row(option_id)], self._on_commit(option_id))
+        # 批次未滿，尚未 commit 前不會通知
+        self.assertEqual(self.results, [])
+        stats = await writer.close()
+        self.assertEqual(stats['inserted'], 3)
+        self.assertEqual([row[1] for row in self.db.upserts[0]], ['o1', 'o2', 'o3'])
+        self.assertEqual(self.results, [('o1', True), ('o2', True), ('o3', True)])
+
+    async def test_flush_commits_partial_batch(self):
+        writer = AsyncProductWriter(ProductWriter(self.db, batch_size=100)).start()
+        await writer.add_product([product_row('o1')], self._on_commit('o1'))
+        await writer.flush()
+        self.assertEqual((self.db.commits, self.results), (1, [('o1', True)]))
+        await writer.close()
+
+    async def test_backpressure_when_queue_is_full(self):
+        writer = AsyncProductWriter(ProductWriter(self.db), max_pending=1)
+        await writer.add_product([product_row('o1')])
+        await writer.add_product([product_row('o2')]) # 寫入執行緒尚未取走第一筆
+        self.assertEqual((writer.stats['queued'], writer.stats['backpressure_waits']), (2, 1))
+        self.assertEqual((await writer.close())['inserted'], 2)
+
+    async def test_failures_reach_callers_and_close(self):
+        self.db.fail = mysql.connector.Error("lost connection")
+        writer = AsyncProductWriter(ProductWriter(self.db, batch_size=1)).start()
+        await writer.add_product([product_row('o1')], self._on_commit('o1'))
+        await writer.flush()
+        self.assertEqual(self.results, [('o1', False)])
+        # 非 mysql.connector 的例外也通知失敗，並在 close() 時拋出
+        self.db.fail = RuntimeError("unexpected")
+        await writer.add_product([product_row('o2')], self._on_commit('o2'))
+        with self.assertRaises(RuntimeError):
+            await writer.close()
+        self.assertEqual(self.results[-1], ('o2', False))
+        self.assertEqual(writer.stats['errors'], 1)
+
+if __name__ == '__main__':
+    unittest.main()
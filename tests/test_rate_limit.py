@@ -0,0 +1,61 @@
+import unittest
+import asyncio
+import threading
+import time
+from src.utils.rate_limit import TokenBucket, HostRateLimiter, ThreadTokenBucket
+
+class TestTokenBucket(unittest.TestCase):
+
+    def test_burst_is_immediate(self):
+        # burst 內的請求不需要等待
+        bucket = TokenBucket(rate=1, burst=3)
+
+        async def run():
+            return [await bucket.acquire() for _ in range(3)]
+
+        waits = asyncio.run(run())
+        self.assertEqual(waits, [0.0, 0.0, 0.0])
+
+    def test_rate_is_enforced(self):
+        # 超過 burst 後依 rate 補充 token
+        bucket = TokenBucket(rate=20, burst=1)
+
+        async def run():
+            start = time.monotonic()
+            for _ in range(3):
+                await bucket.acquire()
+            return time.monotonic() - start
+
+        elapsed = asyncio.run(run())
+        self.assertGreaterEqual(elapsed, 0.09)
+
+    def test_invalid_rate(self):
+        with self.assertRaises(ValueError):
+            TokenBucket(rate=0)
+
+class TestThreadTokenBucket(unittest.TestCase):
+
+    def test_rate_is_shared_across_threads(self):
+        # 4 個執行緒共用 burst 1、每秒 20 個 token，取得 4 個 token 至少需要 0.15 秒
+        bucket = ThreadTokenBucket(rate=20, burst=1)
+        threads = [threading.Thread(target=bucket.acquire) for _ in range(4)]
+        start = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertGreaterEqual(time.monotonic() - start, 0.14)
+
+class TestHostRateLimiter(unittest.TestCase):
+
+    def test_bucket_per_host(self):
+        limiter = HostRateLimiter(rate=1, burst=1)
+        a = limiter.bucket_for("https://www.aowotoys.com/products/a")
+        b = limiter.bucket_for("https://www.aowotoys.com/products/b")
+        c = limiter.bucket_for("https://img.shoplineapp.com/media/c.jpg")
+        self.assertIs(a, b)
+        self.assertIsNot(a, c)
+
+
+if __name__ == '__main__':
+    unittest.main()
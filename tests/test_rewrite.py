@@ -0,0 +1,40 @@
+import unittest
+from src.utils.rewrite import Rewriter, RewriteCache
+
+class TestRewriter(unittest.TestCase):
+
+    def test_longest_term_wins(self):
+        rewriter = Rewriter([('Gundam', '鋼彈'), ('Gundam SEED', '鋼彈SEED')])
+        self.assertEqual(rewriter.rewrite('Gundam SEED 與 Gundam'), '鋼彈SEED 與 鋼彈')
+
+    def test_single_pass(self):
+        # 取代後的文字不會再被其他規則取代
+        rewriter = Rewriter([('高達', '鋼彈'), ('鋼彈', '機動戰士')])
+        self.assertEqual(rewriter.rewrite('高達 鋼彈'), '鋼彈 機動戰士')
+
+    def test_special_characters_and_empty(self):
+        rewriter = Rewriter([('a.b', 'X'), ('', 'ignored')])
+        self.assertEqual(rewriter.rewrite('a.b acb'), 'X acb')
+        self.assertEqual(Rewriter().rewrite('text'), 'text')
+
+class TestRewriteCache(unittest.TestCase):
+
+    def setUp(self):
+        self.loads = 0
+        self.checksum = 1
+
+    def _load(self, mydb):
+        self.loads += 1
+        return [('AOWOBOX', 'db')]
+
+    def test_reload_only_when_table_changes(self):
+        cache = RewriteCache(self._load, lambda mydb: self.checksum, extra_pairs=[('AOWOBOX', '阿庫力')], ttl=0)
+        self.assertEqual(cache.get(None).rewrite('AOWOBOX'), '阿庫力')
+        cache.get(None)
+        self.assertEqual(self.loads, 1)
+        self.checksum = 2
+        cache.get(None)
+        self.assertEqual(self.loads, 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import unittest
+import hashlib
+import hmac
+import json
+import os
+import tempfile
+from unittest import mock
+
+import requests
+from urllib3.exceptions import MaxRetryError, NewConnectionError
+
+from src.ruten.client import Credentials, RutenAmbiguousError, RutenClient
+
+URL = 'https://partner.ruten.com.tw/api/v1/product/item'
+
+
+def api_response(status_code=200, data=None):
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = json.dumps({'status': 'success', 'data': data}).encode('utf-8')
+    return response
+
+
+class TestRutenClient(unittest.TestCase):
+
+    def setUp(self):
+        self.client = RutenClient(Credentials('key', 'secret', 'salt'), rate=1000, burst=1000, backoff=0)
+
+    def tearDown(self):
+        self.client.close()
+
+    def _send(self, *results):
+        """以依序回傳 (或拋出) results 的 Session.send 取代實際連線，返回送出的 PreparedRequest 列表"""
+        sent = []
+
+        def send(request, **kwargs):
+            sent.append(request)
+            result = results[len(sent) - 1]
+            if isinstance(result, Exception):
+                raise result
+            return result
+
+        patcher = mock.patch.object(requests.Session, 'send', side_effect=send)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return sent
+
+    def test_signature_matches_sent_body(self):
+        sent = self._send(api_response(data={'item_id': 1}))
+        payload = {'name': '展示盒 "限定"', 'price': 100, 'spec_info': [{'custom_no': 'o1'}]}
+        self.client.post('/api/v1/product/item', payload, params={'mode': 'draft'})
+        request = sent[0]
+        body = json.dumps(payload)
+        # 送出的 bytes 就是簽章所用的 JSON 字串
+        self.assertEqual(request.body, body.encode('utf-8'))
+        self.assertEqual(request.url, f"{URL}?mode=draft")
+        timestamp = request.headers['X-RT-Timestamp']
+        expected = hmac.new(b'secret', f"salt{URL}?mode=draft{body}{timestamp}".encode('utf-8'), hashlib.sha256).hexdigest()
+        self.assertEqual(request.headers['X-RT-Authorization'], expected)
+        self.assertEqual(request.headers['X-RT-Key'], 'key')
+        self.assertTrue(self.client.credentials.verify(request.url, body, timestamp, expected))
+
+    def test_multipart_signs_only_fields(self):
+        sent = self._send(api_response(data={'success_images': 1}))
+        with tempfile.TemporaryDirectory() as test_dir:
+            image_path = os.path.join(test_dir, 'p1_1.jpg')
+            with open(image_path, 'wb') as f:
+                f.write(b'jpeg')
+            self.client.post_multipart(f"{URL}/image", {'item_id': '2100'}, [('images[0]', image_path, 'image/jpeg')])
+        request = sent[0]
+        timestamp = request.headers['X-RT-Timestamp']
+        sign_body = json.dumps({'item_id': '2100'})
+        expected = hmac.new(b'secret', f"salt{URL}/image{sign_body}{timestamp}".encode('utf-8'), hashlib.sha256).hexdigest()
+        self.assertEqual(request.headers['X-RT-Authorization'], expected)
+        self.assertTrue(request.headers['Content-Type'].startswith('multipart/form-data'))
+
+    def test_post_is_not_retried_after_read_timeout(self):
+        # 新增商品可能已被處理，重送會重複新增
+        sent = self._send(requests.ReadTimeout("read timed out"), api_response(data={'item_id': 1}))
+        with self.assertRaises(RutenAmbiguousError):
+            self.client.post('/api/v1/product/item', {'name': '展示盒'})
+        self.assertEqual(len(sent), 1)
+
+    def test_post_is_not_retried_after_server_error(self):
+        sent = self._send(api_response(502), api_response(data={'item_id': 1}))
+        with self.assertRaises(RutenAmbiguousError):
+            self.client.post('/api/v1/product/item', {'name': '展示盒'})
+        self.assertEqual(len(sent), 1)
+
+    def test_post_is_retried_when_not_sent(self):
+        refused = requests.ConnectionError(MaxRetryError(None, URL, NewConnectionError(None, "connection refused")))
+        sent = self._send(requests.ConnectTimeout("connect timed out"), refused, api_response(429),
+                          api_response(data={'item_id': 1}))
+        self.client.retries = 4
+        self.assertEqual(self.client.post('/api/v1/product/item', {'name': '展示盒'}), {'item_id': 1})
+        self.assertEqual(len(sent), 4)
+
+    def test_idempotent_requests_are_retried(self):
+        sent = self._send(requests.ReadTimeout("read timed out"), api_response(503), api_response(data={'ok': True}))
+        self.assertEqual(self.client.put('/api/v1/product/item/price', {'item_id': '1', 'price': 100}), {'ok': True})
+        self.assertEqual(len(sent), 3)
+        self.assertEqual(self.client.stats['retries'], 2)
+
+if __name__ == '__main__':
+    unittest.main()
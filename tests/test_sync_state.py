@@ -0,0 +1,36 @@
+import unittest
+from src.ruten import sync_state
+
+def make_item(price=100, options=('A', 'B'), name='測試商品'):
+    payload = {'name': name, 'price': price, 'qty': 10, 'has_spec': len(options) > 1, 'custom_no': 'p1'}
+    if payload['has_spec']:
+        payload['spec_info'] = [{'spec_name': option, 'price': price, 'qty': 10, 'custom_no': option} for option in options]
+    return {'product_id': 'p1', 'payload': payload, 'images': []}
+
+class TestSyncState(unittest.TestCase):
+
+    def synced(self, item):
+        state = sync_state.new_state(item, '2100', {'A': 1, 'B': 2})
+        state['image_status'] = sync_state.IMAGE_DONE
+        return state
+
+    def test_new_product_is_created(self):
+        self.assertEqual(sync_state.plan(make_item(), None), [sync_state.CREATE])
+
+    def test_unchanged_product_is_skipped(self):
+        self.assertEqual(sync_state.plan(make_item(), self.synced(make_item())), [])
+
+    def test_only_changed_parts_are_updated(self):
+        state = self.synced(make_item())
+        self.assertEqual(sync_state.plan(make_item(price=200), state), [sync_state.PRICE])
+        self.assertEqual(sync_state.plan(make_item(name='新名稱'), state), [sync_state.INFO])
+        self.assertEqual(sync_state.plan(make_item(options=('A', 'B', 'C')), state),
+                         [sync_state.SPEC, sync_state.PRICE])
+
+    def test_failed_images_are_retried(self):
+        state = self.synced(make_item())
+        state['image_status'] = sync_state.IMAGE_FAILED
+        self.assertEqual(sync_state.plan(make_item(), state), [sync_state.IMAGES])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,37 @@
+import unittest
+from src.utils.table_cache import TableCache
+
+class TestTableCache(unittest.TestCase):
+
+    def setUp(self):
+        self.builds = 0
+        self.checksum = 1
+
+    def _build(self, mydb):
+        self.builds += 1
+        return {'zh': ['editor']}
+
+    def test_ttl_skips_checksum_query(self):
+        checks = []
+        cache = TableCache(self._build, lambda mydb: checks.append(1) or self.checksum, ttl=60)
+        cache.get(None)
+        cache.get(None)
+        self.assertEqual((self.builds, len(checks)), (1, 1))
+
+    def test_rebuild_on_change_or_failed_build(self):
+        cache = TableCache(self._build, lambda mydb: self.checksum, ttl=0)
+        cache.get(None)
+        cache.get(None)
+        self.assertEqual(self.builds, 1)
+        self.checksum = 2
+        cache.get(None)
+        self.assertEqual(self.builds, 2)
+        # 建立失敗 (返回 None) 不會被快取，下次重新建立
+        attempts = []
+        failed = TableCache(lambda mydb: attempts.append(1), lambda mydb: 1, ttl=60)
+        failed.get(None)
+        failed.get(None)
+        self.assertEqual(len(attempts), 2)
+
+if __name__ == '__main__':
+    unittest.main()
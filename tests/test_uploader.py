@@ -0,0 +1,80 @@
+import unittest
+import os
+import shutil
+import tempfile
+from collections import Counter
+
+from src.ruten.client import RutenAmbiguousError
+from src.ruten.item_cache import ItemCache
+from src.ruten.uploader import RutenUploader
+
+
+class FakeClient:
+    """新增商品第一次回應逾時 (實際上 created 為 True 時已在露天新增)，商品列表只有已新增的商品"""
+
+    def __init__(self, created):
+        self.created = created
+        self.posts = []
+        self.puts = []
+        self.stats = Counter()
+
+    def post(self, path, payload=None, params=None, idempotent=False):
+        self.posts.append(payload)
+        if len(self.posts) == 1:
+            raise RutenAmbiguousError(f"POST {path} 未取得結果，請求可能已送出: read timed out")
+        return {'item_id': '2200', 'spec_info': []}
+
+    def put(self, path, payload=None, params=None):
+        self.puts.append(path)
+        return {}
+
+    def get(self, path, params=None):
+        if path.endswith('/list'):
+            items = [{'item_id': '2100', 'status': 'on', 'last_update': 1}] if self.created else []
+            return {'total': len(items), 'items': items}
+        return {'item_id': '2100', 'custom_no': 'p1', 'has_spec': False}
+
+    def close(self):
+        pass
+
+
+def make_item():
+    return {'product_id': 'p1', 'payload': {'name': '展示盒', 'price': 100, 'qty': 10, 'has_spec': False, 'custom_no': 'p1'},
+            'images': []}
+
+
+class TestUploadCatalog(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.cache = ItemCache(os.path.join(self.test_dir, "items.sqlite3"))
+
+    def tearDown(self):
+        self.cache.close()
+        shutil.rmtree(self.test_dir)
+
+    def test_ambiguous_create_found_in_cache_is_updated(self):
+        client = FakeClient(created=True)
+        uploader = RutenUploader(client)
+        [state] = uploader.upload_catalog([make_item()], item_cache=self.cache)
+        # 只送出一次新增，確認已在露天上後改為更新
+        self.assertEqual(len(client.posts), 1)
+        self.assertEqual(state['item_id'], '2100')
+        self.assertEqual((uploader.stats['adopted'], uploader.stats['updated'], uploader.stats['created']), (1, 1, 0))
+        self.assertEqual(len(client.puts), 2)
+
+    def test_ambiguous_create_missing_from_cache_is_created_again(self):
+        client = FakeClient(created=False)
+        uploader = RutenUploader(client)
+        [state] = uploader.upload_catalog([make_item()], item_cache=self.cache)
+        self.assertEqual(len(client.posts), 2)
+        self.assertEqual((state['item_id'], uploader.stats['created']), ('2200', 1))
+
+    def test_ambiguous_create_without_cache_is_not_repeated(self):
+        client = FakeClient(created=False)
+        uploader = RutenUploader(client)
+        self.assertEqual(uploader.upload_catalog([make_item()]), [])
+        self.assertEqual((len(client.posts), uploader.stats['failed']), (1, 1))
+
+if __name__ == '__main__':
+    unittest.main()